@@ -1,5 +1,93 @@
-from abm.log import Logger
-from settings import LOGGER
+from copy import copy
+
+import numpy as np
+
+from abm.trace import Tracer
+from settings import TRACER
+
+
+class AgentKinds:
+    """
+    maps agent classes to small integer codes (kinds).
+
+    Typed array topologies store the kind of the agent placed on a node in a
+    typed array. This is a registry (used statically) handing out the codes.
+    Kind 0 is reserved for nodes without an agent.
+    """
+
+    # a uint8 array is used for storing kinds
+    MAX_KINDS = 256
+
+    __types = [None]
+    __kinds = {}
+    __masks = {}
+
+    @staticmethod
+    def register(*types):
+        """
+        registers agent classes in the given order. Registering classes
+        explicitly makes sure kinds are the same in every process.
+
+        :param types: the agent classes to register
+        """
+        for agent_type in types:
+            AgentKinds.getKind(agent_type)
+
+    @staticmethod
+    def getKind(agent_type) -> int:
+        """
+        :returns the kind of an agent class. Unknown classes are registered.
+        :param agent_type: the class of an agent
+        """
+        kind = AgentKinds.__kinds.get(agent_type)
+        if kind is None:
+            kind = len(AgentKinds.__types)
+            if kind >= AgentKinds.MAX_KINDS:
+                raise Exception("Too many agent kinds")
+            AgentKinds.__types.append(agent_type)
+            AgentKinds.__kinds[agent_type] = kind
+            AgentKinds.__masks.clear()
+        return kind
+
+    @staticmethod
+    def getType(kind: int):
+        """
+        :returns the agent class of a kind (None for kind 0)
+        :param kind: the kind to look up
+        """
+        return AgentKinds.__types[kind]
+
+    @staticmethod
+    def getKinds(*types) -> tuple:
+        """
+        :returns the kinds of the given classes. Classes which have never
+        been registered are ignored since no node can hold them.
+        :param types: the agent classes
+        """
+        return tuple(AgentKinds.__kinds[t] for t in types
+                     if t in AgentKinds.__kinds)
+
+    @staticmethod
+    def getMask(*types) -> np.ndarray:
+        """
+        :returns a boolean lookup table which is True at the kinds of the
+        given classes. Indexing it with an array of kinds filters nodes by
+        agent class in one step.
+        :param types: the agent classes
+        """
+        mask = AgentKinds.__masks.get(types)
+        if mask is None:
+            mask = np.zeros(AgentKinds.MAX_KINDS, dtype=bool)
+            mask[list(AgentKinds.getKinds(*types))] = True
+            AgentKinds.__masks[types] = mask
+        return mask
+
+    @staticmethod
+    def count() -> int:
+        """
+        :returns the number of kinds handed out so far (including kind 0)
+        """
+        return len(AgentKinds.__types)
 
 
 class Agent:
@@ -8,8 +96,26 @@ class Agent:
 
     This class is used as a general class. Concrete agent implementations are
     supposed to derive it.
+
+    Agents are small: they declare their attributes as __slots__ (so should
+    derived agents). Everything that differs between two agents of the same
+    class and parameters (see getParameters()) has to be part of their state
+    (see getState()). Array topologies rely on this: they keep a single
+    agent (a flyweight) per class and parameters and hand out views of it
+    (see view()) instead of storing an agent object per node.
     """
 
+    __slots__ = ('_env', '_index')
+
+    EVENT_IDLE = Tracer.registerEvent("Agent (%(node)d): does nothing")
+
+    # classes whose agents never do anything set this, so schedulers do not
+    # even look at them (see isIdle())
+    PASSIVE = False
+
+    # the (mangled) names of the slots of each agent class, see __copy__()
+    __slot_names = {}
+
     def __init__(self):
         self._env = None
         self._index = None
@@ -39,15 +145,85 @@ class Agent:
         """
         self._env = env
 
+    def getState(self) -> int:
+        """
+        :returns the agents state as small integer flags. Stateless agents
+        return 0. Agents with state override this together with setState().
+        """
+        return 0
+
+    def setState(self, state: int):
+        """
+        restores the agents state from flags returned by getState()
+
+        :param state: the state flags
+        """
+        pass
+
+    def getParameters(self) -> tuple:
+        """
+        :returns the parameters the agent was created with (e.g. the
+        aggressiveness of a zombie). Agents without parameters return an
+        empty tuple.
+        """
+        return ()
+
+    def view(self, index: int, state: int):
+        """
+        :returns a copy of the agent placed on another node in another
+        state. Array topologies keep a single agent per class and parameters
+        and use this to hand out the agent of a node.
+        :param index: the index of the node
+        :param state: the state flags (see getState())
+        """
+        agent = copy(self)
+        agent._index = index
+        agent.setState(state)
+        return agent
+
+    def __copy__(self):
+        """
+        copies the slots of the agent. The generic copy of objects with
+        __slots__ is several times slower and views are copied a lot.
+        """
+        agent_type = type(self)
+        names = Agent.__slot_names.get(agent_type)
+        if names is None:
+            names = []
+            for cls in agent_type.__mro__:
+                slots = cls.__dict__.get('__slots__', ())
+                for name in (slots,) if isinstance(slots, str) else slots:
+                    if name in ('__dict__', '__weakref__'):
+                        continue
+                    if name.startswith('__') and not name.endswith('__'):
+                        name = "_%s%s" % (cls.__name__.lstrip('_'), name)
+                    names.append(name)
+            Agent.__slot_names[agent_type] = names
+        agent = object.__new__(agent_type)
+        for name in names:
+            setattr(agent, name, getattr(self, name))
+        if hasattr(self, '__dict__'):
+            agent.__dict__.update(self.__dict__)
+        return agent
+
+    def isIdle(self) -> bool:
+        """
+        :returns whether do() would do nothing right now, not even draw a
+        random number. Schedulers skip idle agents (see
+        abm.operations.ActiveSetExecutor) until something around them
+        changes, so the answer may only depend on the agents state, the
+        classes of the agents on neighbor nodes and the edges. Agents acting
+        in any case return False (the default unless PASSIVE).
+        """
+        return self.PASSIVE
+
     def getNeighborNodes(self, *types):
         """
         :returns the agents neighbor nodes (only those of the given
         types)
         :param types: a list of types of neighbors we are interested in
         """
-        g = self._env.getTopology()
-        return [neighbor for neighbor in g.neighbors(self._index) if
-                type(g.node[neighbor]['agent']) in types]
+        return self._env.getNeighborNodes(self._index, *types)
 
     def getNeighborAgents(self, *types):
         """
@@ -55,15 +231,15 @@ class Agent:
         types)
         :param types: a list of types of neighbors we are interested in
         """
-        g = self._env.getTopology()
-        return [g.node[x] for x in self.getNeighborNodes(*types)]
+        return [self._env.getAgent(x) for x in self.getNeighborNodes(*types)]
 
     def do(self):
         """
         this method should be overridden by concrete agents to implement
         their behavior
         """
-        LOGGER("%s: does nothing" % self, Logger.LEVEL_DETAILS)
+        if TRACER.enabled:
+            TRACER(Agent.EVENT_IDLE, self._index)
 
     def getName(self) -> str:
         """
@@ -85,10 +261,28 @@ class MovingAgent(Agent):
     traversal
     """
 
+    __slots__ = ('_skip',)
+
+    STATE_SKIP = 1
+
     def __init__(self):
         super().__init__()
         self._skip = False
 
+    def getState(self) -> int:
+        """
+        :returns STATE_SKIP when the agent is skipped
+        """
+        return MovingAgent.STATE_SKIP if self._skip else 0
+
+    def setState(self, state: int):
+        """
+        restores the skipping behavior
+
+        :param state: the state flags
+        """
+        self._skip = bool(state & MovingAgent.STATE_SKIP)
+
     def do(self):
         """
         behavoir of the agent. Has to be overridden by child agents.
@@ -113,3 +307,4 @@ class MovingAgent(Agent):
             self._env.setAgent(self._index, other)
             self._env.setAgent(index_before_move, self)
         self._skip = not self._skip
+        self._env.updateState(self)
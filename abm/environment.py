@@ -1,5 +1,15 @@
+from copy import copy
+from time import perf_counter
+
+import numpy as np
+
+from abm.index import NeighborIndex
+from abm.journal import Journal
 from abm.log import Logger
-from settings import LOGGER
+from abm.profiler import Profiler
+from abm.rng import RandomStreams, RandomStream
+from abm.topology import Topology, GraphTopology
+from settings import LOGGER, TRACER, PROFILER, TELEMETRY
 
 
 class EnvironmentOperable:
@@ -20,6 +30,14 @@ class EnvironmentOperable:
     def __init__(self, env=None):
         self._env = env
 
+    def isNodewise(self) -> bool:
+        """
+        :returns whether the operable is called on each node. Operables doing
+        all their work in preProcess() or postProcess() return False, so the
+        traversal does not visit nodes for them.
+        """
+        return True
+
     def __call__(self, node: int):
         """
         override by child operable.
@@ -33,6 +51,39 @@ class EnvironmentOperable:
         """
         raise NotImplementedError
 
+    def processBlock(self, nodes: np.ndarray):
+        """
+        performs the operation on a block of nodes. Traversals hand out the
+        nodes in blocks (see Environment.BLOCK_SIZE). By default, the
+        operable is called on each node in turn. Override to handle a whole
+        block at once, e.g. as array operations.
+
+        :param nodes: the indices of the nodes (in traversal order)
+        """
+        for node in nodes.tolist():
+            self(node)
+
+    def needsBarrier(self) -> bool:
+        """
+        :returns whether the operable needs the operable before it to be
+        done (preProcess(), all nodes and postProcess()) before it starts.
+        Operables returning False are fused with the one before: the
+        preProcess() of each runs, then each block of nodes is processed by
+        each of them in turn in a single pass and then the postProcess() of
+        each runs. So an operable which only depends on the nodes of a block
+        being processed by the one before can return False.
+        """
+        return True
+
+    def isSettled(self) -> bool:
+        """
+        :returns whether nothing the operable does or looks at changes any
+        more, so further traversals can be left out (see
+        Environment.traverseTopologyUntil()). By default, an operable never
+        settles.
+        """
+        return False
+
     def setEnvironment(self, env):
         """
         used by traverseTopology() to make sure every Operable knows the
@@ -60,37 +111,95 @@ class Environment:
     The environment agents are operating within. Is supposed to be
     derived for concrete usage.
 
-    :param graph: a networkx.Graph which is used as the environments topology
+    :param topology: the environments topology. Either a networkx.Graph or a
+    Topology (see topology.py) such as ArrayTopology.
     """
 
-    def __init__(self, graph):
-        self._graph = graph
-        self.__initial_graph = None
+    # the number of nodes handed to the operables at once while traversing
+    # (see EnvironmentOperable.processBlock())
+    BLOCK_SIZE = 1024
+
+    def __init__(self, topology):
+        if not isinstance(topology, Topology):
+            topology = GraphTopology(topology)
+        self._topology = topology
+        self.__listeners = []
+        self.__journal = None
+        self.__index = None
+        self.__random = RandomStreams()
+
+    def seedRandom(self, seed: int = None):
+        """
+        seeds the random numbers the agents draw (see getRandom()), e.g. at
+        the start of a trial
+
+        :param seed: the seed. By default, it is drawn from the random
+        module.
+        """
+        self.__random = RandomStreams(seed)
+
+    def getRandom(self, agent_type) -> RandomStream:
+        """
+        :returns the stream of random numbers of a kind of agents. Each kind
+        draws from a stream of its own (see abm.rng).
+        :param agent_type: the class of the agents
+        """
+        return self.__random.getStream(agent_type)
+
+    def getRandomStreams(self) -> RandomStreams:
+        """
+        :returns the random numbers of the environment (see seedRandom())
+        """
+        return self.__random
+
+    def addListener(self, listener):
+        """
+        registers an EnvironmentListener (see listeners.py) which is notified
+        about all changes of the topology
+
+        :param listener: the listener
+        """
+        self.__listeners.append(listener)
+
+    def removeListener(self, listener):
+        """
+        unregisters a listener
+
+        :param listener: the listener
+        """
+        self.__listeners.remove(listener)
 
     def saveCurrentGraph(self):
         """
         saves a graph
 
-        saving means storing the current graph in memory. This can be used when
-        agents modify the graph and the original state of the graph has to be
-        restored at some point in time. I use this for running different trials
-        on a scenario.
+        saving means remembering the current state of the graph. This can be
+        used when agents modify the graph and the original state of the graph
+        has to be restored at some point in time. I use this for running
+        different trials on a scenario.
+
+        Instead of copying the graph, a Journal (see journal.py) records all
+        changes made from now on.
         """
-        self.__initial_graph = self._graph.copy()
+        if self.__journal is not None:
+            self.removeListener(self.__journal)
+        self.__journal = Journal(self._topology)
+        self.addListener(self.__journal)
 
     def loadSavedGraph(self):
         """
-        loads a previously saved graph back into the internal topology
-        reference
+        restores the previously saved graph by undoing all changes recorded
+        since saving it
         """
-        self._graph = self.__initial_graph.copy()
+        self.__journal.rollback([listener for listener in self.__listeners
+                                 if listener is not self.__journal])
 
     def getAgent(self, index: int):
         """
         :returns the agent placed on a node
         :param index: the index of the node we want to retrieve the agent from
         """
-        return self._graph.node[index]['agent']
+        return self._topology.getAgent(index)
 
     def setAgent(self, index: int, agent):
         """
@@ -102,27 +211,201 @@ class Environment:
         :param index: the index of the node the agent should be placed on
         :param agent: the agent to place on the node
         """
+        for listener in self.__listeners:
+            listener.beforeSetAgent(index, agent)
         agent.setIndex(index)
         agent.setEnv(self)
-        self._graph.node[index]['agent'] = agent
+        self._topology.setAgent(index, agent)
+
+    def setAgents(self, indices, agent):
+        """
+        places an agent on many nodes at once. Each node gets a copy of the
+        agent unless the topology keeps a single agent per class and
+        parameters anyway (see Topology.keepsAgents()). Either way, the agent
+        must not be used afterwards.
+
+        :param indices: the indices of the nodes
+        :param agent: the agent to place on the nodes
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if self._topology.keepsAgents():
+            for index in indices.tolist():
+                self.setAgent(index, copy(agent))
+            return
+        for index in indices.tolist():
+            for listener in self.__listeners:
+                listener.beforeSetAgent(index, agent)
+        agent.setEnv(self)
+        self._topology.setAgents(indices, agent)
+
+    def updateState(self, agent):
+        """
+        called by agents whenever their state (see Agent.getState()) changed
+
+        :param agent: the agent
+        """
+        index = agent.getIndex()
+        state = agent.getState()
+        for listener in self.__listeners:
+            listener.beforeSetState(index, state)
+        self._topology.setState(index, state)
+
+    def addEdge(self, u: int, v: int):
+        """
+        connects two nodes
+
+        :param u: the index of the first node
+        :param v: the index of the second node
+        """
+        if self.__listeners and not self._topology.hasEdge(u, v):
+            sources = np.array([u], dtype=np.int64)
+            targets = np.array([v], dtype=np.int64)
+            for listener in self.__listeners:
+                listener.beforeAddEdges(sources, targets)
+        self._topology.addEdge(u, v)
+
+    def addEdges(self, sources, targets):
+        """
+        connects many pairs of nodes at once
+
+        :param sources: the first node of each edge
+        :param targets: the second node of each edge
+        """
+        if self.__listeners:
+            sources, targets = self._topology.newEdges(sources, targets)
+            if len(sources) == 0:
+                return
+            for listener in self.__listeners:
+                listener.beforeAddEdges(sources, targets)
+        self._topology.addEdges(sources, targets)
+
+    def removeEdge(self, u: int, v: int):
+        """
+        disconnects two nodes (if they are connected)
+
+        :param u: the index of the first node
+        :param v: the index of the second node
+        """
+        if not self._topology.hasEdge(u, v):
+            return
+        if self.__listeners:
+            sources = np.array([u], dtype=np.int64)
+            targets = np.array([v], dtype=np.int64)
+            for listener in self.__listeners:
+                listener.beforeRemoveEdges(sources, targets)
+        self._topology.removeEdge(u, v)
+
+    def removeEdges(self, sources, targets):
+        """
+        disconnects many pairs of nodes at once. Each of the edges has to
+        exist and show up once.
+
+        :param sources: the first node of each edge
+        :param targets: the second node of each edge
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if len(sources) == 0:
+            return
+        for listener in self.__listeners:
+            listener.beforeRemoveEdges(sources, targets)
+        self._topology.removeEdges(sources, targets)
+
+    def replaceEdges(self, saved, removed, added):
+        """
+        replaces the edges by edges saved before (see Topology.saveEdges()),
+        e.g. read from a checkpoint. Unlike adding and removing the edges,
+        the topology ends up exactly as saved (including the order of its
+        neighbors). Listeners see the difference removed and added.
+
+        :param saved: the saved edges
+        :param removed: the sources and targets of the edges which are gone
+        :param added: the sources and targets of the new edges
+        """
+        removed = [np.asarray(ends, dtype=np.int64) for ends in removed]
+        added = [np.asarray(ends, dtype=np.int64) for ends in added]
+        for listener in self.__listeners:
+            if len(removed[0]) > 0:
+                listener.beforeRemoveEdges(*removed)
+            if len(added[0]) > 0:
+                listener.beforeAddEdges(*added)
+        # the changes are undone in reverse order (see restoreEdges())
+        self._topology.restoreEdges(saved, [(False, *added), (True, *removed)])
+
+    def countNeighbors(self, index: int, *types) -> int:
+        """
+        :returns the number of neighbors of a node holding agents of the
+        given types. The counts are kept by a NeighborIndex (see index.py)
+        which is built on the first call.
+        :param index: the index of the node
+        :param types: a list of types of neighbors we are interested in
+        """
+        if PROFILER.enabled:
+            PROFILER.count(Profiler.NEIGHBOR_QUERIES)
+        if self.__index is None:
+            self.__index = NeighborIndex(self._topology)
+            self.addListener(self.__index)
+        return self.__index.count(index, *types)
+
+    def getNeighborNodes(self, index: int, *types) -> list:
+        """
+        :returns the neighbors of a node (only those holding agents of the
+        given types)
+        :param index: the index of the node
+        :param types: a list of types of neighbors we are interested in
+        """
+        if PROFILER.enabled:
+            PROFILER.count(Profiler.NEIGHBOR_QUERIES)
+        return self._topology.getNeighborNodes(index, *types)
 
     def getTopology(self):
         """
-        :returns the networkx.Graph the environment is working on
+        :returns the networkx.Graph the environment is working on. For array
+        backed topologies, the graph is built on demand.
+        """
+        return self._topology.getGraph()
+
+    def getBackend(self) -> Topology:
+        """
+        :returns the Topology backend the environment is working on
         """
-        return self._graph
+        return self._topology
 
-    def traverseTopologyUntil(self, time: int, *ops):
+    def countAgents(self) -> dict:
+        """
+        :returns the number of agents of each class taking part in the
+        scenario (all agents placed on the nodes by default)
         """
-        traverses the environments topology multiple times
+        return self._topology.countAgents()
+
+    def traverseTopologyUntil(self, time: int, *ops, start: int = 0):
+        """
+        traverses the environments topology multiple times. As soon as one
+        of the operables is settled (see EnvironmentOperable.isSettled()),
+        the remaining steps are left out, unless events are traced.
 
         :param time: the amount of steps the topology should be traversed
         :param *ops: a list of operations that should be executed on each node
         during traversal
+        :param start: the step to start at, e.g. when resuming a traversal
+        :return: the step the traversals stopped at
         """
-        for i in range(time):
+        for i in range(start, time):
             LOGGER("Running Timestep %d" % i, Logger.LEVEL_ITERATIONS)
+            TRACER.setTime(i)
+            PROFILER.setTime(i)
             self.traverseTopology(*ops)
+            if TELEMETRY.enabled:
+                TELEMETRY.tick(self, i)
+            if not TRACER.enabled and any(op.isSettled() for op in ops):
+                LOGGER("Settled after Timestep %d" % i,
+                       Logger.LEVEL_ITERATIONS)
+                return i + 1
+        # traced events end up in their file even if the run is killed
+        # later on
+        if TRACER.enabled:
+            TRACER.flush()
+        return time
 
     def traverseTopology(self, *ops):
         """
@@ -132,9 +415,95 @@ class Environment:
         during traversal. Note that the ops might have some preProcess and
         postProcess steps. these are executed before and after a full traversal.
         """
+        if PROFILER.enabled:
+            self.__traverseTopologyProfiled(ops)
+            return
+
+        for group in Environment.__fuse(ops):
+            for op in group:
+                op.setEnvironment(self)
+                op.preProcess()
+            nodewise = [op for op in group if op.isNodewise()]
+            if nodewise:
+                for block in self.__blocks():
+                    for op in nodewise:
+                        op.processBlock(block)
+            for op in group:
+                op.postProcess()
+
+    @staticmethod
+    def __fuse(ops) -> list:
+        """
+        :returns the operables in groups traversing the topology in a single
+        pass (see EnvironmentOperable.needsBarrier())
+        :param ops: the operables
+        """
+        groups = []
         for op in ops:
-            op.setEnvironment(self)
-            op.preProcess()
-            for x in self._graph.nodes():
-                op(x)
-            op.postProcess()
+            if groups and not op.needsBarrier():
+                groups[-1].append(op)
+            else:
+                groups.append([op])
+        return groups
+
+    def __blocks(self):
+        """
+        :returns the nodes of the topology in blocks of BLOCK_SIZE
+        """
+        nodes = self._topology.getNodeArray()
+        return [nodes[i:i + Environment.BLOCK_SIZE]
+                for i in range(0, len(nodes), Environment.BLOCK_SIZE)]
+
+    def __traverseTopologyProfiled(self, ops):
+        """
+        traverses the environments topology once just like traverseTopology()
+        does, recording the time spent by each operable and on the nodes of
+        each type of agent (see profiler.py)
+
+        :param ops: the operations
+        """
+        for group in Environment.__fuse(ops):
+            for op in group:
+                op.setEnvironment(self)
+                start = perf_counter()
+                op.preProcess()
+                PROFILER.record(Profiler.OPERABLE,
+                                type(op).__name__ + ".preProcess",
+                                perf_counter() - start)
+            nodewise = [op for op in group if op.isNodewise()]
+            seconds = [0.0] * len(nodewise)
+            nodes = 0
+            for block in self.__blocks() if nodewise else []:
+                for i, op in enumerate(nodewise):
+                    start = perf_counter()
+                    if type(op).processBlock is \
+                            EnvironmentOperable.processBlock:
+                        self.__processBlockProfiled(op, block)
+                    else:
+                        op.processBlock(block)
+                    seconds[i] += perf_counter() - start
+                nodes += len(block)
+            for op, spent in zip(nodewise, seconds):
+                PROFILER.record(Profiler.OPERABLE, type(op).__name__, spent,
+                                nodes)
+            for op in group:
+                start = perf_counter()
+                op.postProcess()
+                PROFILER.record(Profiler.OPERABLE,
+                                type(op).__name__ + ".postProcess",
+                                perf_counter() - start)
+
+    def __processBlockProfiled(self, op, block: np.ndarray):
+        """
+        calls an operable on each node of a block, recording the time spent
+        on the nodes of each type of agent
+
+        :param op: the operable
+        :param block: the indices of the nodes
+        """
+        for x in block.tolist():
+            # the type before acting, since zombies convert humans
+            agent = self._topology.getAgentType(x).__name__
+            begin = perf_counter()
+            op(x)
+            PROFILER.record(Profiler.AGENT, agent, perf_counter() - begin)
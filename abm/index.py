@@ -0,0 +1,119 @@
+import numpy as np
+
+from abm.agents import AgentKinds
+from abm.listeners import EnvironmentListener
+
+
+class NeighborIndex(EnvironmentListener):
+    """
+    counts, for every node, the neighbors holding each kind of agent (see
+    AgentKinds).
+
+    The counts are built once and then kept up to date as a listener of the
+    environment, so looking up how many neighbors of a certain type a node
+    has takes constant time instead of scanning its neighborhood. Like
+    Agent.getNeighborNodes(), the index only looks at the class of an agent.
+    State changes (e.g. a zombie being killed) therefore leave the counts
+    as they are.
+
+    Cliques (see Topology.getCliques()) are counted once per clique rather
+    than once per member, so placing an agent within a clique does not
+    touch the counts of all its members.
+
+    :param topology: the topology to index. Node indices have to be
+    non-negative integers.
+    """
+
+    def __init__(self, topology):
+        self.__topology = topology
+        nodes = topology.nodes()
+        size = max(nodes) + 1 if len(nodes) > 0 else 0
+        self.__kinds = np.zeros(size, dtype=np.int64)
+        for node in nodes:
+            agent_type = topology.getAgentType(node)
+            if agent_type is not type(None):
+                self.__kinds[node] = AgentKinds.getKind(agent_type)
+
+        rows, columns = topology.edgeArrays(cliques=False)
+        width = AgentKinds.count()
+        self.__counts = np.bincount(
+            rows * width + self.__kinds[columns],
+            minlength=size * width).reshape(size, width).astype(np.int32)
+
+        # every member of a clique neighbors all the others
+        cliques = topology.getCliques()
+        self.__cliques = np.full(size, -1, dtype=np.int64)
+        self.__clique_counts = np.zeros((len(cliques), width),
+                                        dtype=np.int32)
+        for clique, members in enumerate(cliques):
+            self.__cliques[members] = clique
+            self.__clique_counts[clique] = np.bincount(
+                self.__kinds[members], minlength=width)
+
+    def count(self, index: int, *types) -> int:
+        """
+        :returns the number of neighbors of a node holding agents of the
+        given types
+        :param index: the index of the node
+        :param types: the agent classes we are interested in
+        """
+        kinds = AgentKinds.getKinds(*types)
+        width = self.__counts.shape[1]
+        clique = self.__cliques[index]
+        if len(kinds) == 1:
+            kind = kinds[0]
+            if kind >= width:
+                return 0
+            count = int(self.__counts[index, kind])
+            if clique >= 0:
+                # the members of the clique but the node itself
+                count += int(self.__clique_counts[clique, kind]) - \
+                    int(self.__kinds[index] == kind)
+            return count
+        return sum(self.count(index, AgentKinds.getType(kind))
+                   for kind in kinds if kind < width)
+
+    def beforeSetAgent(self, index: int, agent):
+        old = self.__kinds[index]
+        new = AgentKinds.getKind(type(agent))
+        if old == new:
+            return
+        if new >= self.__counts.shape[1]:
+            padding = (0, AgentKinds.count() - self.__counts.shape[1])
+            self.__counts = np.pad(self.__counts, ((0, 0), padding))
+            self.__clique_counts = np.pad(self.__clique_counts,
+                                          ((0, 0), padding))
+        neighbors = self.__topology.neighbors(index, cliques=False)
+        self.__counts[neighbors, old] -= 1
+        self.__counts[neighbors, new] += 1
+        clique = self.__cliques[index]
+        if clique >= 0:
+            self.__clique_counts[clique, old] -= 1
+            self.__clique_counts[clique, new] += 1
+        self.__kinds[index] = new
+
+    def beforeAddEdges(self, sources, targets):
+        self.__update(sources, targets, 1)
+
+    def beforeRemoveEdges(self, sources, targets):
+        self.__update(sources, targets, -1)
+
+    def __update(self, sources, targets, change: int):
+        """
+        updates the counts of both ends of some edges
+
+        :param sources: the first node of each edge
+        :param targets: the second node of each edge
+        :param change: 1 for added, -1 for removed edges
+        """
+        if len(sources) == 1:
+            u, v = int(sources[0]), int(targets[0])
+            self.__counts[u, self.__kinds[v]] += change
+            if u != v:
+                self.__counts[v, self.__kinds[u]] += change
+            return
+        np.add.at(self.__counts, (sources, self.__kinds[targets]), change)
+        # self loops are counted once
+        loops = sources == targets
+        np.add.at(self.__counts, (targets[~loops], self.__kinds[
+            sources[~loops]]), change)
@@ -0,0 +1,73 @@
+from abm.listeners import EnvironmentListener
+
+
+class Journal(EnvironmentListener):
+    """
+    records the changes of a topology so they can be undone.
+
+    Whenever an agent is replaced or changes its state, the journal keeps
+    the agent and state the node had when recording started (only the first
+    time a node changes). Added and removed edges are logged, while the
+    topology saves whatever it needs to restore its edges (see
+    Topology.saveEdges()).
+    Rolling back therefore takes time proportional to the number of changes
+    rather than to the size of the topology.
+
+    :param topology: the topology to record
+    """
+
+    def __init__(self, topology):
+        self.__topology = topology
+        self.__agents = {}
+        self.__changes = []
+        self.__edges = topology.saveEdges()
+
+    def beforeSetAgent(self, index: int, agent):
+        self.__record(index)
+
+    def beforeSetState(self, index: int, state: int):
+        self.__record(index)
+
+    def beforeAddEdges(self, sources, targets):
+        self.__changes.append((True, sources, targets))
+
+    def beforeRemoveEdges(self, sources, targets):
+        self.__changes.append((False, sources, targets))
+
+    def __record(self, index: int):
+        """
+        keeps the agent and state of a node unless it has changed before
+
+        :param index: the index of the node
+        """
+        if index not in self.__agents:
+            self.__agents[index] = (self.__topology.getAgent(index),
+                                    self.__topology.getState(index))
+
+    def rollback(self, listeners: list):
+        """
+        restores the topology as it was when recording started. Recording
+        goes on, so rolling back again restores the same state.
+
+        :param listeners: listeners to notify about the changes made by
+        rolling back
+        """
+        topology = self.__topology
+        # undo the edge changes in reverse order, so listeners see each
+        # edge removed (added) while it exists (does not exist)
+        for added, sources, targets in reversed(self.__changes):
+            for listener in listeners:
+                if added:
+                    listener.beforeRemoveEdges(sources, targets)
+                else:
+                    listener.beforeAddEdges(sources, targets)
+        topology.restoreEdges(self.__edges, self.__changes)
+
+        for index, (agent, state) in self.__agents.items():
+            agent.setIndex(index)
+            agent.setState(state)
+            for listener in listeners:
+                listener.beforeSetAgent(index, agent)
+            topology.setAgent(index, agent)
+        self.__agents = {}
+        self.__changes = []
@@ -0,0 +1,45 @@
+class EnvironmentListener:
+    """
+    gets notified about changes of an environments topology.
+
+    Listeners are registered by Environment().addListener(). Notifications
+    happen before the topology is changed, so a listener can still look at
+    the old agent, state or edges. Override the methods of interest.
+    """
+
+    def beforeSetAgent(self, index: int, agent):
+        """
+        an agent is about to be placed on a node
+
+        :param index: the index of the node
+        :param agent: the new agent
+        """
+        pass
+
+    def beforeSetState(self, index: int, state: int):
+        """
+        the agent placed on a node is about to change its state
+
+        :param index: the index of the node
+        :param state: the new state flags (see Agent.getState())
+        """
+        pass
+
+    def beforeAddEdges(self, sources, targets):
+        """
+        edges are about to be added. Only edges which do not exist yet are
+        passed in, each of them once.
+
+        :param sources: the first node of each edge (numpy array)
+        :param targets: the second node of each edge (numpy array)
+        """
+        pass
+
+    def beforeRemoveEdges(self, sources, targets):
+        """
+        edges are about to be removed
+
+        :param sources: the first node of each edge (numpy array)
+        :param targets: the second node of each edge (numpy array)
+        """
+        pass
@@ -1,4 +1,14 @@
+from heapq import heappop, heappush
+from time import perf_counter
+
+import numpy as np
+
+from abm.agents import Agent, AgentKinds
 from abm.environment import EnvironmentOperable
+from abm.listeners import EnvironmentListener
+from abm.profiler import Profiler
+from abm.topology import ArrayTopology
+from settings import TRACER, PROFILER, TELEMETRY
 
 
 class AgentExecutor(EnvironmentOperable):
@@ -16,3 +26,222 @@ class AgentExecutor(EnvironmentOperable):
         """
         agent = self._env.getAgent(node)
         agent.do()
+
+
+class ActiveSetExecutor(EnvironmentOperable, EnvironmentListener):
+    """
+    executes the agents like the AgentExecutor, but only visits the nodes
+    whose agents can act (the active set).
+
+    A node visited while its agent is idle (see Agent.isIdle()) leaves the
+    active set, passive agents never join it. The executor listens to the
+    environment and puts a node back when its agent or state changes, when
+    an agent is placed on a neighbor or when it gains or loses an edge.
+    This happens during the traversal as well: a node activated ahead of the
+    current one is visited in the same traversal, just like visiting every
+    node in order would. Results are therefore the same, while a timestep
+    costs time in proportion to the agents acting rather than to the size
+    of the topology.
+
+    Idle agents trace events as well, so while tracing (see abm.trace)
+    every node is visited.
+    """
+
+    # below this number of nodes, nodes are activated one by one instead of
+    # as an array
+    SMALL_MARK = 16
+
+    def __init__(self, env=None):
+        super().__init__(env)
+        self.__nodes = []
+        # None when nodes are visited in the order of their indices,
+        # otherwise the position of each node in the order of the topology
+        self.__ranks = None
+        # a flag per node (a bytearray is faster to look at one by one)
+        self.__active = bytearray()
+        self.__cliques = []
+        self.__clique_ids = None
+        self.__acting = None
+        self.__acting_kinds = 0
+        # the nodes still to visit and the node visited last while
+        # traversing
+        self.__heap = None
+        self.__position = -1
+
+    def isNodewise(self) -> bool:
+        return False
+
+    def __call__(self, node: int):
+        pass
+
+    def setEnvironment(self, env):
+        """
+        starts listening to a new environment. All nodes holding agents
+        which are not passive are active.
+
+        :param env: the environment of the operable
+        """
+        if env is self._env:
+            return
+        if self._env is not None:
+            self._env.removeListener(self)
+        super().setEnvironment(env)
+        env.addListener(self)
+
+        topology = env.getBackend()
+        nodes = topology.nodes()
+        self.__nodes = nodes
+        self.__ranks = None
+        if any(a >= b for a, b in zip(nodes, nodes[1:])):
+            self.__ranks = {node: i for i, node in enumerate(nodes)}
+        self.__cliques = topology.getCliques()
+        self.__clique_ids = topology.getCliqueIds() if self.__cliques \
+            else None
+        self.__acting = None
+        size = len(nodes) if self.__ranks is not None else \
+            (nodes[-1] + 1 if nodes else 0)
+        self.__active = bytearray(size)
+        self.__mark(nodes)
+
+    def preProcess(self):
+        """
+        executes the agents of the active nodes in order
+        """
+        if TRACER.enabled:
+            for node in self.__nodes:
+                self._env.getAgent(node).do()
+            if TELEMETRY.enabled:
+                TELEMETRY.count(len(self.__nodes))
+            return
+
+        heap = np.flatnonzero(self.__flags()).tolist()
+        self.__heap = heap
+        self.__position = -1
+        steps = 0
+        try:
+            while heap:
+                rank = heappop(heap)
+                self.__position = rank
+                node = rank if self.__ranks is None else self.__nodes[rank]
+                agent = self._env.getAgent(node)
+                if agent is None or agent.isIdle():
+                    self.__active[rank] = 0
+                    if PROFILER.enabled:
+                        PROFILER.count(Profiler.IDLE_AGENTS)
+                elif PROFILER.enabled:
+                    begin = perf_counter()
+                    agent.do()
+                    steps += 1
+                    PROFILER.record(Profiler.AGENT, type(agent).__name__,
+                                    perf_counter() - begin)
+                else:
+                    agent.do()
+                    steps += 1
+        finally:
+            self.__heap = None
+            self.__position = -1
+            if TELEMETRY.enabled:
+                TELEMETRY.count(steps)
+
+    def isSettled(self) -> bool:
+        """
+        :returns whether no node is active, i.e. the last traversal found
+        every agent idle and nothing changed since. Further traversals would
+        not change anything.
+        """
+        return self._env is not None and not TRACER.enabled and \
+            not self.__flags().any()
+
+    def beforeSetAgent(self, index: int, agent):
+        self.__mark([index], True)
+        self.__markNeighbors(index)
+
+    def beforeSetState(self, index: int, state: int):
+        self.__mark([index], True)
+
+    def beforeAddEdges(self, sources, targets):
+        self.__mark(sources.tolist() + targets.tolist())
+
+    def beforeRemoveEdges(self, sources, targets):
+        self.__mark(sources.tolist() + targets.tolist())
+
+    def __markNeighbors(self, index: int):
+        """
+        activates the neighbors of a node (the members of its clique
+        at once)
+
+        :param index: the index of the node
+        """
+        topology = self._env.getBackend()
+        self.__mark(topology.neighbors(index, cliques=False))
+        if self.__clique_ids is not None:
+            clique = self.__clique_ids[index]
+            if clique >= 0:
+                self.__mark(self.__cliques[clique])
+
+    def __mark(self, nodes, everything: bool = False):
+        """
+        activates nodes. Nodes ahead of the node visited last are visited in
+        the current traversal.
+
+        :param nodes: the indices of the nodes
+        :param everything: activate nodes holding passive agents as well
+        (e.g. when a new agent is about to be placed)
+        """
+        if len(nodes) < ActiveSetExecutor.SMALL_MARK:
+            active, ranks = self.__active, self.__ranks
+            if not isinstance(nodes, list):
+                nodes = np.asarray(nodes).tolist()
+            nodes = [node for node in nodes if not
+                     active[node if ranks is None else ranks[node]]]
+            if nodes and not everything:
+                nodes = np.array(nodes)[self.__mayAct(np.array(nodes))]
+                nodes = nodes.tolist()
+            for node in nodes:
+                rank = node if ranks is None else ranks[node]
+                active[rank] = 1
+                if self.__heap is not None and rank > self.__position:
+                    heappush(self.__heap, rank)
+            return
+
+        nodes = np.asarray(nodes, dtype=np.int64)
+        if not everything:
+            nodes = nodes[self.__mayAct(nodes)]
+        if self.__ranks is None:
+            ranks = nodes
+        else:
+            ranks = np.array([self.__ranks[node] for node in nodes.tolist()],
+                             dtype=np.int64)
+        flags = self.__flags()
+        ranks = np.unique(ranks[~flags[ranks]])
+        flags[ranks] = True
+        if self.__heap is not None:
+            for rank in ranks[ranks > self.__position].tolist():
+                heappush(self.__heap, rank)
+
+    def __flags(self) -> np.ndarray:
+        """
+        :returns the active flags as a (writable) boolean array
+        """
+        return np.frombuffer(self.__active, dtype=bool)
+
+    def __mayAct(self, nodes: np.ndarray) -> np.ndarray:
+        """
+        :returns whether each node holds an agent which is not passive
+        :param nodes: the indices of the nodes
+        """
+        topology = self._env.getBackend()
+        if not isinstance(topology, ArrayTopology):
+            return np.array([issubclass(topology.getAgentType(node), Agent)
+                             and not topology.getAgentType(node).PASSIVE
+                             for node in nodes.tolist()], dtype=bool)
+        # recomputed whenever new kinds have been registered
+        if self.__acting is None or \
+                self.__acting_kinds != AgentKinds.count():
+            types = [AgentKinds.getType(kind)
+                     for kind in range(1, AgentKinds.count())]
+            self.__acting = AgentKinds.getMask(
+                *[agent_type for agent_type in types
+                  if not agent_type.PASSIVE])
+            self.__acting_kinds = AgentKinds.count()
+        return self.__acting[topology.getKinds()[nodes]]
@@ -0,0 +1,134 @@
+import pandas as pd
+
+
+class Profiler:
+    """
+    opt-in instrumentation of the topology traversal.
+
+    This is a singleton class like Logger (see ../settings.py for usage).
+    While enabled, Environment.traverseTopology() records the wall time and
+    calls of each operable (split into preProcess, nodes and postProcess)
+    and of the nodes holding each type of agent. Counters (e.g. neighbor
+    queries or random links) are recorded by whoever does the counted
+    thing. Everything is recorded per trial and timestep (see setTrial() and
+    setTime()).
+
+    Like the Tracer, hot paths check the profiler first, so a disabled
+    profiler costs a single attribute lookup:
+
+        if PROFILER.enabled:
+            PROFILER.count(Profiler.NEIGHBOR_QUERIES)
+
+    Note that trials running in worker processes are not recorded, profile
+    with a single worker.
+    """
+    # categories of records
+    OPERABLE = 'operable'
+    AGENT = 'agent'
+    COUNTER = 'counter'
+
+    # counters
+    NEIGHBOR_QUERIES = 'neighbor queries'
+    RANDOM_LINKS = 'random links'
+    IDLE_AGENTS = 'idle agents'
+
+    # internal class (used for singleton pattern)
+    class __Profiler:
+        def __init__(self):
+            self.enabled = False
+            self.__trial = 0
+            self.__time = 0
+            self.__records = {}
+
+        def enable(self):
+            """
+            starts recording
+            """
+            self.enabled = True
+
+        def disable(self):
+            """
+            stops recording (the records are kept)
+            """
+            self.enabled = False
+
+        def reset(self):
+            """
+            drops all records
+            """
+            self.__records = {}
+
+        def setTrial(self, trial: int):
+            """
+            sets the trial recorded with the following records
+
+            :param trial: the trial
+            """
+            self.__trial = trial
+
+        def setTime(self, time: int):
+            """
+            sets the timestep recorded with the following records
+
+            :param time: the timestep
+            """
+            self.__time = time
+
+        def record(self, category: str, name: str, seconds: float,
+                   calls: int = 1):
+            """
+            adds calls and their wall time to a record
+
+            :param category: the category (OPERABLE, AGENT or COUNTER)
+            :param name: the name of the record, e.g. the class of the
+            operable
+            :param seconds: the wall time of the calls
+            :param calls: the number of calls
+            """
+            key = (self.__trial, self.__time, category, name)
+            entry = self.__records.get(key)
+            if entry is None:
+                self.__records[key] = [calls, seconds]
+            else:
+                entry[0] += calls
+                entry[1] += seconds
+
+        def count(self, name: str, calls: int = 1):
+            """
+            increases a counter
+
+            :param name: the name of the counter
+            :param calls: the increase
+            """
+            self.record(Profiler.COUNTER, name, 0.0, calls)
+
+        def getDataFrame(self, by: tuple = ('trial', 'time')) -> pd.DataFrame:
+            """
+            :returns the records as pandas.DataFrame with the columns trial,
+            time, category, name, calls and seconds
+            :param by: the columns to keep apart, the others are summed up.
+            ('trial',) reports per trial, () reports the totals.
+            """
+            data = pd.DataFrame(
+                [key + tuple(entry) for key, entry in self.__records.items()],
+                columns=['trial', 'time', 'category', 'name', 'calls',
+                         'seconds'])
+            return data.groupby(list(by) + ['category', 'name'],
+                                as_index=False)[['calls', 'seconds']].sum()
+
+        def dump(self, by: tuple = ()):
+            """
+            prints the records
+
+            :param by: the columns to keep apart (see getDataFrame())
+            """
+            print(self.getDataFrame(by).to_string(index=False))
+
+    __instance = __Profiler()
+
+    @staticmethod
+    def getInstance() -> __Profiler:
+        """
+        :returns the Profiler instance (Singleton)
+        """
+        return Profiler.__instance
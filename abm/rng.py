@@ -0,0 +1,153 @@
+from random import getrandbits
+
+import numpy as np
+
+from abm.agents import AgentKinds
+
+
+class RandomStream:
+    """
+    a stream of uniform random numbers in [0, 1) drawn from a
+    numpy.random.Generator.
+
+    Numbers are drawn in blocks (see BLOCK_SIZE) by a single call to the
+    generator and handed out one by one. A generator yields the same numbers
+    no matter how many of them are drawn at once, so the numbers handed out
+    do not depend on the size of the blocks.
+
+    :param generator: the numpy.random.Generator to draw from
+    """
+
+    __slots__ = ('__generator', '__values')
+
+    # the numbers drawn at once when the stream runs dry
+    BLOCK_SIZE = 4096
+
+    def __init__(self, generator: np.random.Generator):
+        self.__generator = generator
+        # the numbers drawn but not handed out yet, the next one last
+        self.__values = []
+
+    def random(self) -> float:
+        """
+        :returns the next number of the stream
+        """
+        values = self.__values
+        if not values:
+            self.reserve(RandomStream.BLOCK_SIZE)
+            values = self.__values
+        return values.pop()
+
+    def choice(self, sequence):
+        """
+        :returns a random element of a sequence
+        :param sequence: the (non-empty) sequence
+        """
+        return sequence[int(self.random() * len(sequence))]
+
+    def uniforms(self, size: int) -> np.ndarray:
+        """
+        :returns the next numbers of the stream as array, e.g. the numbers a
+        whole timestep needs. Numbers not drawn yet are drawn as array in a
+        single call.
+        :param size: the number of numbers
+        """
+        values = self.__values
+        held = min(size, len(values))
+        drawn = values[len(values) - held:]
+        del values[len(values) - held:]
+        return np.concatenate((np.array(drawn[::-1], dtype=np.float64),
+                               self.__generator.random(size - held)))
+
+    def reserve(self, size: int):
+        """
+        draws numbers in advance (in one call) so that at least a given
+        number of them is at hand
+
+        :param size: the number of numbers needed
+        """
+        missing = size - len(self.__values)
+        if missing > 0:
+            self.__values = self.__generator.random(missing)[::-1].tolist() \
+                + self.__values
+
+    def getState(self) -> dict:
+        """
+        :returns the state of the stream: the state of the generator and the
+        numbers drawn but not handed out yet
+        """
+        return {'generator': self.__generator.bit_generator.state,
+                'values': list(self.__values)}
+
+    def setState(self, state: dict):
+        """
+        sets the state of the stream (see getState())
+
+        :param state: the state
+        """
+        self.__generator.bit_generator.state = state['generator']
+        self.__values = list(state['values'])
+
+
+class RandomStreams:
+    """
+    the random numbers of a trial: an independent RandomStream for each
+    kind of agent (see AgentKinds), all derived from a single seed.
+
+    A stream only depends on the seed and the kind, so how many agents of
+    other kinds draw numbers (or in which process the trial runs) does not
+    matter. Running a trial with the same seed gives the same numbers bit
+    for bit.
+
+    :param seed: the seed of the trial. By default, it is drawn from the
+    random module once the first number is needed.
+    """
+
+    def __init__(self, seed: int = None):
+        self.__seed = seed
+        self.__streams = {}
+
+    def getSeed(self) -> int:
+        """
+        :returns the seed the streams are derived from
+        """
+        if self.__seed is None:
+            self.__seed = getrandbits(64)
+        return self.__seed
+
+    def getStream(self, agent_type) -> RandomStream:
+        """
+        :returns the stream of a kind of agents
+        :param agent_type: the class of the agents
+        """
+        stream = self.__streams.get(agent_type)
+        if stream is None:
+            sequence = np.random.SeedSequence(
+                [self.getSeed(), AgentKinds.getKind(agent_type)])
+            stream = RandomStream(np.random.Generator(np.random.PCG64(
+                sequence)))
+            self.__streams[agent_type] = stream
+        return stream
+
+    def getState(self) -> dict:
+        """
+        :returns the seed and the state of each stream drawn from so far, by
+        kind (see RandomStream.getState())
+        """
+        return {'seed': self.getSeed(), 'streams': {
+            AgentKinds.getKind(agent_type): stream.getState()
+            for agent_type, stream in self.__streams.items()}}
+
+    def setState(self, state: dict):
+        """
+        sets the state of the streams (see getState()). Streams not drawn
+        from before start from the seed.
+
+        :param state: the state
+        """
+        self.__seed = state['seed']
+        self.__streams = {}
+        # kinds are keyed by strings once the state went through JSON
+        for kind, stream_state in state['streams'].items():
+            self.getStream(AgentKinds.getType(int(kind))).setState(
+                stream_state)
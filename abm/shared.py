@@ -0,0 +1,118 @@
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedArrays:
+    """
+    numpy arrays in shared memory (see multiprocessing.shared_memory), so
+    processes on one machine work on the same arrays without copying or
+    pickling them.
+
+    The process creating the arrays owns them and frees the memory by
+    close(). Other processes attach() to them by their handle (see
+    getHandle()), which pickles to a few names. Arrays marked read-only are
+    handed out read-only to attached processes.
+
+        arrays = SharedArrays({'kinds': kinds}, readonly=('kinds',))
+        # in another process
+        shared = SharedArrays.attach(arrays.getHandle())
+        shared['kinds']
+
+    :param arrays: the arrays to put into shared memory by name (copied)
+    :param readonly: the names of the arrays attached processes must not
+    write to
+    """
+
+    def __init__(self, arrays: dict = None, readonly=()):
+        self.__blocks = {}
+        self.__arrays = {}
+        self.__readonly = tuple(readonly)
+        self.__owner = True
+        for name, array in (arrays or {}).items():
+            self.add(name, array)
+
+    def add(self, name: str, array: np.ndarray) -> np.ndarray:
+        """
+        puts another array into shared memory
+
+        :param name: the name of the array
+        :param array: the array (copied)
+        :return: the array in shared memory
+        """
+        if not self.__owner:
+            raise Exception("Only the owner of shared arrays can add arrays")
+        array = np.ascontiguousarray(array)
+        # blocks cannot be empty
+        block = shared_memory.SharedMemory(create=True,
+                                           size=max(array.nbytes, 1))
+        shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        shared[...] = array
+        self.__blocks[name] = block
+        self.__arrays[name] = shared
+        return shared
+
+    def getHandle(self) -> dict:
+        """
+        :returns what attach() needs to find the arrays: the name, shape and
+        type of each of them and which of them are read-only
+        """
+        return {'arrays': {name: (self.__blocks[name].name, array.shape,
+                                  array.dtype.str)
+                           for name, array in self.__arrays.items()},
+                'readonly': self.__readonly}
+
+    @staticmethod
+    def attach(handle: dict):
+        """
+        :returns the arrays of another process
+        :param handle: the handle of the arrays (see getHandle())
+        """
+        shared = SharedArrays()
+        shared.__owner = False
+        shared.__readonly = handle['readonly']
+        for name, (block_name, shape, dtype) in handle['arrays'].items():
+            # the owner frees the block. Processes started by
+            # multiprocessing share the resource tracker of the owner, which
+            # is told once the block is freed.
+            if sys.version_info >= (3, 13):
+                block = shared_memory.SharedMemory(name=block_name,
+                                                   track=False)
+            else:
+                block = shared_memory.SharedMemory(name=block_name)
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            if name in shared.__readonly:
+                array.flags.writeable = False
+            shared.__blocks[name] = block
+            shared.__arrays[name] = array
+        return shared
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.__arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.__arrays
+
+    def names(self) -> list:
+        """
+        :returns the names of the arrays
+        """
+        return list(self.__arrays)
+
+    def close(self):
+        """
+        detaches from the arrays. The owner frees them as well, so they must
+        not be used by any process afterwards.
+        """
+        self.__arrays = {}
+        for block in self.__blocks.values():
+            try:
+                block.close()
+            except BufferError:
+                # arrays handed out are still around, the memory is mapped
+                # until they are gone
+                pass
+            if self.__owner:
+                block.unlink()
+        self.__blocks = {}
@@ -0,0 +1,293 @@
+import json
+import math
+import os
+import sys
+import time
+from time import perf_counter
+
+
+class Telemetry:
+    """
+    opt-in live metrics of a running simulation, written to a file every
+    few seconds, so long runs can be watched (and slowdowns spotted) without
+    attaching a profiler.
+
+    This is a singleton class like Logger (see ../settings.py for usage):
+
+        TELEMETRY.enable('run.jsonl')
+        env.runSimulation(...)
+
+    Each sample holds the trial progress and an ETA, the timesteps and
+    agent steps (agents acting) per second since the sample before, the
+    agents of each class (see Environment.countAgents()), the number of
+    edges (which grows through random links) and the resident memory of the
+    process. A .prom file is
+    rewritten with the latest sample in the Prometheus text format (e.g.
+    for the textfile collector of a node exporter), any other file gets a
+    JSON line appended per sample.
+
+    Like the Profiler, hot paths check the telemetry first, so disabled
+    telemetry costs a single attribute lookup. Enabled, a timestep costs a
+    clock reading, everything else is only looked at when a sample is due.
+    Trials running in worker processes are counted once they are done,
+    their timesteps and agent steps are not.
+    """
+    JSON_LINES = 'jsonl'
+    PROMETHEUS = 'prometheus'
+
+    # the default seconds between two samples
+    EVERY = 10.0
+
+    # the metrics of the Prometheus format and their help texts
+    METRICS = (
+        ('progress', 'the share of the simulation done'),
+        ('eta_seconds', 'the estimated seconds left'),
+        ('elapsed_seconds', 'the seconds since the simulation started'),
+        ('trial', 'the trial running'),
+        ('trials', 'the trials of the simulation'),
+        ('trials_done', 'the trials done'),
+        ('timestep', 'the timestep running'),
+        ('timesteps', 'the timesteps of a trial'),
+        ('timesteps_total', 'the timesteps run so far'),
+        ('agent_steps_total', 'the agent steps run so far'),
+        ('timesteps_per_second', 'timesteps per second'),
+        ('agent_steps_per_second', 'agent steps per second'),
+        ('edges', 'the edges of the topology'),
+        ('rss_bytes', 'the resident memory of the process'))
+
+    # internal class (used for singleton pattern)
+    class __Telemetry:
+        def __init__(self):
+            self.enabled = False
+            # set by enable()
+            self.__path = None
+            self.__format = None
+            self.__every = 0.0
+            self.__env = None
+            self.__start = 0.0
+            self.__due = 0.0
+            self.__trials = 0
+            self.__timesteps = 0
+            self.__trial = 0
+            self.__timestep = 0
+            self.__done = 0
+            self.__steps = 0
+            self.__agent_steps = 0
+            # the clock and totals of the sample before (for the rates)
+            self.__last = (0.0, 0, 0)
+
+        def enable(self, path: str, every: float = None, format: str = None):
+            """
+            starts writing samples to a file
+
+            :param path: the file
+            :param every: the seconds between two samples (EVERY by
+            default)
+            :param format: JSON_LINES or PROMETHEUS. By default, files
+            ending with .prom are written in the Prometheus format.
+            """
+            if format is None:
+                format = Telemetry.PROMETHEUS if path.endswith('.prom') \
+                    else Telemetry.JSON_LINES
+            if format not in (Telemetry.JSON_LINES, Telemetry.PROMETHEUS):
+                raise Exception("Unknown telemetry format %s" % format)
+            self.__path = path
+            self.__format = format
+            self.__every = Telemetry.EVERY if every is None else every
+            self.enabled = True
+
+        def disable(self):
+            """
+            stops writing samples
+            """
+            self.enabled = False
+
+        def startRun(self, trials: int, timesteps: int, done: int = 0):
+            """
+            starts counting a simulation
+
+            :param trials: the trials of the simulation
+            :param timesteps: the timesteps of a trial
+            :param done: the trials done before, e.g. of a resumed
+            simulation
+            """
+            self.__start = perf_counter()
+            self.__due = self.__start + self.__every
+            self.__env = None
+            self.__trials = trials
+            self.__timesteps = timesteps
+            self.__trial = done
+            self.__timestep = 0
+            self.__done = done
+            self.__steps = 0
+            self.__agent_steps = 0
+            self.__last = (self.__start, 0, 0)
+
+        def setTrial(self, trial: int):
+            """
+            sets the trial running
+
+            :param trial: the trial
+            """
+            self.__trial = trial
+            self.__timestep = 0
+
+        def count(self, agent_steps: int):
+            """
+            counts the agents which acted
+
+            :param agent_steps: the number of agents
+            """
+            self.__agent_steps += agent_steps
+
+        def tick(self, env, timestep: int):
+            """
+            counts a timestep run and writes a sample when one is due
+
+            :param env: the environment of the timestep
+            :param timestep: the timestep
+            """
+            self.__env = env
+            self.__timestep = timestep + 1
+            self.__steps += 1
+            if perf_counter() >= self.__due:
+                self.write()
+
+        def finishTrial(self):
+            """
+            counts a trial done and writes a sample when one is due
+            """
+            self.__done += 1
+            self.__timestep = 0
+            if perf_counter() >= self.__due:
+                self.write()
+
+        def finishRun(self):
+            """
+            writes the last sample of a simulation
+            """
+            # simulations running until their results are precise enough
+            # stop before their trials run out
+            self.__trials = self.__done
+            self.__timestep = 0
+            self.write()
+            self.__env = None
+
+        def getSample(self) -> dict:
+            """
+            :returns the metrics as they are now (see Telemetry). The
+            agents, edges and rates are None until a timestep is run in
+            this process.
+            """
+            now = perf_counter()
+            elapsed = now - self.__start
+            progress = 1.0
+            if self.__trials > 0:
+                progress = min(1.0, (self.__done + self.__timestep /
+                                     max(self.__timesteps, 1)) /
+                               self.__trials)
+            last, steps, agent_steps = self.__last
+            seconds = now - last
+            sample = {
+                'time': time.time(), 'progress': progress,
+                'eta_seconds': elapsed * (1 - progress) / progress
+                if progress > 0 else None,
+                'elapsed_seconds': elapsed, 'trial': self.__trial,
+                'trials': self.__trials, 'trials_done': self.__done,
+                'timestep': self.__timestep, 'timesteps': self.__timesteps,
+                'timesteps_total': self.__steps,
+                'agent_steps_total': self.__agent_steps,
+                'timesteps_per_second': None, 'agent_steps_per_second': None,
+                'edges': None, 'agents': None,
+                'rss_bytes': Telemetry.getRSS()}
+            if self.__env is not None:
+                sample['edges'] = self.__env.getBackend().numberOfEdges()
+                sample['agents'] = {
+                    agent_type.__name__: count for agent_type, count in
+                    self.__env.countAgents().items()}
+            if seconds > 0 and self.__steps > 0:
+                sample['timesteps_per_second'] = \
+                    (self.__steps - steps) / seconds
+                sample['agent_steps_per_second'] = \
+                    (self.__agent_steps - agent_steps) / seconds
+            return sample
+
+        def write(self):
+            """
+            writes a sample right away
+            """
+            sample = self.getSample()
+            now = perf_counter()
+            self.__last = (now, self.__steps, self.__agent_steps)
+            self.__due = now + self.__every
+            if self.__format == Telemetry.JSON_LINES:
+                with open(self.__path, 'a') as f:
+                    f.write(json.dumps(sample) + '\n')
+            else:
+                # scrapers never see a half written file
+                with open(self.__path + '.tmp', 'w') as f:
+                    f.write(Telemetry.formatPrometheus(sample))
+                os.replace(self.__path + '.tmp', self.__path)
+
+    __instance = __Telemetry()
+
+    @staticmethod
+    def getInstance() -> __Telemetry:
+        """
+        :returns the Telemetry instance (Singleton)
+        """
+        return Telemetry.__instance
+
+    @staticmethod
+    def formatPrometheus(sample: dict) -> str:
+        """
+        :returns a sample in the Prometheus text format. Metrics without a
+        value are left out.
+        :param sample: the sample (see getSample())
+        """
+        lines = []
+        for name, text in Telemetry.METRICS:
+            if sample[name] is not None:
+                lines += ['# HELP abm_%s %s' % (name, text),
+                          '# TYPE abm_%s gauge' % name,
+                          'abm_%s %s' % (name, Telemetry.formatValue(
+                              sample[name]))]
+        if sample['agents'] is not None:
+            lines += ['# HELP abm_agents the living agents of each class',
+                      '# TYPE abm_agents gauge']
+            lines += ['abm_agents{class="%s"} %d' % (name, count)
+                      for name, count in sorted(sample['agents'].items())]
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def formatValue(value) -> str:
+        """
+        :returns a value as written in the Prometheus text format, which
+        spells infinity and NaN as +Inf, -Inf and NaN
+        :param value: the value
+        """
+        value = float(value)
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+
+    @staticmethod
+    def getRSS() -> int:
+        """
+        :returns the resident memory of the process in bytes (the peak where
+        the current one is not known) or None
+        """
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, AttributeError):
+            pass
+        try:
+            import resource
+        except ImportError:
+            return None
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes everywhere but on macOS
+        return rss if sys.platform == 'darwin' else rss * 1024
@@ -0,0 +1,983 @@
+import os
+from copy import copy
+
+import networkx as nx
+import numpy as np
+
+from abm.agents import AgentKinds
+
+
+class Topology:
+    """
+    The node topology an environment is working on.
+
+    The environment only talks to its topology through this interface,
+    so different storage backends can be plugged in. Nodes are identified by
+    integer indices and every node can hold an agent.
+    """
+
+    def nodes(self) -> list:
+        """
+        :returns a list of all node indices. The list is not affected by
+        later modifications of the topology.
+        """
+        raise NotImplementedError
+
+    def getNodeArray(self) -> np.ndarray:
+        """
+        :returns the node indices as array (in the order of nodes()). Do not
+        modify it.
+        """
+        return np.array(self.nodes(), dtype=np.int64)
+
+    def neighbors(self, index: int, cliques: bool = True) -> list:
+        """
+        :returns the indices of the neighbors of a node
+        :param index: the index of the node
+        :param cliques: include the neighbors within the clique of the node
+        (see getCliques())
+        """
+        raise NotImplementedError
+
+    def getNeighborNodes(self, index: int, *types) -> list:
+        """
+        :returns the neighbors of a node holding agents of the given types
+        :param index: the index of the node
+        :param types: the agent classes we are interested in
+        """
+        return [neighbor for neighbor in self.neighbors(index) if
+                type(self.getAgent(neighbor)) in types]
+
+    def addEdge(self, u: int, v: int):
+        """
+        connects two nodes. Nothing happens if they are connected already.
+
+        :param u: the index of the first node
+        :param v: the index of the second node
+        """
+        raise NotImplementedError
+
+    def addEdges(self, sources, targets):
+        """
+        connects many pairs of nodes at once
+
+        :param sources: the first node of each edge
+        :param targets: the second node of each edge
+        """
+        for u, v in zip(sources, targets):
+            self.addEdge(int(u), int(v))
+
+    def removeEdge(self, u: int, v: int):
+        """
+        disconnects two nodes. Nothing happens if they are not connected.
+
+        :param u: the index of the first node
+        :param v: the index of the second node
+        """
+        raise NotImplementedError
+
+    def removeEdges(self, sources, targets):
+        """
+        disconnects many pairs of nodes at once
+
+        :param sources: the first node of each edge
+        :param targets: the second node of each edge
+        """
+        for u, v in zip(sources, targets):
+            self.removeEdge(int(u), int(v))
+
+    def hasEdge(self, u: int, v: int) -> bool:
+        """
+        :returns whether two nodes are connected
+        :param u: the index of the first node
+        :param v: the index of the second node
+        """
+        raise NotImplementedError
+
+    def numberOfNodes(self) -> int:
+        """
+        :returns the number of nodes
+        """
+        raise NotImplementedError
+
+    def numberOfEdges(self) -> int:
+        """
+        :returns the number of edges
+        """
+        raise NotImplementedError
+
+    def getAgent(self, index: int):
+        """
+        :returns the agent placed on a node
+        :param index: the index of the node
+        """
+        raise NotImplementedError
+
+    def setAgent(self, index: int, agent):
+        """
+        places an agent on a node
+
+        :param index: the index of the node
+        :param agent: the agent to place on the node
+        """
+        raise NotImplementedError
+
+    def setAgents(self, indices, agent):
+        """
+        places an agent on many nodes at once. Only called for topologies
+        which do not keep agents (see keepsAgents()).
+
+        :param indices: the indices of the nodes (numpy array)
+        :param agent: the agent to place on the nodes
+        """
+        raise NotImplementedError
+
+    def keepsAgents(self) -> bool:
+        """
+        :returns whether the agent objects placed on nodes are kept. If not,
+        getAgent() returns a view of the agent (see Agent.view()) and
+        changing it only affects the topology through the environment.
+        """
+        return True
+
+    def getAgentType(self, index: int):
+        """
+        :returns the class of the agent placed on a node (type(None) for
+        nodes without an agent)
+        :param index: the index of the node
+        """
+        return type(self.getAgent(index))
+
+    def countAgents(self) -> dict:
+        """
+        :returns the number of agents of each class placed on the nodes
+        """
+        counts = {}
+        for node in self.nodes():
+            agent_type = self.getAgentType(node)
+            if agent_type is not type(None):
+                counts[agent_type] = counts.get(agent_type, 0) + 1
+        return counts
+
+    def getState(self, index: int) -> int:
+        """
+        :returns the recorded state of the agent placed on a node
+        :param index: the index of the node
+        """
+        raise NotImplementedError
+
+    def setState(self, index: int, state: int):
+        """
+        records the state of the agent placed on a node
+
+        :param index: the index of the node
+        :param state: the state flags (see Agent.getState())
+        """
+        raise NotImplementedError
+
+    def newEdges(self, sources, targets):
+        """
+        :returns the pairs of nodes which are not connected yet (sources and
+        targets as arrays). Pairs showing up several times are returned once.
+        :param sources: the first node of each pair
+        :param targets: the second node of each pair
+        """
+        pairs = {}
+        for u, v in zip(np.asarray(sources).tolist(),
+                        np.asarray(targets).tolist()):
+            if (v, u) not in pairs and not self.hasEdge(u, v):
+                pairs[(u, v)] = None
+        edges = np.array(list(pairs), dtype=np.int64).reshape(-1, 2)
+        return edges[:, 0], edges[:, 1]
+
+    def edgeArrays(self, cliques: bool = True):
+        """
+        :returns the rows and columns of all directed adjacency entries. Every
+        undirected edge shows up in both directions, self loops once.
+        :param cliques: include the edges within cliques (see getCliques()).
+        Without them, only the edges stored explicitly show up.
+        """
+        nodes = self.nodes()
+        neighbors = [self.neighbors(node) for node in nodes]
+        rows = np.repeat(np.array(nodes, dtype=np.int64),
+                         [len(n) for n in neighbors])
+        columns = np.array([v for n in neighbors for v in n], dtype=np.int64)
+        return rows, columns
+
+    def getCliques(self) -> list:
+        """
+        :returns the cliques whose edges are not stored explicitly, each of
+        them an array of its members. All members of a clique are connected.
+        """
+        return []
+
+    def saveEdges(self):
+        """
+        :return: whatever restoreEdges() needs to restore the current edges
+        """
+        raise NotImplementedError
+
+    def restoreEdges(self, saved, changes: list):
+        """
+        restores the edges saved by saveEdges(). The changes made in the
+        meantime are passed in as well.
+
+        :param saved: the return value of saveEdges()
+        :param changes: the edge changes in the order they were made, each of
+        them a tuple (added, sources, targets) where added is False for
+        removed edges
+        """
+        raise NotImplementedError
+
+    def getGraph(self) -> nx.Graph:
+        """
+        :returns the topology as networkx.Graph holding the agents in the
+        node attribute 'agent'
+        """
+        raise NotImplementedError
+
+    def copy(self):
+        """
+        :returns a copy of the topology. Agents are copied as well, so
+        modifying them does not change the copy.
+        """
+        raise NotImplementedError
+
+
+class GraphTopology(Topology):
+    """
+    a topology backed by a networkx.Graph. This is the default backend.
+
+    :param graph: the networkx.Graph to work on
+    """
+
+    def __init__(self, graph: nx.Graph = None):
+        self._graph = nx.Graph() if graph is None else graph
+
+    def nodes(self) -> list:
+        return list(self._graph.nodes())
+
+    def neighbors(self, index: int, cliques: bool = True) -> list:
+        return list(self._graph.neighbors(index))
+
+    def getNeighborNodes(self, index: int, *types) -> list:
+        g = self._graph
+        return [neighbor for neighbor in g.neighbors(index) if
+                type(g.node[neighbor]['agent']) in types]
+
+    def addNode(self, index: int):
+        """
+        adds a node to the topology
+
+        :param index: the index of the new node
+        """
+        self._graph.add_node(index)
+
+    def addEdge(self, u: int, v: int):
+        self._graph.add_edge(u, v)
+
+    def removeEdge(self, u: int, v: int):
+        if self._graph.has_edge(u, v):
+            self._graph.remove_edge(u, v)
+
+    def hasEdge(self, u: int, v: int) -> bool:
+        return self._graph.has_edge(u, v)
+
+    def numberOfNodes(self) -> int:
+        return self._graph.number_of_nodes()
+
+    def numberOfEdges(self) -> int:
+        return self._graph.number_of_edges()
+
+    def getAgent(self, index: int):
+        return self._graph.node[index]['agent']
+
+    def setAgent(self, index: int, agent):
+        attributes = self._graph.node[index]
+        attributes['agent'] = agent
+        attributes['state'] = agent.getState()
+
+    def getState(self, index: int) -> int:
+        return self._graph.node[index]['state']
+
+    def setState(self, index: int, state: int):
+        self._graph.node[index]['state'] = state
+
+    def saveEdges(self):
+        """
+        nothing to save, restoring means undoing the changes
+        """
+        return None
+
+    def restoreEdges(self, saved, changes: list):
+        for added, sources, targets in reversed(changes):
+            edges = zip(np.asarray(sources).tolist(),
+                        np.asarray(targets).tolist())
+            if added:
+                self._graph.remove_edges_from(edges)
+            else:
+                self._graph.add_edges_from(edges)
+
+    def getGraph(self) -> nx.Graph:
+        return self._graph
+
+    def copy(self):
+        graph = self._graph.copy()
+        for node in graph.nodes():
+            attributes = graph.node[node]
+            if 'agent' in attributes:
+                attributes['agent'] = copy(attributes['agent'])
+        return GraphTopology(graph)
+
+
+class ArrayTopology(Topology):
+    """
+    a topology storing its adjacency as compressed sparse rows (CSR).
+
+    Node indices have to be non-negative integers. They are used to index
+    the arrays directly, so memory grows with the largest index rather than
+    with the number of nodes. Edges added after construction go to an append
+    buffer which is merged into the CSR arrays by compact() or by adding
+    many edges at once. Removed CSR entries are only marked as removed
+    (tombstones) until too many of them pile up (see REMOVED_EDGES). A
+    networkx.Graph is only built when getGraph() is called.
+
+    Cliques can be represented implicitly: their members are connected by
+    rule rather than by O(n^2) stored edges. Neighbor queries merge the
+    members into the stored neighbors, in the same order as if the edges
+    were stored. Edges within a clique cannot be removed.
+
+    No agent object is kept per node. Agent kinds (see AgentKinds), states
+    and flyweights are kept in typed arrays instead. A flyweight is the
+    agent of a class and parameters (see Agent.getParameters()) and
+    getAgent() hands out a view of it placed on the node in the node's state.
+    Placing an agent therefore writes three array cells, and turning a human
+    into a zombie does not leave an object behind.
+
+    :param nodes: the node indices
+    :param sources: the first node of each edge
+    :param targets: the second node of each edge
+    :param cliques: the members of each clique. A node can be a member of
+    one clique at most.
+    """
+
+    # batches of edges below this share of all edges are added to the
+    # append buffer instead of rebuilding the CSR arrays
+    SPARSE_EDGES = 1 / 64
+
+    # the CSR arrays are rebuilt once this share of their edges is removed
+    REMOVED_EDGES = 1 / 8
+
+    # the arrays written by save(), one .npy file each
+    FILES = ('nodes', 'indptr', 'indices', 'edges', 'cliques', 'clique_sizes')
+
+    def __init__(self, nodes, sources=(), targets=(), cliques=()):
+        nodes = np.unique(np.asarray(nodes, dtype=np.int64))
+        size = int(nodes[-1]) + 1 if len(nodes) > 0 else 0
+        self._nodes = nodes
+        self._node_list = nodes.tolist()
+        self._present = np.zeros(size, dtype=bool)
+        self._present[nodes] = True
+        self._cliques = []
+        self._clique_ids = np.full(size, -1, dtype=np.int32)
+        for members in cliques:
+            members = np.unique(np.asarray(members, dtype=np.int64))
+            if not self._present[members].all():
+                raise KeyError("Cannot make a clique of unknown nodes")
+            if (self._clique_ids[members] >= 0).any():
+                raise Exception("A node can be a member of one clique only")
+            self._clique_ids[members] = len(self._cliques)
+            self._cliques.append(members.astype(
+                np.int32 if size < 2 ** 31 else np.int64))
+        self._clique_edges = sum(len(members) * (len(members) - 1) // 2
+                                 for members in self._cliques)
+        self._indptr, self._indices, self._edges = ArrayTopology.__build(
+            size, *self.__dropCliqueEdges(
+                np.asarray(sources, dtype=np.int64),
+                np.asarray(targets, dtype=np.int64)))
+        self._rows = None
+        self._keys = None
+        self._extra = {}
+        self._extra_edges = 0
+        # the removed CSR entries of each node (both directions)
+        self._removed = {}
+        self._removed_edges = 0
+        self._kinds = np.zeros(size, dtype=np.uint8)
+        self._states = np.zeros(size, dtype=np.uint8)
+        self._flyweights = np.zeros(size, dtype=np.uint16)
+        # flyweight 0 is reserved for nodes without an agent
+        self._prototypes = [None]
+        self._prototype_ids = {}
+        self._graph = None
+
+    @staticmethod
+    def fromGraph(graph: nx.Graph):
+        """
+        :returns an ArrayTopology with the nodes, edges and agents of a
+        networkx.Graph
+        :param graph: the graph to convert
+        """
+        edges = np.array(list(graph.edges()), dtype=np.int64).reshape(-1, 2)
+        topology = ArrayTopology(list(graph.nodes()), edges[:, 0],
+                                 edges[:, 1])
+        for node in graph.nodes():
+            agent = graph.node[node].get('agent')
+            if agent is not None:
+                topology.setAgent(node, agent)
+        return topology
+
+    def save(self, directory: str):
+        """
+        writes the nodes, edges and cliques (not the agents) to a directory,
+        one .npy file per array (see FILES). Buffered edges are merged into
+        the written CSR arrays.
+
+        :param directory: the directory to write to
+        """
+        indptr, indices, edges = self._indptr, self._indices, self._edges
+        if self._extra or self._removed:
+            indptr, indices, edges = ArrayTopology.__build(
+                len(self._present), *self.edgeArrays(cliques=False))
+        arrays = {'nodes': self._nodes, 'indptr': indptr, 'indices': indices,
+                  'edges': np.array([edges], dtype=np.int64),
+                  'cliques': np.concatenate(
+                      [np.zeros(0, dtype=np.int64)] + self._cliques),
+                  'clique_sizes': np.array([len(members) for members in
+                                            self._cliques], dtype=np.int64)}
+        os.makedirs(directory, exist_ok=True)
+        for name in ArrayTopology.FILES:
+            np.save(os.path.join(directory, name + '.npy'), arrays[name])
+
+    @staticmethod
+    def load(directory: str, mmap: bool = True):
+        """
+        :returns the topology written to a directory by save() (without
+        agents)
+        :param directory: the directory
+        :param mmap: map the CSR arrays into memory instead of reading them.
+        They are never modified, so processes loading the same topology
+        share their pages.
+        """
+        arrays = {name: np.load(os.path.join(directory, name + '.npy'),
+                                mmap_mode='r' if mmap else None)
+                  for name in ArrayTopology.FILES}
+        sizes = np.asarray(arrays['clique_sizes'])
+        cliques = np.split(np.asarray(arrays['cliques']),
+                           np.cumsum(sizes)[:-1]) if len(sizes) > 0 else []
+        topology = ArrayTopology(arrays['nodes'], cliques=cliques)
+        topology._indptr = arrays['indptr']
+        topology._indices = arrays['indices']
+        topology._edges = int(arrays['edges'][0])
+        return topology
+
+    @staticmethod
+    def __build(size: int, sources: np.ndarray, targets: np.ndarray):
+        """
+        builds symmetric CSR arrays without duplicate edges
+
+        :param size: the number of rows
+        :param sources: the first node of each edge
+        :param targets: the second node of each edge
+        :return: indptr, indices and the number of undirected edges
+        """
+        rows = np.concatenate((sources, targets))
+        columns = np.concatenate((targets, sources))
+        keys = np.unique(rows * size + columns)
+        rows, columns = np.divmod(keys, size) if size > 0 else (keys, keys)
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+        dtype = np.int32 if size < 2 ** 31 else np.int64
+        edges = int(np.count_nonzero(rows <= columns))
+        return indptr, columns.astype(dtype), edges
+
+    def compact(self):
+        """
+        merges the append buffer into the CSR arrays and drops the removed
+        entries
+        """
+        if self._extra_edges == 0 and not self._removed:
+            return
+        self.__rebuild(*self.edgeArrays(cliques=False))
+
+    def __rebuild(self, rows: np.ndarray, columns: np.ndarray):
+        """
+        replaces the CSR arrays and empties the append buffer and the
+        tombstones
+
+        :param rows: the rows of all directed adjacency entries
+        :param columns: the columns of all directed adjacency entries
+        """
+        self._indptr, self._indices, self._edges = ArrayTopology.__build(
+            len(self._present), *self.__dropCliqueEdges(rows, columns))
+        self._rows = None
+        self._keys = None
+        self._extra = {}
+        self._extra_edges = 0
+        self._removed = {}
+        self._removed_edges = 0
+        self._graph = None
+
+    def __dropCliqueEdges(self, sources: np.ndarray, targets: np.ndarray):
+        """
+        :returns the edges which are not within a clique (sources and
+        targets)
+        :param sources: the first node of each edge
+        :param targets: the second node of each edge
+        """
+        if not self._cliques:
+            return sources, targets
+        outside = ~self.__withinClique(sources, targets)
+        return sources[outside], targets[outside]
+
+    def __withinClique(self, sources, targets) -> np.ndarray:
+        """
+        :returns whether each edge connects two members of the same clique
+        :param sources: the first node of each edge (array)
+        :param targets: the second node of each edge (array)
+        """
+        cliques = self._clique_ids[sources]
+        return (cliques >= 0) & (cliques == self._clique_ids[targets]) & \
+            (sources != targets)
+
+    def edgeArrays(self, cliques: bool = True):
+        """
+        :returns the rows and columns of all directed adjacency entries
+        (CSR without removed entries, append buffer and cliques). Every
+        undirected edge shows up in both directions. Without buffered edges
+        and cliques, rows are sorted and the columns of a row are in
+        neighbor order.
+        :param cliques: include the edges within cliques. These are
+        n * (n - 1) entries per clique of n members.
+        """
+        rows = self.__csrRows()
+        columns = self._indices.astype(np.int64)
+        if self._removed:
+            keys = self.__csrKeys()
+            removed = np.array([u * len(self._present) + v for u, vs in
+                                self._removed.items() for v in vs],
+                               dtype=np.int64)
+            keep = np.ones(len(keys), dtype=bool)
+            keep[np.searchsorted(keys, removed)] = False
+            rows, columns = rows[keep], columns[keep]
+        if self._extra:
+            extra_rows = [u for u, vs in self._extra.items() for _ in vs]
+            extra_columns = [v for vs in self._extra.values() for v in vs]
+            rows = np.concatenate((rows, extra_rows)).astype(np.int64)
+            columns = np.concatenate((columns, extra_columns)).astype(
+                np.int64)
+        if cliques:
+            for members in self._cliques:
+                members = members.astype(np.int64)
+                pairs = np.repeat(members, len(members)), np.tile(
+                    members, len(members))
+                pairs = [ends[pairs[0] != pairs[1]] for ends in pairs]
+                rows = np.concatenate((rows, pairs[0]))
+                columns = np.concatenate((columns, pairs[1]))
+        return rows, columns
+
+    def nodes(self) -> list:
+        return list(self._node_list)
+
+    def getNodeArray(self) -> np.ndarray:
+        """
+        :returns the node indices as sorted array. Do not modify it.
+        """
+        return self._nodes
+
+    def neighbors(self, index: int, cliques: bool = True) -> list:
+        if cliques and self._clique_ids[index] >= 0:
+            return self.neighborArray(index).tolist()
+        neighbors = self._indices[
+                    self._indptr[index]:self._indptr[index + 1]].tolist()
+        removed = self._removed.get(index)
+        if removed:
+            neighbors = [v for v in neighbors if v not in removed]
+        extra = self._extra.get(index)
+        if extra:
+            neighbors.extend(extra)
+        return neighbors
+
+    def neighborArray(self, index: int) -> np.ndarray:
+        """
+        :returns the neighbors of a node as array
+        :param index: the index of the node
+        """
+        row = self._indices[self._indptr[index]:self._indptr[index + 1]]
+        removed = self._removed.get(index)
+        if removed:
+            row = row[~np.isin(row, list(removed))]
+        clique = self._clique_ids[index]
+        if clique >= 0:
+            # the other members, merged in as if they were CSR entries
+            members = self._cliques[clique]
+            position = members.searchsorted(index)
+            row = np.sort(np.concatenate((row, members[:position],
+                                          members[position + 1:])))
+        extra = self._extra.get(index)
+        if extra:
+            row = np.concatenate((row, np.asarray(extra, dtype=row.dtype)))
+        return row
+
+    def getNeighborNodes(self, index: int, *types) -> list:
+        row = self.neighborArray(index)
+        return row[AgentKinds.getMask(*types)[self._kinds[row]]].tolist()
+
+    def addEdge(self, u: int, v: int):
+        if not (self._present[u] and self._present[v]):
+            raise KeyError("Cannot link unknown nodes %d and %d" % (u, v))
+        if self.hasEdge(u, v):
+            return
+        self._extra.setdefault(u, []).append(v)
+        if u != v:
+            self._extra.setdefault(v, []).append(u)
+        self._extra_edges += 1
+        self._graph = None
+
+    def addEdges(self, sources, targets):
+        """
+        connects many pairs of nodes at once. Unless there are few of them
+        (see SPARSE_EDGES), the new edges are merged into the CSR arrays
+        right away, together with the append buffer.
+
+        :param sources: the first node of each edge
+        :param targets: the second node of each edge
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if not (self._present[sources].all() and self._present[targets].all()):
+            raise KeyError("Cannot link unknown nodes")
+        if len(sources) < (self._edges + self._extra_edges) * \
+                ArrayTopology.SPARSE_EDGES:
+            for u, v in zip(sources.tolist(), targets.tolist()):
+                self.addEdge(u, v)
+            return
+        rows, columns = self.edgeArrays(cliques=False)
+        self.__rebuild(np.concatenate((rows, sources, targets)),
+                       np.concatenate((columns, targets, sources)))
+
+    def removeEdge(self, u: int, v: int):
+        if not self.__removeBuffered(u, v) and self.hasEdge(u, v):
+            self.removeEdges([u], [v])
+
+    def removeEdges(self, sources, targets):
+        """
+        disconnects many pairs of nodes at once. Buffered edges are simply
+        dropped, CSR entries are marked as removed. Once more than
+        REMOVED_EDGES of the CSR edges are removed, the CSR arrays are
+        rebuilt without them.
+
+        :param sources: the first node of each edge
+        :param targets: the second node of each edge
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if self._cliques and self.__withinClique(sources, targets).any():
+            raise Exception("Edges within a clique cannot be removed")
+        if self._extra:
+            buffered = np.array([self.__removeBuffered(u, v) for u, v in
+                                 zip(sources.tolist(), targets.tolist())],
+                                dtype=bool)
+            sources, targets = sources[~buffered], targets[~buffered]
+        if len(sources) == 0:
+            return
+        size = len(self._present)
+        low, high = np.minimum(sources, targets), np.maximum(sources, targets)
+        low, high = np.divmod(np.unique(low * size + high), size)
+        # the CSR entries of the edges which are still there
+        entries = self.__csrKeys()
+        keys = low * size + high
+        position = np.searchsorted(entries, keys).clip(
+            max=max(len(entries) - 1, 0))
+        stored = entries[position] == keys if len(entries) > 0 else \
+            np.zeros(len(keys), dtype=bool)
+        for u, v in zip(low[stored].tolist(), high[stored].tolist()):
+            if v in self._removed.get(u, ()):
+                continue
+            self._removed.setdefault(u, set()).add(v)
+            self._removed.setdefault(v, set()).add(u)
+            self._removed_edges += 1
+        self._graph = None
+        if self._removed_edges > self._edges * ArrayTopology.REMOVED_EDGES:
+            self.compact()
+
+    def __removeBuffered(self, u: int, v: int) -> bool:
+        """
+        drops an edge from the append buffer
+
+        :param u: the index of the first node
+        :param v: the index of the second node
+        :return: whether the edge was buffered
+        """
+        extra = self._extra.get(u)
+        if not extra or v not in extra:
+            return False
+        ends = [(u, v), (v, u)] if u != v else [(u, v)]
+        for a, b in ends:
+            neighbors = self._extra[a]
+            neighbors.remove(b)
+            if not neighbors:
+                del self._extra[a]
+        self._extra_edges -= 1
+        self._graph = None
+        return True
+
+    def newEdges(self, sources, targets):
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        size = len(self._present)
+        # the keys of the CSR entries are sorted (by row, then column)
+        entries = self.__csrKeys()
+        keys = sources * size + targets
+        position = np.searchsorted(entries, keys).clip(max=len(entries) - 1)
+        new = entries[position] != keys if len(entries) > 0 else \
+            np.ones(len(keys), dtype=bool)
+        if self._removed:
+            new |= np.array([v in self._removed.get(u, ()) for u, v in
+                             zip(sources.tolist(), targets.tolist())],
+                            dtype=bool)
+        if self._extra:
+            new &= np.array([v not in self._extra.get(u, ()) for u, v in
+                             zip(sources.tolist(), targets.tolist())],
+                            dtype=bool)
+        if self._cliques:
+            new &= ~self.__withinClique(sources, targets)
+        # drop duplicates, no matter in which direction they show up
+        low, high = np.minimum(sources, targets), np.maximum(sources, targets)
+        _, first = np.unique((low * size + high)[new], return_index=True)
+        first.sort()
+        return sources[new][first], targets[new][first]
+
+    def __csrRows(self) -> np.ndarray:
+        """
+        :returns the row of each CSR entry (cached)
+        """
+        if self._rows is None:
+            self._rows = np.repeat(np.arange(len(self._present)),
+                                   np.diff(self._indptr))
+        return self._rows
+
+    def __csrKeys(self) -> np.ndarray:
+        """
+        :returns row * size + column of each CSR entry (sorted, cached)
+        """
+        if self._keys is None:
+            self._keys = self.__csrRows() * len(self._present) + self._indices
+        return self._keys
+
+    def hasEdge(self, u: int, v: int) -> bool:
+        clique = self._clique_ids[u]
+        if clique >= 0 and clique == self._clique_ids[v] and u != v:
+            return True
+        extra = self._extra.get(u)
+        if extra and v in extra:
+            return True
+        start, stop = self._indptr[u], self._indptr[u + 1]
+        position = start + self._indices[start:stop].searchsorted(v)
+        return bool(position < stop and self._indices[position] == v) and \
+            v not in self._removed.get(u, ())
+
+    def numberOfNodes(self) -> int:
+        return len(self._nodes)
+
+    def numberOfEdges(self) -> int:
+        return self._edges - self._removed_edges + self._extra_edges + \
+            self._clique_edges
+
+    def getCliques(self) -> list:
+        return list(self._cliques)
+
+    def getCliqueIds(self) -> np.ndarray:
+        """
+        :returns the clique of each node (see getCliques()), -1 for nodes
+        which are not a member of any clique
+        """
+        return self._clique_ids
+
+    # a uint16 array is used for storing flyweights
+    MAX_FLYWEIGHTS = 2 ** 16
+
+    def getAgent(self, index: int):
+        flyweight = self._flyweights[index]
+        if flyweight == 0:
+            return None
+        return self._prototypes[flyweight].view(index,
+                                                int(self._states[index]))
+
+    def setAgent(self, index: int, agent):
+        self._kinds[index] = AgentKinds.getKind(type(agent))
+        self._states[index] = agent.getState()
+        self._flyweights[index] = self.__getFlyweight(agent)
+        self._graph = None
+
+    def setAgents(self, indices, agent):
+        self._kinds[indices] = AgentKinds.getKind(type(agent))
+        self._states[indices] = agent.getState()
+        self._flyweights[indices] = self.__getFlyweight(agent)
+        self._graph = None
+
+    def keepsAgents(self) -> bool:
+        return False
+
+    def getAgentType(self, index: int):
+        agent_type = AgentKinds.getType(self._kinds[index])
+        return type(None) if agent_type is None else agent_type
+
+    def countAgents(self) -> dict:
+        counts = np.bincount(self._kinds[self._nodes],
+                             minlength=AgentKinds.count())
+        return {AgentKinds.getType(kind): count
+                for kind, count in enumerate(counts.tolist())
+                if count > 0 and AgentKinds.getType(kind) is not None}
+
+    def __getFlyweight(self, agent) -> int:
+        """
+        :returns the flyweight of an agents class and parameters. The agent
+        becomes the prototype of its views, replacing the previous one (it
+        might have been placed by another environment or none).
+        :param agent: the agent
+        """
+        key = (type(agent), agent.getParameters())
+        flyweight = self._prototype_ids.get(key)
+        if flyweight is None:
+            flyweight = len(self._prototypes)
+            if flyweight >= ArrayTopology.MAX_FLYWEIGHTS:
+                raise Exception("Too many agent flyweights")
+            self._prototypes.append(agent)
+            self._prototype_ids[key] = flyweight
+        else:
+            self._prototypes[flyweight] = agent
+        return flyweight
+
+    def getState(self, index: int) -> int:
+        return int(self._states[index])
+
+    def setState(self, index: int, state: int):
+        self._states[index] = state
+        self._graph = None
+
+    def saveEdges(self):
+        """
+        the CSR arrays are never modified in place, so saving them means
+        keeping references. Only the append buffer and the tombstones are
+        copied.
+
+        :return: the CSR arrays and a copy of the append buffer and the
+        tombstones
+        """
+        return (self._indptr, self._indices, self._rows, self._keys,
+                self._edges,
+                {u: list(vs) for u, vs in self._extra.items()},
+                self._extra_edges,
+                {u: set(vs) for u, vs in self._removed.items()},
+                self._removed_edges)
+
+    def restoreEdges(self, saved, changes: list):
+        """
+        puts back the saved CSR arrays, append buffer and tombstones. The
+        changes do not need to be looked at.
+
+        :param saved: the return value of saveEdges()
+        :param changes: the edge changes made in the meantime
+        """
+        self._indptr, self._indices, self._rows, self._keys, self._edges, \
+            extra, self._extra_edges, removed, self._removed_edges = saved
+        self._extra = {u: list(vs) for u, vs in extra.items()}
+        self._removed = {u: set(vs) for u, vs in removed.items()}
+        self._graph = None
+
+    def packEdges(self, saved=None) -> dict:
+        """
+        :returns saved edges as arrays, e.g. for writing them to a file
+        (see unpackEdges())
+        :param saved: the return value of saveEdges(), the current edges by
+        default
+        """
+        indptr, indices, _, _, edges, extra, extra_edges, removed, \
+            removed_edges = saved or self.saveEdges()
+        return {'indptr': indptr, 'indices': indices,
+                'edges': np.array([edges, extra_edges, removed_edges],
+                                  dtype=np.int64),
+                'extra_rows': np.array([u for u, vs in extra.items()
+                                        for _ in vs], dtype=np.int64),
+                'extra_columns': np.array([v for vs in extra.values()
+                                           for v in vs], dtype=np.int64),
+                'removed_rows': np.array([u for u, vs in removed.items()
+                                          for _ in vs], dtype=np.int64),
+                'removed_columns': np.array([v for vs in removed.values()
+                                             for v in vs], dtype=np.int64)}
+
+    @staticmethod
+    def unpackEdges(arrays: dict):
+        """
+        :returns the saved edges (see saveEdges()) packed by packEdges().
+        The buffered edges keep their order, so restoring them gives the
+        same neighbor order.
+        :param arrays: the arrays returned by packEdges()
+        """
+        extra = {}
+        for u, v in zip(arrays['extra_rows'].tolist(),
+                        arrays['extra_columns'].tolist()):
+            extra.setdefault(u, []).append(v)
+        removed = {}
+        for u, v in zip(arrays['removed_rows'].tolist(),
+                        arrays['removed_columns'].tolist()):
+            removed.setdefault(u, set()).add(v)
+        edges, extra_edges, removed_edges = arrays['edges'].tolist()
+        return (arrays['indptr'], arrays['indices'], None, None, edges, extra,
+                extra_edges, removed, removed_edges)
+
+    def getKinds(self) -> np.ndarray:
+        """
+        :returns the kinds of the agents, indexed by node
+        """
+        return self._kinds
+
+    def getStates(self) -> np.ndarray:
+        """
+        :returns the states of the agents, indexed by node
+        """
+        return self._states
+
+    def getFlyweights(self) -> np.ndarray:
+        """
+        :returns the flyweights of the agents (0 for nodes without an
+        agent), indexed by node
+        """
+        return self._flyweights
+
+    def getPrototypes(self) -> list:
+        """
+        :returns the agent of each flyweight (None for flyweight 0)
+        """
+        return list(self._prototypes)
+
+    def getGraph(self) -> nx.Graph:
+        """
+        builds a networkx.Graph of the topology. The graph is cached until
+        the topology changes. Modifying it does not modify the topology.
+        """
+        if self._graph is None:
+            graph = nx.Graph()
+            graph.add_nodes_from(
+                (node, {'agent': self.getAgent(node)})
+                for node in self._node_list)
+            rows, columns = self.edgeArrays()
+            upper = rows <= columns
+            graph.add_edges_from(zip(rows[upper].tolist(),
+                                     columns[upper].tolist()))
+            self._graph = graph
+        return self._graph
+
+    def copy(self):
+        topology = copy(self)
+        # the CSR arrays are never modified in place, so they can be shared
+        topology._extra = {u: list(vs) for u, vs in self._extra.items()}
+        topology._removed = {u: set(vs) for u, vs in self._removed.items()}
+        topology._kinds = self._kinds.copy()
+        topology._states = self._states.copy()
+        topology._flyweights = self._flyweights.copy()
+        topology._prototypes = [None if agent is None else copy(agent)
+                                for agent in self._prototypes]
+        topology._prototype_ids = dict(self._prototype_ids)
+        topology._graph = None
+        return topology
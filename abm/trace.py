@@ -0,0 +1,199 @@
+import atexit
+from collections import deque
+
+
+class Tracer:
+    """
+    structured tracing of agent events.
+
+    This is a singleton class like Logger (see ../settings.py for usage).
+    An event is a tuple (kind, node, other, time): the kind of event (see
+    registerEvent()), the node of the agent causing it, the node of the
+    agent it is interacting with (-1 if there is none) and the current
+    timestep. Events are stored as tuples by a sink and only turned into
+    messages when they are read (see format()).
+
+    Hot paths check the tracer before building any event, so disabled
+    tracing costs a single attribute lookup:
+
+        if TRACER.enabled:
+            TRACER(EVENT_SWAP, self._index, candidate.getIndex())
+    """
+    __templates = []
+
+    @staticmethod
+    def registerEvent(template: str) -> int:
+        """
+        registers a kind of event
+
+        :param template: the message of the event. It may refer to
+        %(node)d, %(other)d and %(time)d.
+        :return: the kind of the event
+        """
+        Tracer.__templates.append(template)
+        return len(Tracer.__templates) - 1
+
+    @staticmethod
+    def format(event: tuple) -> str:
+        """
+        :returns the message of an event
+        :param event: the event (kind, node, other, time)
+        """
+        kind, node, other, time = event
+        return Tracer.__templates[kind] % {'node': node, 'other': other,
+                                           'time': time}
+
+    # internal class (used for singleton pattern)
+    class __Tracer:
+        def __init__(self):
+            self.enabled = False
+            self.__sink = None
+            self.__time = 0
+
+        def setSink(self, sink):
+            """
+            sets the sink events are written to. None disables tracing.
+
+            :param sink: the TraceSink
+            """
+            if self.__sink is not None:
+                self.__sink.flush()
+            self.__sink = sink
+            self.enabled = sink is not None
+
+        def getSink(self):
+            """
+            :returns the current sink
+            """
+            return self.__sink
+
+        def flush(self):
+            """
+            writes the events buffered by the sink (if any)
+            """
+            if self.__sink is not None:
+                self.__sink.flush()
+
+        def setTime(self, time: int):
+            """
+            sets the timestep recorded with events
+
+            :param time: the timestep
+            """
+            self.__time = time
+
+        def __call__(self, kind: int, node: int, other: int = -1):
+            self.__sink.write((kind, node, other, self.__time))
+
+    __instance = __Tracer()
+
+    @staticmethod
+    def getInstance() -> __Tracer:
+        """
+        :returns the Tracer instance (Singleton)
+        """
+        return Tracer.__instance
+
+
+class TraceSink:
+    """
+    receives the events of a Tracer. Override write() in children.
+    """
+
+    def write(self, event: tuple):
+        """
+        stores an event
+
+        :param event: the event (kind, node, other, time)
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """
+        writes buffered events (if any)
+        """
+        pass
+
+    def close(self):
+        """
+        writes buffered events and releases the sink
+        """
+        self.flush()
+
+
+class RingBufferSink(TraceSink):
+    """
+    keeps the latest events in memory
+
+    :param capacity: the number of events kept
+    """
+
+    def __init__(self, capacity: int = 100000):
+        self.__events = deque(maxlen=capacity)
+
+    def write(self, event: tuple):
+        self.__events.append(event)
+
+    def getEvents(self) -> list:
+        """
+        :returns the events kept, oldest first
+        """
+        return list(self.__events)
+
+
+class FileSink(TraceSink):
+    """
+    appends events to a file, one event per line (time, kind, node and
+    other separated by tabs). Use read() and Tracer.format() to get the
+    messages back. Events still buffered when the interpreter exits are
+    written then, unless the sink was closed.
+
+    :param path: the file to write to
+    :param buffer: the number of events buffered before writing
+    """
+
+    def __init__(self, path: str, buffer: int = 65536):
+        self.__path = path
+        self.__buffer = buffer
+        self.__events = []
+        atexit.register(self.flush)
+
+    def write(self, event: tuple):
+        self.__events.append(event)
+        if len(self.__events) >= self.__buffer:
+            self.flush()
+
+    def flush(self):
+        if not self.__events:
+            return
+        with open(self.__path, 'a') as f:
+            f.writelines("%d\t%d\t%d\t%d\n" % (time, kind, node, other)
+                         for kind, node, other, time in self.__events)
+        self.__events = []
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+
+    @staticmethod
+    def read(path: str):
+        """
+        reads the events of a file written by a FileSink
+
+        :param path: the file
+        :return: a generator of events (kind, node, other, time)
+        """
+        with open(path) as f:
+            for line in f:
+                time, kind, node, other = map(int, line.split('\t'))
+                yield kind, node, other, time
+
+
+class PrintSink(TraceSink):
+    """
+    prints the message of each event right away. This is what
+    Logger.LEVEL_DETAILS used to do.
+    """
+
+    def write(self, event: tuple):
+        print(Tracer.format(event))
@@ -1,8 +1,7 @@
-from random import random, choice
-from abm.log import Logger
-from abm.agents import MovingAgent, Agent
-from settings import SCENARIO, SCENARIO_IMMORTAL_ZOMBIES, CHANCE_TO_KILL_ZOMBIE, \
-    SCENARIO_KILLABLE_ZOMBIES, SCENARIO_MOVING_KILLABLE_ZOMBIES, LOGGER
+from abm.agents import MovingAgent, Agent, AgentKinds
+from abm.trace import Tracer
+from settings import SCENARIO, SCENARIO_IMMORTAL_ZOMBIES, \
+    SCENARIO_KILLABLE_ZOMBIES, SCENARIO_MOVING_KILLABLE_ZOMBIES, TRACER
 
 
 class Rick(MovingAgent):
@@ -10,6 +9,16 @@ class Rick(MovingAgent):
     Rick - a moving agent
     """
 
+    __slots__ = ()
+
+    EVENT_SAFE = Tracer.registerEvent(
+        "No Zombies nearby. Rick (%(node)d) feels safe and does nothing")
+    EVENT_TRAPPED = Tracer.registerEvent(
+        "Rick (%(node)d) seems to be surrounded by zombies. This is gonna be "
+        "tough")
+    EVENT_SWAP = Tracer.registerEvent(
+        "Rick (%(node)d) swaps position with %(other)d")
+
     def do(self):
         """
         implements the behavior of rick
@@ -25,9 +34,11 @@ class Rick(MovingAgent):
         if self._skip:
             return
 
-        if len(self.getNeighborNodes(ZombieFactory.getZombieType())) == 0:
-            LOGGER("No Zombies nearby. %s feels safe and does nothing" % self,
-                   Logger.LEVEL_DETAILS)
+        zombie = ZombieFactory.getZombieType(
+            self._env.getConfiguration().scenario)
+        if self._env.countNeighbors(self._index, zombie) == 0:
+            if TRACER.enabled:
+                TRACER(Rick.EVENT_SAFE, self._index)
             return
 
         # when there are any zombies, rick tries to swap with an enemy
@@ -39,13 +50,21 @@ class Rick(MovingAgent):
 
         # if he finds someone to swap, he swaps
         if candidate is None:
-            LOGGER("%s couldn't seems to be surronded by zombies. This is "
-                   "gonna be tough" % self, Logger.LEVEL_DETAILS)
+            if TRACER.enabled:
+                TRACER(Rick.EVENT_TRAPPED, self._index)
         else:
-            LOGGER("%s swaps position with %s" % (self, candidate),
-                   Logger.LEVEL_DETAILS)
+            if TRACER.enabled:
+                TRACER(Rick.EVENT_SWAP, self._index, candidate.getIndex())
             self.swapPosition(candidate)
 
+    def isIdle(self) -> bool:
+        """
+        :returns whether rick is skipped or there are no zombies around
+        """
+        return self._skip or self._env.countNeighbors(
+            self._index, ZombieFactory.getZombieType(
+                self._env.getConfiguration().scenario)) == 0
+
     def getName(self) -> str:
         """
         :returns the name of the object. Used for logging
@@ -68,9 +87,9 @@ class Rick(MovingAgent):
         if len(neighbors) > 0:
             # find the least threatened neighbor, i.e. the one with the
             # least amount of zombies around
-            endangered = lambda agent: len(
-                self._env.getAgent(agent).getNeighborNodes(
-                    ZombieFactory.getZombieType()))
+            zombie = ZombieFactory.getZombieType(
+                self._env.getConfiguration().scenario)
+            endangered = lambda node: self._env.countNeighbors(node, zombie)
             return self._env.getAgent(min(neighbors, key=endangered))
         else:
             return None
@@ -81,6 +100,18 @@ class FriendOfRick(MovingAgent):
     a friend of rick - a moving agent
     """
 
+    __slots__ = ()
+
+    EVENT_HELPLESS = Tracer.registerEvent(
+        "Rick is dead. FriendOfRick (%(node)d) strews about helplessly")
+    EVENT_CLOSE = Tracer.registerEvent(
+        "FriendOfRick (%(node)d) is close to rick - everything is ok")
+    EVENT_LOST = Tracer.registerEvent(
+        "FriendOfRick (%(node)d) couldn't find anyone to swap with - he might "
+        "be lost ...")
+    EVENT_SWAP = Tracer.registerEvent(
+        "FriendOfRick (%(node)d) swaps position with %(other)d")
+
     def do(self):
         """
         implements the behavior of rick's friend
@@ -95,36 +126,49 @@ class FriendOfRick(MovingAgent):
             return
 
         if self._env.isRickDead():
-            LOGGER("Rick is dead. %s strews about helplessly" % self,
-                   Logger.LEVEL_DETAILS)
+            if TRACER.enabled:
+                TRACER(FriendOfRick.EVENT_HELPLESS, self._index)
             return
 
-        if len(self.getNeighborNodes(Rick)) > 0:
-            LOGGER("%s is close to rick - everything is ok" % self,
-                   Logger.LEVEL_DETAILS)
+        if self._env.countNeighbors(self._index, Rick) > 0:
+            if TRACER.enabled:
+                TRACER(FriendOfRick.EVENT_CLOSE, self._index)
             return
 
         # try to find common neighbors
         rick = self._env.getAgent(self._env.getRick())
+        zombie = ZombieFactory.getZombieType(
+            self._env.getConfiguration().scenario)
         ricks_neighbors = rick.getNeighborNodes(FriendOfRick, EnemyOfRick,
-                                                ZombieFactory.getZombieType())
+                                                zombie)
         friends_neighbors = self.getNeighborNodes(FriendOfRick, EnemyOfRick,
-                                                  ZombieFactory.getZombieType())
+                                                  zombie)
         common_neighbors = list(
             set(ricks_neighbors).union(set(friends_neighbors)))
 
         # if there is none, the friend resigns
         if len(common_neighbors) == 0:
-            LOGGER("%s couldn't find anyone to swap with - he might be "
-                   "lost ...", self, Logger.LEVEL_DETAILS)
+            if TRACER.enabled:
+                TRACER(FriendOfRick.EVENT_LOST, self._index)
             return
 
         # if there is a common neighbor, the friend gets his place
         if len(common_neighbors) > 0:
-            agent = self._env.getAgent(choice(common_neighbors))
+            agent = self._env.getAgent(self._env.getRandom(
+                FriendOfRick).choice(common_neighbors))
+            if TRACER.enabled:
+                TRACER(FriendOfRick.EVENT_SWAP, self._index, agent.getIndex())
             self.swapPosition(agent)
             return
 
+    def isIdle(self) -> bool:
+        """
+        :returns whether the friend is skipped, rick is dead or the friend
+        is close to him
+        """
+        return self._skip or self._env.isRickDead() or \
+            self._env.countNeighbors(self._index, Rick) > 0
+
     def getName(self) -> str:
         """
         :returns the name of the object. Used for logging
@@ -139,6 +183,10 @@ class EnemyOfRick(Agent):
     an enemy does nothing except for hanging around ...
     """
 
+    __slots__ = ()
+
+    PASSIVE = True
+
     def getName(self) -> str:
         """
         :returns the name of the object. Used for logging
@@ -154,10 +202,25 @@ class Zombie(Agent):
     attack it's victim
     """
 
+    __slots__ = ('__aggressiveness',)
+
+    EVENT_WON = Tracer.registerEvent(
+        "Zombie (%(node)d): attacks %(other)d ... and wins")
+    EVENT_LOST = Tracer.registerEvent(
+        "Zombie (%(node)d): attacks %(other)d ... but looses")
+    EVENT_IDLE = Tracer.registerEvent(
+        "Zombie (%(node)d): cannot find anyone to eat")
+
     def __init__(self, aggressiveness: float):
         super().__init__()
         self.__aggressiveness = aggressiveness
 
+    def getParameters(self) -> tuple:
+        """
+        :returns the aggressiveness of the zombie
+        """
+        return self.__aggressiveness,
+
     def do(self):
         """
         implements the behavior of a zombie
@@ -169,19 +232,27 @@ class Zombie(Agent):
         """
         victims = self.getNeighborNodes(Rick, FriendOfRick, EnemyOfRick)
         for victim in victims:
-            LOGGER("%s: attacks %s" % (self, self._env.getAgent(victim)),
-                   Logger.LEVEL_DETAILS, end="")
-
             # the zombie has a certain chance of getting its victim
-            if random() < self.__aggressiveness:
-                LOGGER(" ... and wins", Logger.LEVEL_DETAILS)
+            if self._env.getRandom(type(self)).random() < \
+                    self.__aggressiveness:
+                if TRACER.enabled:
+                    TRACER(Zombie.EVENT_WON, self._index, victim)
                 self._env.setAgent(victim, ZombieFactory.getInstance(
-                    self.__aggressiveness))
-            else:
-                LOGGER(" ... but looses", Logger.LEVEL_DETAILS)
+                    self.__aggressiveness,
+                    self._env.getConfiguration().scenario))
+            elif TRACER.enabled:
+                TRACER(Zombie.EVENT_LOST, self._index, victim)
             break
         else:
-            LOGGER("%s: cannot find anyone to eat" % self, Logger.LEVEL_DETAILS)
+            if TRACER.enabled:
+                TRACER(Zombie.EVENT_IDLE, self._index)
+
+    def isIdle(self) -> bool:
+        """
+        :returns whether there are no humans around
+        """
+        return self._env.countNeighbors(self._index, Rick, FriendOfRick,
+                                        EnemyOfRick) == 0
 
     def getName(self) -> str:
         """
@@ -198,15 +269,37 @@ class KillableZombie(Zombie):
     attack it's victim
     """
 
+    __slots__ = ('__alive',)
+
+    STATE_DEAD = 1
+
+    EVENT_KILLED = Tracer.registerEvent(
+        "Zombie (%(node)d): attacks %(other)d ... and gets killed")
+
     def __init__(self, aggressiveness: float):
         super().__init__(aggressiveness)
         self.__alive = True
 
+    def getState(self) -> int:
+        """
+        :returns STATE_DEAD when the zombie has been killed
+        """
+        return 0 if self.__alive else KillableZombie.STATE_DEAD
+
+    def setState(self, state: int):
+        """
+        restores whether the zombie is alive
+
+        :param state: the state flags
+        """
+        self.__alive = not state & KillableZombie.STATE_DEAD
+
     def kill(self):
         """
         kills a zombie
         """
         self.__alive = False
+        self._env.updateState(self)
 
     def isAlive(self) -> bool:
         """
@@ -214,6 +307,12 @@ class KillableZombie(Zombie):
         """
         return self.__alive
 
+    def isIdle(self) -> bool:
+        """
+        :returns whether the zombie is dead or there are no humans around
+        """
+        return not self.__alive or super().isIdle()
+
     def do(self):
         """
         the zombies behavior
@@ -226,12 +325,13 @@ class KillableZombie(Zombie):
         if not self.__alive:
             return
 
+        chance = self._env.getConfiguration().chance_to_kill_zombie
+        random = self._env.getRandom(type(self))
         victims = self.getNeighborNodes(Rick, FriendOfRick, EnemyOfRick)
         for victim in victims:
-            LOGGER("%s: attacks %s" % (self, self._env.getAgent(victim)),
-                   Logger.LEVEL_DETAILS, end="")
-
-            if random() <= CHANCE_TO_KILL_ZOMBIE:
+            if random.random() <= chance:
+                if TRACER.enabled:
+                    TRACER(KillableZombie.EVENT_KILLED, self._index, victim)
                 self.kill()
                 return
 
@@ -243,6 +343,14 @@ class MovableKillableZombie(KillableZombie):
     A movable, killable zombie
     """
 
+    __slots__ = ()
+
+    def isIdle(self) -> bool:
+        """
+        a moving zombie moves (even when dead), so it is never idle
+        """
+        return False
+
     def do(self):
         """
         the zombies behavior
@@ -261,31 +369,38 @@ class ZombieFactory:
     """
 
     @staticmethod
-    def getInstance(aggressiveness: int):
+    def getInstance(aggressiveness: int, scenario: int = SCENARIO):
         """
-        depending on global settings, this method returns a new Zombie
+        depending on the scenario, this method returns a new Zombie
         instance with an aggressiveness set. The instance can either be
         Zombie, KillableZombie or MovingKillableZombie.
 
         :param aggressiveness: the aggressiveness of the zombie.
+        :param scenario: the scenario (global settings by default)
         :return: a Zombie instance
         """
-        if SCENARIO & SCENARIO_IMMORTAL_ZOMBIES == SCENARIO_IMMORTAL_ZOMBIES:
+        if scenario & SCENARIO_IMMORTAL_ZOMBIES == SCENARIO_IMMORTAL_ZOMBIES:
             return Zombie(aggressiveness)
-        elif SCENARIO & SCENARIO_KILLABLE_ZOMBIES == SCENARIO_KILLABLE_ZOMBIES:
+        elif scenario & SCENARIO_KILLABLE_ZOMBIES == SCENARIO_KILLABLE_ZOMBIES:
             return KillableZombie(aggressiveness)
-        elif SCENARIO & SCENARIO_MOVING_KILLABLE_ZOMBIES == SCENARIO_MOVING_KILLABLE_ZOMBIES:
+        elif scenario & SCENARIO_MOVING_KILLABLE_ZOMBIES == SCENARIO_MOVING_KILLABLE_ZOMBIES:
             return MovableKillableZombie(aggressiveness)
 
     @staticmethod
-    def getZombieType():
+    def getZombieType(scenario: int = SCENARIO):
         """
         :returns: the class of Zombies being produced by this factory (
-        depending on global settings)
-        """
-        if SCENARIO & SCENARIO_IMMORTAL_ZOMBIES == SCENARIO_IMMORTAL_ZOMBIES:
-            return Zombie.__class__
-        elif SCENARIO & SCENARIO_KILLABLE_ZOMBIES == SCENARIO_KILLABLE_ZOMBIES:
-            return KillableZombie.__class__
-        elif SCENARIO & SCENARIO_MOVING_KILLABLE_ZOMBIES == SCENARIO_MOVING_KILLABLE_ZOMBIES:
-            return MovableKillableZombie.__class__
+        depending on the scenario)
+        :param scenario: the scenario (global settings by default)
+        """
+        if scenario & SCENARIO_IMMORTAL_ZOMBIES == SCENARIO_IMMORTAL_ZOMBIES:
+            return Zombie
+        elif scenario & SCENARIO_KILLABLE_ZOMBIES == SCENARIO_KILLABLE_ZOMBIES:
+            return KillableZombie
+        elif scenario & SCENARIO_MOVING_KILLABLE_ZOMBIES == SCENARIO_MOVING_KILLABLE_ZOMBIES:
+            return MovableKillableZombie
+
+
+# fixed kinds for array backed topologies (see abm.agents.AgentKinds)
+AgentKinds.register(Rick, FriendOfRick, EnemyOfRick, Zombie, KillableZombie,
+                    MovableKillableZombie)
@@ -0,0 +1,76 @@
+import os
+import shutil
+
+from abm.log import Logger
+from abm.topology import ArrayTopology
+from abm.wd.config import Configuration
+from settings import LOGGER
+
+
+class TopologyCache:
+    """
+    a directory of generated worlds, so repeated runs (and the workers of a
+    sweep) do not generate the same world over and over again.
+
+    A world only depends on the sizes and offsets of the scenario and the
+    seed it is generated from (see WalkingDeadEnv). Each world is an
+    ArrayTopology written by ArrayTopology.save() into a subdirectory named
+    after these. Worlds are loaded memory mapped, so processes using the
+    same world share its pages.
+
+        cache = TopologyCache('worlds')
+        env = WalkingDeadEnv.fromConfiguration(config, ArrayTopology,
+                                               seed=7, cache=cache)
+
+    :param directory: the directory holding the worlds
+    """
+
+    # bump when the generated worlds change, so old worlds are not used
+    VERSION = 2
+
+    def __init__(self, directory: str):
+        self.__directory = directory
+
+    def getPath(self, config: Configuration, seed: int) -> str:
+        """
+        :returns the directory of a world
+        :param config: the Configuration (only sizes and offsets matter)
+        :param seed: the seed the world is generated from
+        """
+        return os.path.join(self.__directory, "v%d_%d-%d-%d_%d-%d-%d_%d" % (
+            TopologyCache.VERSION, config.ricks_clique, config.enemies,
+            config.zombies, config.rick_offset, config.enemy_offset,
+            config.zombie_offset, seed))
+
+    def load(self, config: Configuration, seed: int):
+        """
+        :returns the cached world (an ArrayTopology without agents) or None
+        if it has not been stored yet
+        :param config: the Configuration
+        :param seed: the seed the world is generated from
+        """
+        path = self.getPath(config, seed)
+        if not os.path.isdir(path):
+            return None
+        LOGGER("Loading world %s" % path, Logger.LEVEL_ITERATIONS)
+        return ArrayTopology.load(path)
+
+    def store(self, config: Configuration, seed: int,
+              topology: ArrayTopology):
+        """
+        stores a world. It is written to a temporary directory first, so a
+        crash (or another process storing the same world) never leaves a
+        broken world behind.
+
+        :param config: the Configuration
+        :param seed: the seed the world is generated from
+        :param topology: the world
+        """
+        path = self.getPath(config, seed)
+        temporary = "%s.%d.tmp" % (path, os.getpid())
+        topology.save(temporary)
+        try:
+            os.rename(temporary, path)
+        except OSError:
+            # stored by another process in the meantime
+            shutil.rmtree(temporary, ignore_errors=True)
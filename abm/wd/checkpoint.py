@@ -0,0 +1,52 @@
+from abm.environment import EnvironmentOperable
+
+
+class Checkpointer(EnvironmentOperable):
+    """
+    writes a checkpoint of a running simulation every N timesteps (see
+    WalkingDeadEnv.writeCheckpoint()). A checkpoint replaces the one before,
+    so there is a single file to resume from (see
+    WalkingDeadEnv.resumeSimulation()).
+
+    It has to run after the DataCollector, so the timestep just collected
+    is part of the checkpoint.
+
+    :param path: the file to write
+    :param every: the number of timesteps between two checkpoints
+    :param dc: the DataCollector of the simulation
+    :param simulation: the arguments of the simulation (time, trials, seed
+    and batched), written to each checkpoint
+    """
+
+    def __init__(self, path: str, every: int, dc, simulation: dict):
+        super().__init__()
+        if every < 1:
+            raise Exception("Checkpoints need at least one timestep between "
+                            "them")
+        self.__path = path
+        self.__every = every
+        self.__dc = dc
+        self.__simulation = simulation
+
+    def isNodewise(self) -> bool:
+        return False
+
+    def __call__(self, node: int):
+        pass
+
+    def needsBarrier(self) -> bool:
+        """
+        checkpoints only look at what the agents and the DataCollector did
+        before, so the Checkpointer is fused with the collector
+        """
+        return False
+
+    def postProcess(self):
+        """
+        writes a checkpoint when it is due
+        """
+        # timestep 0 is collected before the agents act
+        step = self.__dc.getTime() - 1
+        if step > 0 and step % self.__every == 0:
+            self._env.writeCheckpoint(self.__path, self.__dc,
+                                      self.__simulation)
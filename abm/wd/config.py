@@ -0,0 +1,59 @@
+from settings import RICKS_CLIQUE, ENEMIES, ZOMBIES, ZOMBIE_AGGRESSIVENESS, \
+    CHANCE_TO_KILL_ZOMBIE, SCENARIO, RICK_OFFSET, ENEMY_OFFSET, ZOMBIE_OFFSET
+
+
+class Configuration:
+    """
+    the parameters of a walking dead scenario. Each environment holds its own
+    configuration, so environments with different parameters can run in the
+    same process (see abm.wd.sweep). Parameters not given are taken from
+    settings.py.
+
+        config = Configuration(zombies=500, scenario=SCENARIO_KILLABLE_ZOMBIES)
+        env = WalkingDeadEnv.fromConfiguration(config)
+
+    :param parameters: the parameters to set (see PARAMETERS)
+    """
+
+    PARAMETERS = ('ricks_clique', 'enemies', 'zombies',
+                  'zombie_aggressiveness', 'chance_to_kill_zombie', 'scenario',
+                  'rick_offset', 'enemy_offset', 'zombie_offset')
+
+    def __init__(self, **parameters):
+        unknown = set(parameters) - set(Configuration.PARAMETERS)
+        if unknown:
+            raise Exception("Unknown parameters: %s" % ", ".join(sorted(
+                unknown)))
+
+        self.ricks_clique = RICKS_CLIQUE
+        self.enemies = ENEMIES
+        self.zombies = ZOMBIES
+        self.zombie_aggressiveness = ZOMBIE_AGGRESSIVENESS
+        self.chance_to_kill_zombie = CHANCE_TO_KILL_ZOMBIE
+        self.scenario = SCENARIO
+        self.rick_offset = RICK_OFFSET
+        self.enemy_offset = ENEMY_OFFSET
+        self.zombie_offset = ZOMBIE_OFFSET
+        for name, value in parameters.items():
+            setattr(self, name, value)
+
+        if self.rick_offset + self.ricks_clique > self.enemy_offset or \
+                self.enemy_offset + self.enemies > self.zombie_offset:
+            raise Exception("The cliques overlap, change the offsets")
+
+    def getParameters(self) -> dict:
+        """
+        :returns all parameters by name
+        """
+        return {name: getattr(self, name) for name in Configuration.PARAMETERS}
+
+    def replace(self, **parameters):
+        """
+        :returns a copy of the configuration with some parameters changed
+        :param parameters: the parameters to change
+        """
+        return Configuration(**dict(self.getParameters(), **parameters))
+
+    def __repr__(self):
+        return "Configuration(%s)" % ", ".join(
+            "%s=%r" % item for item in self.getParameters().items())
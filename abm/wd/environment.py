@@ -1,14 +1,31 @@
-from random import choice, randint
+import json
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from random import getrandbits
 
 import networkx as nx
+import numpy as np
 
+from abm.agents import AgentKinds
 from abm.environment import Environment
+from abm.topology import GraphTopology, ArrayTopology
 from abm.log import Logger
-from abm.operations import AgentExecutor
-from abm.wd.agents import Rick, FriendOfRick, EnemyOfRick, ZombieFactory
+from abm.profiler import Profiler
+from abm.operations import ActiveSetExecutor
+from abm.shared import SharedArrays
+from abm.wd.agents import Rick, FriendOfRick, EnemyOfRick, Zombie, \
+    KillableZombie, ZombieFactory
+from abm.wd.checkpoint import Checkpointer
+from abm.wd.config import Configuration
+from abm.wd.kernel import BatchedStep
+from abm.wd.partition import PartitionedStep
 from abm.wd.plot import Plotter
 from abm.wd.stats import DataCollector
-from settings import LOGGER, ENEMY_OFFSET, RICK_OFFSET, ZOMBIE_OFFSET
+from settings import LOGGER, PROFILER, TELEMETRY, TRACER, \
+    SIMULATION_CHECKPOINT_EVERY, SIMULATION_TRIALS_BATCH, \
+    SIMULATION_CONFIDENCE
 
 
 class WalkingDeadEnv(Environment):
@@ -19,15 +36,77 @@ class WalkingDeadEnv(Environment):
     :param enemies: the size of the enemies clique
     :param zombies: the size of the zombies graph
     :param zombie_aggressiveness: the likelihood a zombie eats a human
+    :param topology_type: the topology backend, GraphTopology (default) or
+    ArrayTopology (see abm.topology)
+    :param config: the Configuration holding the remaining parameters
+    (settings.py by default)
+    :param seed: the seed the world (the topology) is generated from. By
+    default, it is drawn from the random module like everything else.
+    :param cache: a TopologyCache (see cache.py) to load the world from
+    instead of generating it. Generated worlds are stored there. Needs a
+    seed and an ArrayTopology.
+    :param world: the world (a topology without agents) to set up instead
+    of generating one, e.g. the world of a checkpoint
     """
 
+    # bump when the contents of checkpoints change (see writeCheckpoint())
+    CHECKPOINT_VERSION = 4
+
+    # the parameters of the Configuration a world depends on
+    WORLD_PARAMETERS = ('ricks_clique', 'enemies', 'zombies', 'rick_offset',
+                        'enemy_offset', 'zombie_offset')
+
     def __init__(self, ricks_clique: int, enemies: int, zombies: int,
-                 zombie_aggressiveness: float):
-        super().__init__(nx.Graph())
+                 zombie_aggressiveness: float, topology_type=GraphTopology,
+                 config: Configuration = None, seed: int = None,
+                 cache=None, world=None):
+        if cache is not None and (
+                seed is None or not issubclass(topology_type, ArrayTopology)):
+            raise Exception("Caching worlds needs a seed and an ArrayTopology")
+        super().__init__(GraphTopology())
         self.__rick = -1
+        # the nodes to pick random links from and the link each node has
+        # moved to (see setRandomLink())
+        self.__nodes = []
+        self.__links = {}
+        self.__saved_links = {}
+        # executes the agents of every trial, keeping its active set
+        self.__executor = ActiveSetExecutor()
+        # steps the trials of a partitioned simulation (see runSimulation())
+        self.__partitioned = None
+        self.__topology_type = topology_type
+        self.__seed = seed
+        self.__cache = cache
+        self.__world = world
+        # the edges right after setting up (see writeCheckpoint())
+        self.__initial_edges = None
         self.__zombie_aggresiveness = zombie_aggressiveness
+        self.__config = (config or Configuration()).replace(
+            ricks_clique=ricks_clique, enemies=enemies, zombies=zombies,
+            zombie_aggressiveness=zombie_aggressiveness)
         self.setup(ricks_clique, enemies, zombies, zombie_aggressiveness)
 
+    @staticmethod
+    def fromConfiguration(config: Configuration, topology_type=GraphTopology,
+                          seed: int = None, cache=None, world=None):
+        """
+        :returns a new environment set up as configured
+        :param config: the Configuration
+        :param topology_type: the topology backend
+        :param seed: the seed of the world
+        :param cache: a TopologyCache to load the world from
+        :param world: the world to set up instead of generating one
+        """
+        return WalkingDeadEnv(config.ricks_clique, config.enemies,
+                              config.zombies, config.zombie_aggressiveness,
+                              topology_type, config, seed, cache, world)
+
+    def getConfiguration(self) -> Configuration:
+        """
+        :returns the Configuration of the scenario
+        """
+        return self.__config
+
     def setRick(self, index: int):
         """
         sets rick on a node and holds a reference to that node
@@ -57,15 +136,131 @@ class WalkingDeadEnv(Environment):
         """
         return self.__rick == -1
 
+    def countAgents(self) -> dict:
+        """
+        :returns the number of agents of each class, without the zombies
+        killed (like the DataCollector counts them)
+        """
+        topology = self._topology
+        counts = topology.countAgents()
+        if isinstance(topology, ArrayTopology):
+            nodes = topology.getNodeArray()
+            dead = nodes[(topology.getStates()[nodes] &
+                          KillableZombie.STATE_DEAD) != 0]
+            types = [AgentKinds.getType(kind)
+                     for kind in topology.getKinds()[dead].tolist()]
+        else:
+            types = [topology.getAgentType(node) for node in topology.nodes()]
+            types = [agent_type for node, agent_type in
+                     zip(topology.nodes(), types)
+                     if issubclass(agent_type, KillableZombie) and
+                     topology.getState(node) & KillableZombie.STATE_DEAD]
+        for agent_type in types:
+            # humans use the same bit for skipping a timestep
+            if issubclass(agent_type, KillableZombie):
+                counts[agent_type] -= 1
+        return {agent_type: count for agent_type, count in counts.items()
+                if count > 0}
+
+    def getZombieAggressiveness(self) -> float:
+        """
+        :returns the likelihood a zombie eats a human
+        """
+        return self.__zombie_aggresiveness
+
     def setRandomLink(self, from_agent):
         """
         links an agent to another, random agent
 
+        the new link replaces the one the agent set before (if it was a new
+        edge), so moving agents do not make the topology denser and denser.
+        Random nodes are picked from a list kept since setup.
+
         :param from_agent: the agent to link from
         """
-        self._graph.add_edge(from_agent.getIndex(), choice(self._graph.nodes()))
+        if PROFILER.enabled:
+            PROFILER.count(Profiler.RANDOM_LINKS)
+        u = from_agent.getIndex()
+        v = self.getRandom(type(from_agent)).choice(self.__nodes)
+        old = self.__links.pop(u, None)
+        if old is not None:
+            self.removeEdge(u, old)
+        if not self._topology.hasEdge(u, v):
+            self.addEdge(u, v)
+            self.__links[u] = v
+
+    def moveLinks(self, sources, targets):
+        """
+        moves the random links of many nodes at once, just like calling
+        setRandomLink() for each of them
 
-    def runSimulation(self, time: int, trials: int):
+        :param sources: the nodes moving (each of them once)
+        :param targets: the node each of them links to
+        """
+        if PROFILER.enabled:
+            PROFILER.count(Profiler.RANDOM_LINKS, len(sources))
+        links = self.__links
+        old = [(u, links.pop(u)) for u in np.asarray(sources).tolist()
+               if u in links]
+        if old:
+            old = np.array(old, dtype=np.int64)
+            self.removeEdges(old[:, 0], old[:, 1])
+        sources, targets = self._topology.newEdges(sources, targets)
+        self.addEdges(sources, targets)
+        links.update(zip(sources.tolist(), targets.tolist()))
+
+    def getLinks(self) -> dict:
+        """
+        :returns the random links set by now (node to node it links to)
+        """
+        return dict(self.__links)
+
+    def setLinks(self, sources, targets):
+        """
+        sets the random links of many nodes as they were moved elsewhere
+        (see abm.wd.partition). Unlike moveLinks(), the links are taken as
+        they are, so each of them has to be a new edge.
+
+        :param sources: the nodes (each of them once)
+        :param targets: the node each of them links to, -1 for none
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        links = self.__links
+        old = [(u, links.pop(u)) for u in sources.tolist() if u in links]
+        if old:
+            old = np.array(old, dtype=np.int64)
+            self.removeEdges(old[:, 0], old[:, 1])
+        linked = targets >= 0
+        sources, targets = sources[linked], targets[linked]
+        self.addEdges(sources, targets)
+        links.update(zip(sources.tolist(), targets.tolist()))
+
+    def saveCurrentGraph(self):
+        """
+        overrides Environment.saveCurrentGraph() to save the random links as
+        well
+        """
+        super().saveCurrentGraph()
+        self.__saved_links = dict(self.__links)
+
+    def loadSavedGraph(self):
+        """
+        overrides Environment.loadSavedGraph() to restore the random links as
+        well
+        """
+        super().loadSavedGraph()
+        self.__links = dict(self.__saved_links)
+
+    def runSimulation(self, time: int, trials: int, batched: bool = False,
+                      workers: int = 1, seed: int = None,
+                      plot: bool = True, path: str = None,
+                      checkpoint: str = None,
+                      checkpoint_every: int = SIMULATION_CHECKPOINT_EVERY,
+                      precision=None,
+                      batch: int = SIMULATION_TRIALS_BATCH,
+                      confidence: float = SIMULATION_CONFIDENCE,
+                      partitions: int = 1) -> DataCollector:
         """
         runs a simulation
 
@@ -73,35 +268,595 @@ class WalkingDeadEnv(Environment):
         traversal all agents are executed and data is collected. Finally,
         the collected data is plotted.
 
+        Every trial is seeded on its own (see getTrialSeed()), so the results
+        only depend on the seed, no matter how many workers are used.
+
+        Given a precision, trials are run in batches until the confidence
+        intervals of the plotted quantities (the mean populations of each
+        timestep and rick's mean death time, see
+        DataCollector.getIntervalWidths()) are no wider than the precision or
+        the trials run out. The populations count hundreds of agents while
+        rick dies within tens of timesteps, so each quantity can be given a
+        precision of its own. The DataCollector tells how many trials were run
+        (see DataCollector.getTrials()). Since the trials are seeded on their
+        own, stopping after n trials gives the same results as running n
+        trials right away.
+
         :param time: the time the simulation should run
-        :param trials: the trials of the simulation
+        :param trials: the trials of the simulation (the most trials to run
+        given a precision)
+        :param batched: run each timestep as array operations (see
+        abm.wd.kernel.BatchedStep). Needs an ArrayTopology.
+        :param workers: the number of processes running trials in parallel.
+        None uses all cores.
+        :param seed: the seed of the simulation. By default, it is drawn from
+        the random module.
+        :param plot: plot the collected data
+        :param path: a file to write the collected data to as the
+        simulation goes (see DataCollector), instead of keeping it in memory
+        :param checkpoint: a file to write checkpoints to (see
+        writeCheckpoint()), so the simulation can be resumed from there (see
+        resumeSimulation()). Needs an ArrayTopology and workers=1, an
+        Exception is raised otherwise (even for a single trial).
+        :param checkpoint_every: the timesteps between two checkpoints
+        :param precision: the widest confidence interval to stop at, in
+        agents for the populations and in timesteps for rick's death. Either
+        one for all quantities or a dict of the widest interval of each of
+        them, e.g. {'zombies': 10, 'humans': 10, 'ricks_death': 2} (see
+        DataCollector.isPrecise()). By default, all trials are run.
+        :param batch: the trials run between two checks of the confidence
+        intervals
+        :param confidence: the confidence level of the intervals
+        :param partitions: the number of processes stepping each trial
+        together (see abm.wd.partition.PartitionedStep), for worlds too
+        slow to step in a single process. They share the work, not the
+        memory: the whole world is kept in this process. Timesteps are run like batched ones, but
+        the results differ with the number of partitions. Needs an
+        ArrayTopology, workers=1 and no checkpoints, an Exception is raised
+        otherwise (even for a single trial).
+        :return: the DataCollector holding the collected data
         """
-        ae = AgentExecutor()
-        dc = DataCollector()
+        if seed is None:
+            seed = getrandbits(64)
+        if workers is None:
+            workers = os.cpu_count()
+        if batch < 1:
+            raise Exception("A batch needs at least one trial")
+        if isinstance(precision, dict):
+            unknown = set(precision) - set(DataCollector.STATISTICS)
+            if unknown:
+                raise Exception("Unknown statistics: %s" % ", ".join(sorted(
+                    unknown)))
+        dc = DataCollector(trials, time + 1, path)
+        if TELEMETRY.enabled:
+            TELEMETRY.startRun(trials, time)
+        adaptive = None if precision is None else {
+            'precision': precision, 'batch': batch, 'confidence': confidence}
 
-        for i in range(trials):
+        checkpointer = None
+        if checkpoint is not None:
+            if not isinstance(self._topology, ArrayTopology):
+                raise Exception("Checkpoints need an ArrayTopology")
+            if workers != 1:
+                raise Exception("Checkpoints need a single worker")
+            checkpointer = Checkpointer(checkpoint, checkpoint_every, dc, {
+                'time': time, 'trials': trials, 'seed': seed,
+                'batched': batched, 'adaptive': adaptive})
+        if partitions > 1:
+            if not isinstance(self._topology, ArrayTopology):
+                raise Exception("Partitions need an ArrayTopology")
+            if workers != 1 or checkpoint is not None:
+                raise Exception("Partitions need a single worker and no "
+                                "checkpoints")
+            self.__partitioned = PartitionedStep(partitions)
+
+        if self.__partitioned is not None:
+            try:
+                self.__runBatches(dc, time, trials, seed, True, 0, None,
+                                  adaptive)
+            finally:
+                self.__partitioned.close()
+                self.__partitioned = None
+        elif workers == 1 or trials == 1:
+            self.__runBatches(dc, time, trials, seed, batched, 0,
+                              checkpointer, adaptive)
+        else:
+            LOGGER("Running %d Trials on %d workers" % (trials, workers),
+                   Logger.LEVEL_ITERATIONS)
+            # forked workers inherit the environment instead of unpickling it
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                'fork' if 'fork' in methods else None)
+            # a batch of trials is collected at once
+            shared, env = self.__share(time, trials if adaptive is None
+                                       else min(batch, trials))
+            try:
+                with ProcessPoolExecutor(workers, mp_context=context,
+                                         initializer=_initWorker,
+                                         initargs=(shared.getHandle(),
+                                                   env)) as pool:
+                    self.__runBatches(dc, time, trials, seed, batched, 0,
+                                      None, adaptive, pool, shared['results'])
+            finally:
+                shared.close()
+        dc.close()
+        if TRACER.enabled:
+            TRACER.flush()
+        if TELEMETRY.enabled:
+            TELEMETRY.finishRun()
+        # dc.dump()
+        if plot:
+            Plotter().plotData(dc)
+        return dc
+
+    def __runBatches(self, dc: DataCollector, time: int, trials: int,
+                     seed: int, batched: bool, first: int, checkpointer,
+                     adaptive: dict, pool: ProcessPoolExecutor = None,
+                     results: np.ndarray = None):
+        """
+        runs trials in batches until the confidence intervals are narrow
+        enough (see runSimulation()), or all of them at once
+
+        :param dc: the DataCollector
+        :param time: the time each trial should run
+        :param trials: the most trials to run
+        :param seed: the seed of the simulation
+        :param batched: run each timestep as array operations
+        :param first: the trial to start with
+        :param checkpointer: the Checkpointer or None
+        :param adaptive: the precision, batch and confidence (see
+        runSimulation()) or None to run all trials
+        :param pool: the workers running the trials. By default, trials are
+        run one after another.
+        :param results: the array the workers collect the trials of a batch
+        in (see __share())
+        """
+        while first < trials:
+            if adaptive is None:
+                last = trials
+            # the intervals are checked after whole batches only, so a
+            # resumed simulation stops where it would have stopped anyway
+            elif first and first % adaptive['batch'] == 0 and \
+                    dc.isPrecise(adaptive['precision'],
+                                 adaptive['confidence']):
+                break
+            else:
+                last = min(trials, (first // adaptive['batch'] + 1) *
+                           adaptive['batch'])
+            if pool is None:
+                self.__runTrials(dc, time, last, seed, batched, first,
+                                 checkpointer)
+            else:
+                tasks = [(time, self.getTrialSeed(seed, i), batched,
+                          i - first) for i in range(first, last)]
+                for row in pool.map(_runTrial, tasks):
+                    dc.addTrial({key: results[i, row] for i, key in
+                                 enumerate(DataCollector.ENTITIES)})
+                    if TELEMETRY.enabled:
+                        TELEMETRY.finishTrial()
+            first = last
+        if adaptive is not None:
+            LOGGER("Ran %d of %d Trials" % (dc.getTrials(), trials),
+                   Logger.LEVEL_ITERATIONS)
+
+    def __share(self, time: int, trials: int):
+        """
+        puts what the workers of a simulation share into shared memory (see
+        abm.shared), so starting them and collecting their results does not
+        pickle anything large: the array the workers collect their trials in
+        (entities x trials x timesteps) and, on an ArrayTopology, the world
+        as it is now. The workers read the adjacency in place and set up
+        their agents from the kinds, states and flyweights (see
+        attachWorld()).
+
+        :param time: the time each trial should run
+        :param trials: the number of trials collected at once
+        :return: the SharedArrays and what the workers need besides: the
+        environment itself on other topologies (inherited by forked workers,
+        pickled otherwise), its small remainder (configuration, prototypes,
+        Rick and the random links) on an ArrayTopology
+        """
+        results = np.zeros((len(DataCollector.ENTITIES), trials, time + 1),
+                           dtype=np.int64)
+        topology = self._topology
+        if not isinstance(topology, ArrayTopology):
+            return SharedArrays({'results': results}), self
+        arrays = self.__packAgents()
+        links = arrays.pop('links')
+        for name, array in topology.packEdges().items():
+            arrays['edges_' + name] = array
+        shared = SharedArrays(dict(arrays, results=results),
+                              readonly=tuple(arrays))
+        return shared, {'config': self.__config, 'seed': self.__seed,
+                        'prototypes': self.__packPrototypes(),
+                        'rick': self.__rick, 'links': links.tolist()}
+
+    @staticmethod
+    def attachWorld(shared: SharedArrays, meta: dict):
+        """
+        :returns an environment set up on a world published by another
+        process (see __share()). The adjacency stays in shared memory, it is
+        never modified in place. Agents and edges changed by trials are kept
+        by the environment itself.
+        :param shared: the SharedArrays attached to
+        :param meta: the remainder of the environment (see __share())
+        """
+        arrays = {name: shared[name] for name in shared.names()}
+        world = WalkingDeadEnv.__unpackWorld(
+            arrays, WalkingDeadEnv.__select(arrays, 'edges_'))
+        env = WalkingDeadEnv.fromConfiguration(meta['config'], ArrayTopology,
+                                               meta['seed'], world=world)
+        env.__restoreAgents(meta['prototypes'], arrays['flyweights'],
+                            arrays['states'])
+        env.__links = dict(meta['links'])
+        env.__rick = meta['rick']
+        return env
+
+    def __runTrials(self, dc: DataCollector, time: int, trials: int,
+                    seed: int, batched: bool, first: int, checkpointer):
+        """
+        runs trials one after another
+
+        :param dc: the DataCollector
+        :param time: the time each trial should run
+        :param trials: the number of trials of the simulation
+        :param seed: the seed of the simulation
+        :param batched: run each timestep as array operations
+        :param first: the trial to start with
+        :param checkpointer: the Checkpointer or None
+        """
+        for i in range(first, trials):
             LOGGER("Running Trial %d" % i, Logger.LEVEL_ITERATIONS)
+            PROFILER.setTrial(i)
+            PROFILER.setTime(0)
+            if TELEMETRY.enabled:
+                TELEMETRY.setTrial(i)
             dc.setTrial(i)
-            # get initial state (t=0) before agents act
-            self.traverseTopology(dc)
-            # for timestep: let agents act and get state
-            self.traverseTopologyUntil(time, ae, dc)
-            dc.resetTime()
-        # dc.dump()
-        Plotter().plotData(dc)
+            self.runTrial(dc, time, self.getTrialSeed(seed, i), batched,
+                          checkpointer)
+            if TELEMETRY.enabled:
+                TELEMETRY.finishTrial()
+
+    def runTrial(self, dc: DataCollector, time: int, seed: int,
+                 batched: bool = False, checkpointer: Checkpointer = None):
+        """
+        runs a single trial and collects its data in the current trial of
+        the DataCollector. The topology is the same afterwards.
+
+        :param dc: the DataCollector
+        :param time: the time the trial should run
+        :param seed: the seed of the trial
+        :param batched: run each timestep as array operations
+        :param checkpointer: writes checkpoints as the trial goes
+        """
+        self.seedRandom(seed)
+        if self.__partitioned is not None:
+            ae = self.__partitioned
+            ae.setEnvironment(self)
+            ae.startTrial(seed)
+        elif batched:
+            ae = BatchedStep()
+        else:
+            ae = self.__executor
+        # get initial state (t=0) before agents act
+        self.traverseTopology(dc)
+        # for timestep: let agents act and get state
+        self.__continueTrial(dc, ae, time, 0, checkpointer)
+
+    def __continueTrial(self, dc: DataCollector, executor, time: int,
+                        start: int, checkpointer):
+        """
+        runs the timesteps of a trial from a given timestep on. The trial
+        stops early once it has settled: no humans or no zombies are left
+        (see DataCollector.isSettled()) or no agent can act any more (see
+        ActiveSetExecutor.isSettled()). The collector fills in the
+        remaining timesteps.
+
+        :param dc: the DataCollector
+        :param executor: the ActiveSetExecutor or BatchedStep
+        :param time: the time the trial should run
+        :param start: the timestep to start at
+        :param checkpointer: the Checkpointer or None
+        """
+        ops = [executor, dc]
+        if checkpointer is not None:
+            ops.append(checkpointer)
+        self.traverseTopologyUntil(time, *ops, start=start)
+        # a trial stopped early has settled, its counts stay as they are
+        dc.fillTrial(time + 1)
+        dc.resetTime()
+
+    @staticmethod
+    def getTrialSeed(seed: int, trial: int) -> int:
+        """
+        :returns the seed of a trial
+        :param seed: the seed of the simulation
+        :param trial: the index of the trial
+        """
+        sequence = np.random.SeedSequence([seed, trial])
+        return int(sequence.generate_state(1, np.uint64)[0])
 
-    def traverseTopologyUntil(self, time: int, *ops):
+    def writeCheckpoint(self, path: str, dc: DataCollector,
+                        simulation: dict):
+        """
+        writes the state of a running simulation to a .npz file, so it can
+        be resumed exactly (see resumeSimulation()). Called by a Checkpointer
+        (see checkpoint.py) after a timestep.
+
+        A checkpoint holds the world as it was set up, the edges (including
+        the random links) and agents as they are now, Rick's node, the state
+        of the random number streams and the data collected so far. The
+        file is written to a temporary file first, so a crash never leaves a
+        broken checkpoint behind.
+
+        :param path: the file to write
+        :param dc: the DataCollector of the simulation
+        :param simulation: the arguments of the simulation (time, trials,
+        seed and batched)
+        """
+        topology = self._topology
+        if not isinstance(topology, ArrayTopology):
+            raise Exception("Checkpoints need an ArrayTopology")
+        trial = dc.getCurrentTrial()
+        meta = {'version': WalkingDeadEnv.CHECKPOINT_VERSION,
+                'config': self.__config.getParameters(),
+                'world_seed': self.__seed, 'simulation': simulation,
+                'trial': trial, 'time': dc.getTime(), 'rick': self.__rick,
+                'prototypes': self.__packPrototypes(),
+                'random': self.getRandomStreams().getState()}
+
+        arrays = self.__packAgents()
+        arrays['meta'] = np.array(json.dumps(meta))
+        for name, array in topology.packEdges(self.__initial_edges).items():
+            arrays['world_' + name] = array
+        for name, array in topology.packEdges().items():
+            arrays['edges_' + name] = array
+        for entity in DataCollector.ENTITIES:
+            data = np.nan_to_num(dc.getData(entity))[:trial + 1]
+            arrays['data_' + entity] = data.astype(np.int64)
+
+        LOGGER("Writing checkpoint %s" % path, Logger.LEVEL_ITERATIONS)
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def resumeSimulation(checkpoint: str, seed: int = None,
+                         config: Configuration = None, plot: bool = True,
+                         path: str = None, next_checkpoint: str = None,
+                         checkpoint_every: int = SIMULATION_CHECKPOINT_EVERY
+                         ) -> DataCollector:
+        """
+        resumes a simulation from a checkpoint (see runSimulation()) and runs
+        it to the end. Without a seed and a config, the simulation goes on
+        exactly as if it had not been interrupted.
+
+        Given another seed or config, a what-if continuation is forked
+        instead: the timesteps after the checkpoint are drawn from the new
+        seed and the agents behave as configured. Zombies already placed
+        become zombies of the new configuration. The sizes and offsets of
+        the world cannot change. Any number of continuations can be forked
+        from the same checkpoint, none of them replays the timesteps before.
+
+        :param checkpoint: the checkpoint file
+        :param seed: the seed to continue with
+        :param config: the Configuration to continue with
+        :param plot: plot the collected data
+        :param path: a file to write the collected data to (see
+        runSimulation()). The data collected before the checkpoint is
+        written as well.
+        :param next_checkpoint: a file to write further checkpoints to
+        :param checkpoint_every: the timesteps between two checkpoints
+        :return: the DataCollector holding the collected data
+        """
+        with np.load(checkpoint) as f:
+            arrays = {name: f[name] for name in f.files}
+        meta = json.loads(str(arrays['meta']))
+        if meta['version'] != WalkingDeadEnv.CHECKPOINT_VERSION:
+            raise Exception("Unknown checkpoint version %d" % meta['version'])
+        saved = Configuration(**meta['config'])
+        config = config or saved
+        if any(getattr(config, name) != getattr(saved, name)
+               for name in WalkingDeadEnv.WORLD_PARAMETERS):
+            raise Exception("The sizes and offsets of a checkpoint cannot "
+                            "change")
+        simulation = meta['simulation']
+        time, trials, batched = simulation['time'], simulation['trials'], \
+            simulation['batched']
+        fork = (seed is not None and seed != simulation['seed']) or \
+            config.getParameters() != saved.getParameters()
+        if seed is None:
+            seed = simulation['seed']
+
+        world = WalkingDeadEnv.__unpackWorld(
+            arrays, WalkingDeadEnv.__select(arrays, 'world_'))
+        env = WalkingDeadEnv.fromConfiguration(config, ArrayTopology,
+                                               meta['world_seed'],
+                                               world=world)
+        env.__restore(meta, arrays)
+
+        trial, collected = meta['trial'], meta['time']
+        dc = DataCollector(trials, time + 1, path)
+        dc.restore(WalkingDeadEnv.__select(arrays, 'data_'), trial, collected)
+        checkpointer = None
+        if next_checkpoint is not None:
+            checkpointer = Checkpointer(next_checkpoint, checkpoint_every, dc,
+                                        dict(simulation, seed=seed))
+
+        if fork:
+            env.seedRandom(env.getTrialSeed(seed, trial))
+        else:
+            env.getRandomStreams().setState(meta['random'])
+        executor = BatchedStep() if batched else env.__executor
+
+        LOGGER("Resuming Trial %d at timestep %d" % (trial, collected),
+               Logger.LEVEL_ITERATIONS)
+        PROFILER.setTrial(trial)
+        if TELEMETRY.enabled:
+            TELEMETRY.startRun(trials, time, trial)
+        # timestep 0 is collected before the agents act
+        env.__continueTrial(dc, executor, time, collected - 1, checkpointer)
+        if TELEMETRY.enabled:
+            TELEMETRY.finishTrial()
+        env.__runBatches(dc, time, trials, seed, batched, trial + 1,
+                         checkpointer, simulation.get('adaptive'))
+        dc.close()
+        if TRACER.enabled:
+            TRACER.flush()
+        if TELEMETRY.enabled:
+            TELEMETRY.finishRun()
+        if plot:
+            Plotter().plotData(dc)
+        return dc
+
+    def __restore(self, meta: dict, arrays: dict):
+        """
+        brings the environment (set up on the world of a checkpoint) to the
+        state of the checkpoint. The graph is saved before, so rolling back
+        at the end of the trial restores the world as it was set up.
+
+        :param meta: the meta data of the checkpoint
+        :param arrays: the arrays of the checkpoint
+        """
+        topology = self._topology
+        self.saveCurrentGraph()
+        self.__restoreAgents(meta['prototypes'], arrays['flyweights'],
+                             arrays['states'])
+
+        # the edges are restored exactly as they were, listeners see the
+        # difference to the world
+        edges = WalkingDeadEnv.__select(arrays, 'edges_')
+        size = len(edges['indptr']) - 1
+
+        def edgeKeys(rows, columns):
+            upper = rows <= columns
+            return np.unique(rows[upper] * size + columns[upper])
+
+        before = edgeKeys(*topology.edgeArrays(cliques=False))
+        after = np.union1d(np.setdiff1d(
+            edgeKeys(np.repeat(np.arange(size), np.diff(edges['indptr'])),
+                     edges['indices'].astype(np.int64)),
+            edgeKeys(edges['removed_rows'], edges['removed_columns'])),
+            edgeKeys(edges['extra_rows'], edges['extra_columns']))
+        self.replaceEdges(ArrayTopology.unpackEdges(edges),
+                          np.divmod(np.setdiff1d(before, after), size),
+                          np.divmod(np.setdiff1d(after, before), size))
+
+        self.__links = dict(arrays['links'].tolist())
+        self.__rick = meta['rick']
+
+    def __restoreAgents(self, prototypes: list, flyweights: np.ndarray,
+                        states: np.ndarray):
+        """
+        places the agents packed by __packAgents() on the nodes where they
+        differ from the agents placed now
+
+        :param prototypes: the kind and parameters of each flyweight (see
+        __packPrototypes())
+        :param flyweights: the flyweight of each node
+        :param states: the state of each node
+        """
+        topology = self._topology
+        # agents are compared by kind and parameters, zombies are the
+        # zombies of the current configuration
+        config = self.__config
+        zombie = ZombieFactory.getInstance(config.zombie_aggressiveness,
+                                           config.scenario)
+
+        def key(agent_type, parameters):
+            if issubclass(agent_type, Zombie):
+                return type(zombie), zombie.getParameters()
+            return agent_type, tuple(parameters)
+
+        keys = [None] + [key(AgentKinds.getType(kind), parameters)
+                         for kind, parameters in prototypes[1:]]
+        own = [None] + [key(type(agent), agent.getParameters())
+                        for agent in topology.getPrototypes()[1:]]
+        ids = {}
+        agents = np.array([ids.setdefault(k, len(ids)) for k in keys])[
+            flyweights]
+        changed = np.flatnonzero(
+            (agents != np.array([ids.setdefault(k, len(ids)) for k in own])[
+                topology.getFlyweights()]) | (states != topology.getStates()))
+        groups = agents[changed] * 256 + states[changed]
+        by_id = {i: k for k, i in ids.items()}
+        for group in np.unique(groups).tolist():
+            if by_id[group // 256] is None:
+                raise Exception("Agents cannot be removed from nodes")
+            agent_type, parameters = by_id[group // 256]
+            agent = agent_type(*parameters)
+            agent.setState(group % 256)
+            self.setAgents(changed[groups == group], agent)
+
+    def __packPrototypes(self) -> list:
+        """
+        :returns the kind and parameters of each flyweight of the topology
+        (None for flyweight 0), e.g. for writing them to a file
+        """
+        return [None] + [
+            (AgentKinds.getKind(type(agent)), agent.getParameters())
+            for agent in self._topology.getPrototypes()[1:]]
+
+    def __packAgents(self) -> dict:
+        """
+        :returns the nodes and cliques of the topology, the agents (kinds,
+        states and flyweights) on them and the random links as arrays (see
+        __unpackWorld() and __restoreAgents())
+        """
+        topology = self._topology
+        cliques = topology.getCliques()
+        return {'nodes': topology.getNodeArray(),
+                'cliques': np.concatenate(
+                    [np.zeros(0, dtype=np.int64)] + cliques),
+                'clique_sizes': np.array([len(members) for members in
+                                          cliques], dtype=np.int64),
+                'kinds': topology.getKinds(),
+                'states': topology.getStates(),
+                'flyweights': topology.getFlyweights(),
+                'links': np.array(list(self.__links.items()),
+                                  dtype=np.int64).reshape(-1, 2)}
+
+    @staticmethod
+    def __unpackWorld(arrays: dict, edges: dict) -> ArrayTopology:
+        """
+        :returns the world (without agents) packed by __packAgents() and
+        ArrayTopology.packEdges()
+        :param arrays: the arrays holding the nodes and cliques
+        :param edges: the packed edges
+        """
+        sizes = arrays['clique_sizes']
+        world = ArrayTopology(arrays['nodes'], cliques=np.split(
+            arrays['cliques'], np.cumsum(sizes)[:-1]) if len(sizes) else [])
+        world.restoreEdges(ArrayTopology.unpackEdges(edges), [])
+        return world
+
+    @staticmethod
+    def __select(arrays: dict, prefix: str) -> dict:
+        """
+        :returns the arrays whose names start with a prefix (without it)
+        :param arrays: the arrays of a checkpoint
+        :param prefix: the prefix
+        """
+        return {name[len(prefix):]: array for name, array in arrays.items()
+                if name.startswith(prefix)}
+
+    def traverseTopologyUntil(self, time: int, *ops, start: int = 0):
         """
         traverses the topology multiple times. The topology is saved before and
-        restored after traversal.
+        restored after traversal. A traversal resumed at a later step (see
+        resumeSimulation()) restores the topology saved before resuming.
 
         :param time: number of traversal iterations
         :param ops: operations that should be executed on each node in each
         traversal step
+        :param start: the step to start at
+        :return: the step the traversals stopped at
         """
-        self.saveCurrentGraph()
-        super().traverseTopologyUntil(time, *ops)
+        if start == 0:
+            self.saveCurrentGraph()
+        stop = super().traverseTopologyUntil(time, *ops, start=start)
         self.loadSavedGraph()
+        return stop
 
     def setup(self, ricks_clique: int, enemies_clique: int, zombies_clique: int,
               zombie_aggressiveness: float):
@@ -113,46 +868,109 @@ class WalkingDeadEnv(Environment):
         merged together by connecting a fraction of nodes from each graph
         with nodes from the other graphs.
 
+        On an ArrayTopology, the cliques are represented implicitly (see
+        ArrayTopology), so setting up takes linear time in their size.
+
         :param ricks_clique: the size of ricks clique
         :param enemies_clique: the size of the enemies clique
         :param zombies_clique: the size of the zombies graph
         :param zombie_aggressiveness: the likelihood a zombie eats a human
         """
-        # rick and friends are a clique
-        rick_and_friends = nx.complete_graph(ricks_clique).to_undirected()
+        config = self.__config
+        topology = self.__world
+        if topology is None and self.__cache is not None:
+            topology = self.__cache.load(config, self.__seed)
+        if topology is None:
+            self.__generate(ricks_clique, enemies_clique, zombies_clique)
+            if self.__cache is not None:
+                self.__cache.store(config, self.__seed, self._topology)
+        else:
+            self._topology = topology
 
-        # enemies are a clique
-        enemies = nx.complete_graph(enemies_clique).to_undirected()
+        # set agents
+        self.setAgents(range(config.rick_offset,
+                             config.rick_offset + ricks_clique),
+                       FriendOfRick())
+        self.setAgents(range(config.enemy_offset,
+                             config.enemy_offset + enemies_clique),
+                       EnemyOfRick())
+        self.setAgents(range(config.zombie_offset,
+                             config.zombie_offset + zombies_clique),
+                       ZombieFactory.getInstance(zombie_aggressiveness,
+                                                 config.scenario))
+
+        self.setRick(config.rick_offset)
+        self.__nodes = self._topology.nodes()
+        self.__links = {}
+        self.__initial_edges = self._topology.saveEdges()
+
+    def __generate(self, ricks_clique: int, enemies_clique: int,
+                   zombies_clique: int):
+        """
+        generates the world, i.e. the topology of the scenario (see setup())
+
+        :param ricks_clique: the size of ricks clique
+        :param enemies_clique: the size of the enemies clique
+        :param zombies_clique: the size of the zombies graph
+        """
+        # the world is drawn from its own seed or the random module
+        rng = random if self.__seed is None else random.Random(self.__seed)
+        scale_free_seed = None if self.__seed is None else rng.getrandbits(32)
 
         # zombies are power law distributed
-        zombies = nx.scale_free_graph(zombies_clique).to_undirected()
-
-        # lets merge them all together in one world
-        self.__copy_graph(rick_and_friends, RICK_OFFSET)
-        self.__copy_graph(enemies, ENEMY_OFFSET)
-        self.__copy_graph(zombies, ZOMBIE_OFFSET)
-
-        # and place some links between them
-        links_rick_enemies = randint(1, max(int(ricks_clique * 0.2), 2))
-        links_rick_zombies = randint(1, max(int(ricks_clique * 0.4), 2))
-        links_enemies_zombies = randint(1, max(int(enemies_clique * 0.4), 2))
-        range_rick = range(RICK_OFFSET, ricks_clique)
-        range_enemies = range(ENEMY_OFFSET, ENEMY_OFFSET + enemies_clique)
-        range_zombies = range(ZOMBIE_OFFSET, ZOMBIE_OFFSET + zombies_clique)
-        self.__add_random_links(range_rick, range_enemies, links_rick_enemies)
-        self.__add_random_links(range_rick, range_zombies, links_rick_zombies)
-        self.__add_random_links(range_enemies, range_zombies,
+        zombies = nx.scale_free_graph(zombies_clique,
+                                      seed=scale_free_seed).to_undirected()
+
+        # and some links are placed between rick and friends, enemies and
+        # zombies
+        config = self.__config
+        links_rick_enemies = rng.randint(1, max(int(ricks_clique * 0.2), 2))
+        links_rick_zombies = rng.randint(1, max(int(ricks_clique * 0.4), 2))
+        links_enemies_zombies = rng.randint(
+            1, max(int(enemies_clique * 0.4), 2))
+        range_rick = range(config.rick_offset,
+                           config.rick_offset + ricks_clique)
+        range_enemies = range(config.enemy_offset,
+                              config.enemy_offset + enemies_clique)
+        range_zombies = range(config.zombie_offset,
+                              config.zombie_offset + zombies_clique)
+        links = self.__random_links(rng, range_rick, range_enemies,
+                                    links_rick_enemies) + \
+            self.__random_links(rng, range_rick, range_zombies,
+                                links_rick_zombies) + \
+            self.__random_links(rng, range_enemies, range_zombies,
                                 links_enemies_zombies)
 
-        # set agents
-        for i in range(ricks_clique):
-            self.setAgent(i, FriendOfRick())
-        for i in range(ENEMY_OFFSET, ENEMY_OFFSET + enemies_clique):
-            self.setAgent(i, EnemyOfRick())
-        for i in range(ZOMBIE_OFFSET, ZOMBIE_OFFSET + zombies_clique):
-            self.setAgent(i, ZombieFactory.getInstance(zombie_aggressiveness))
+        if issubclass(self.__topology_type, ArrayTopology):
+            # rick and friends are a clique, so are the enemies
+            friends = np.arange(ricks_clique) + config.rick_offset
+            enemies = np.arange(enemies_clique) + config.enemy_offset
+            offset = config.zombie_offset
+            nodes = np.array(list(zombies.nodes()), dtype=np.int64) + offset
+            edges = np.concatenate((
+                np.array(list(zombies.edges()), dtype=np.int64).reshape(
+                    -1, 2) + offset,
+                np.array(links, dtype=np.int64).reshape(-1, 2)))
+            self._topology = self.__topology_type(
+                np.concatenate((friends, enemies, nodes)), edges[:, 0],
+                edges[:, 1], cliques=(friends, enemies))
+        else:
+            # rick and friends are a clique
+            rick_and_friends = nx.complete_graph(ricks_clique).to_undirected()
+
+            # enemies are a clique
+            enemies = nx.complete_graph(enemies_clique).to_undirected()
+
+            # lets merge them all together in one world
+            self.__copy_graph(rick_and_friends, config.rick_offset)
+            self.__copy_graph(enemies, config.enemy_offset)
+            self.__copy_graph(zombies, config.zombie_offset)
+            for u, v in links:
+                self._topology.addEdge(u, v)
 
-        self.setRick(0)
+            if self.__topology_type is not GraphTopology:
+                self._topology = self.__topology_type.fromGraph(
+                    self._topology.getGraph())
 
     def __copy_graph(self, source, offset: int):
         """
@@ -163,19 +981,60 @@ class WalkingDeadEnv(Environment):
         index is not used multiple times within the internal topology
         """
         for node in source.nodes():
-            self._graph.add_node(node + offset)
+            self._topology.addNode(node + offset)
         for u, v in source.edges():
-            self._graph.add_edge(u + offset, v + offset)
+            self._topology.addEdge(u + offset, v + offset)
 
-    def __add_random_links(self, noderange1: range, noderange2: range,
-                           number_of_links: int):
+    @staticmethod
+    def __random_links(rng, noderange1: range, noderange2: range,
+                       number_of_links: int) -> list:
         """
-        adds random links to the internal topology.
+        :returns random links (pairs of nodes) between two communities
+        :param rng: the random.Random (or the random module) to draw from
         :param noderange1: range of nodes of the first community
         :param noderange2: range of nodes of the second community
         :param number_of_links: the number of links that should be set between
         the two communities
         """
-        for i in range(number_of_links):
-            u, v = choice(noderange1), choice(noderange2)
-            self._graph.add_edge(u, v)
+        return [(rng.choice(noderange1), rng.choice(noderange2))
+                for _ in range(number_of_links)]
+
+
+# the environment of a worker process (see WalkingDeadEnv.runSimulation())
+_worker_env = None
+_worker_dc = None
+_worker_shared = None
+
+
+def _initWorker(handle: dict, env):
+    """
+    initializes a worker process
+
+    :param handle: the handle of the arrays shared with the simulation
+    :param env: the environment the worker runs trials on or what it needs
+    to set it up on the shared world (see WalkingDeadEnv.attachWorld())
+    """
+    global _worker_env, _worker_dc, _worker_shared
+    # the simulation counts the trials of the workers
+    TELEMETRY.disable()
+    _worker_shared = SharedArrays.attach(handle)
+    if not isinstance(env, WalkingDeadEnv):
+        env = WalkingDeadEnv.attachWorld(_worker_shared, env)
+    _worker_env = env
+    # the collector keeps listening to the environment between trials and
+    # collects right into the shared results
+    _worker_dc = DataCollector.fromArray(_worker_shared['results'])
+
+
+def _runTrial(task: tuple) -> int:
+    """
+    runs a trial in a worker process
+
+    :param task: time, seed, batched (see WalkingDeadEnv.runTrial()) and
+    the row of the shared results to collect the trial in
+    :return: the row
+    """
+    time, seed, batched, row = task
+    _worker_dc.setTrial(row)
+    _worker_env.runTrial(_worker_dc, time, seed, batched)
+    return row
@@ -0,0 +1,232 @@
+import numpy as np
+
+from abm.agents import AgentKinds
+from abm.environment import EnvironmentOperable
+from abm.topology import ArrayTopology
+from abm.wd.agents import Rick, FriendOfRick, EnemyOfRick, Zombie, \
+    KillableZombie, MovableKillableZombie, ZombieFactory
+from settings import TRACER, TELEMETRY
+
+
+class BatchedStep(EnvironmentOperable):
+    """
+    performs a whole timestep of the walking dead scenario as array
+    operations. Used instead of the AgentExecutor on an ArrayTopology.
+
+    First, Rick and his friends act. There are few of them, so they simply
+    run their do() methods. They sit on the lowest node indices, so the
+    AgentExecutor visits them before the zombies as well. A zombie swapping
+    places with a friend lands on a node visited already and does not act
+    in this timestep. Then, the zombies act in waves: moving zombies set
+    their random links, zombie-human contacts are collected from the edge
+    arrays, killable zombies fight back, surviving zombies attack their
+    first human neighbor and the victims are converted.
+
+    The AgentExecutor visits nodes in order, so a human infected by a zombie
+    on a lower node index attacks within the same timestep. The waves
+    reproduce this: such victims form the next wave. Within a wave, the
+    zombies fight in rounds: a zombie sharing a human neighbor with a lower
+    zombie of the wave waits for it, then fights the human neighbors left.
+    The zombies of a round share no human neighbors, so their fights are
+    drawn on the same state, and a zombie finds the humans eaten by lower
+    zombies converted, as on the per-agent path. Individual runs differ
+    from the per-agent path, the population statistics agree (see
+    tests/test_equivalence.py).
+
+    The outcomes are drawn from the random numbers of the environment (see
+    Environment.getRandom()), from the stream of the kind of agent drawing
+    them, all numbers a wave needs at once. Seeding the environment
+    therefore makes batched runs reproducible as well, and the state of a
+    trial's random numbers is the state of the environment's streams.
+    """
+
+    # below this share of the adjacency entries, the contacts of a wave are
+    # handled node by node instead of processing the whole topology
+    SPARSE_WAVE = 1 / 64
+
+    def isNodewise(self) -> bool:
+        return False
+
+    def __call__(self, node: int):
+        pass
+
+    def preProcess(self):
+        """
+        runs the timestep
+        """
+        topology = self._env.getBackend()
+        if not isinstance(topology, ArrayTopology):
+            raise Exception("Batched steps need an ArrayTopology")
+
+        nodes = topology.getNodeArray()
+        zombies = AgentKinds.getMask(Zombie, KillableZombie,
+                                     MovableKillableZombie)
+        before = zombies[topology.getKinds()[nodes]]
+
+        self.__swap(topology)
+
+        # a zombie a friend swapped places with is on a node visited
+        # already, so it does not act
+        wave = nodes[before & zombies[topology.getKinds()[nodes]]]
+        while len(wave) > 0:
+            if TELEMETRY.enabled:
+                TELEMETRY.count(len(wave))
+            self.__move(topology, wave)
+            attackers, victims = self.__contacts(topology, wave)
+            wave = self.__fightRounds(topology, attackers, victims)
+
+    def __swap(self, topology: ArrayTopology):
+        """
+        lets Rick and his friends act
+
+        :param topology: the environments topology
+        """
+        nodes = topology.getNodeArray()
+        moving = AgentKinds.getMask(Rick, FriendOfRick)
+        humans = nodes[moving[topology.getKinds()[nodes]]].tolist()
+        if TELEMETRY.enabled:
+            TELEMETRY.count(len(humans))
+        for node in humans:
+            self._env.getAgent(node).do()
+
+    def __move(self, topology: ArrayTopology, wave: np.ndarray):
+        """
+        moving zombies (dead or alive, just like MovableKillableZombie.do())
+        move their random links to random nodes
+
+        :param topology: the environments topology
+        :param wave: the zombies acting
+        """
+        moving = AgentKinds.getMask(MovableKillableZombie)
+        movers = wave[moving[topology.getKinds()[wave]]]
+        if len(movers) == 0:
+            return
+        nodes = topology.getNodeArray()
+        # picked like Environment.setRandomLink() picks them
+        random = self._env.getRandom(MovableKillableZombie)
+        targets = nodes[(random.uniforms(len(movers)) *
+                         len(nodes)).astype(np.int64)]
+        self._env.moveLinks(movers, targets)
+
+    def __contacts(self, topology: ArrayTopology, wave: np.ndarray):
+        """
+        :returns all (zombie, human) pairs of neighbors where the zombie is
+        part of the wave and alive. The pairs of each zombie are in neighbor
+        order.
+        :param topology: the environments topology
+        :param wave: the zombies acting (sorted)
+        """
+        kinds = topology.getKinds()
+        humans = AgentKinds.getMask(Rick, FriendOfRick, EnemyOfRick)[kinds]
+        alive = (topology.getStates() & KillableZombie.STATE_DEAD) == 0
+
+        rows, columns = topology.edgeArrays(cliques=False)
+        # zombies within a clique (converted humans) neighbor all of it, so
+        # their contacts are never taken from the edge arrays
+        cliqued = topology.getCliqueIds()[wave] >= 0
+        if len(wave) < len(rows) * BatchedStep.SPARSE_WAVE:
+            sparse, wave = wave, wave[:0]
+        else:
+            sparse, wave = wave[cliqued], wave[~cliqued]
+
+        acting = np.zeros(len(kinds), dtype=bool)
+        acting[wave] = True
+        contacts = acting[rows] & alive[rows] & humans[columns]
+        rows, columns = rows[contacts], columns[contacts]
+        if len(sparse) > 0:
+            neighbors = [topology.neighborArray(node) for node in
+                         sparse.tolist()]
+            sparse_rows = np.repeat(sparse, [len(n) for n in neighbors])
+            sparse_columns = np.concatenate(neighbors).astype(np.int64)
+            contacts = alive[sparse_rows] & humans[sparse_columns]
+            rows = np.concatenate((rows, sparse_rows[contacts]))
+            columns = np.concatenate((columns, sparse_columns[contacts]))
+        return rows, columns
+
+    def __uniforms(self, topology: ArrayTopology,
+                   nodes: np.ndarray) -> np.ndarray:
+        """
+        :returns a random number for each of some agents, drawn from the
+        stream of its kind (see Environment.getRandom())
+        :param topology: the environments topology
+        :param nodes: the nodes of the agents
+        """
+        kinds = topology.getKinds()[nodes]
+        values = np.empty(len(nodes), dtype=np.float64)
+        for kind in np.unique(kinds).tolist():
+            of_kind = kinds == kind
+            values[of_kind] = self._env.getRandom(
+                AgentKinds.getType(kind)).uniforms(int(of_kind.sum()))
+        return values
+
+    def __fightRounds(self, topology: ArrayTopology, attackers: np.ndarray,
+                      victims: np.ndarray) -> np.ndarray:
+        """
+        lets the zombies of a wave fight in rounds. A zombie fights once no
+        lower zombie sharing a human neighbor with it is left, against the
+        human neighbors not eaten by then.
+
+        :param topology: the environments topology
+        :param attackers: the zombie of each contact (see contacts())
+        :param victims: the human of each contact
+        :return: the victims which act within the current timestep, i.e. the
+        next wave
+        """
+        humans = AgentKinds.getMask(Rick, FriendOfRick, EnemyOfRick)
+        converted = [attackers[:0]]
+        while len(attackers) > 0:
+            # victims converted before are zombies by now
+            available = humans[topology.getKinds()[victims]]
+            attackers, victims = attackers[available], victims[available]
+            # the lowest zombie neighboring each human
+            targets, inverse = np.unique(victims, return_inverse=True)
+            lowest = np.full(len(targets), np.iinfo(np.int64).max)
+            np.minimum.at(lowest, inverse, attackers)
+            waiting = np.isin(attackers,
+                              attackers[lowest[inverse] < attackers])
+            converted.append(self.__fight(topology, attackers[~waiting],
+                                          victims[~waiting]))
+            attackers, victims = attackers[waiting], victims[waiting]
+        return np.sort(np.concatenate(converted))
+
+    def __fight(self, topology: ArrayTopology, attackers: np.ndarray,
+                victims: np.ndarray) -> np.ndarray:
+        """
+        killable zombies get killed with the configured chance by each of
+        their human neighbors. Surviving zombies attack their first human
+        neighbor. The zombies share no human neighbors (see fightRounds()).
+
+        :param topology: the environments topology
+        :param attackers: the zombie of each contact
+        :param victims: the human of each contact
+        :return: the victims which act within the current timestep
+        """
+        if len(attackers) == 0:
+            return attackers
+        zombies, first, contacts = np.unique(attackers, return_index=True,
+                                             return_counts=True)
+        killable = AgentKinds.getMask(KillableZombie, MovableKillableZombie)[
+            topology.getKinds()[zombies]]
+
+        config = self._env.getConfiguration()
+        survival = np.power(1 - config.chance_to_kill_zombie, contacts)
+        killed = killable & (self.__uniforms(topology, zombies) >= survival)
+        aggressiveness = self._env.getZombieAggressiveness()
+        infected = ~killed & (self.__uniforms(topology, zombies) <
+                              aggressiveness)
+
+        for zombie, victim in zip(zombies[killed].tolist(),
+                                  victims[first[killed]].tolist()):
+            if TRACER.enabled:
+                TRACER(KillableZombie.EVENT_KILLED, zombie, victim)
+            self._env.getAgent(zombie).kill()
+
+        winners = zombies[infected]
+        targets = victims[first[infected]]
+        if TRACER.enabled:
+            for zombie, victim in zip(winners.tolist(), targets.tolist()):
+                TRACER(Zombie.EVENT_WON, zombie, victim)
+        if len(targets) > 0:
+            self._env.setAgents(targets, ZombieFactory.getInstance(
+                aggressiveness, config.scenario))
+        return targets[targets > winners]
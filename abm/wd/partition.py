@@ -0,0 +1,634 @@
+import multiprocessing
+import traceback
+from threading import BrokenBarrierError
+
+import numpy as np
+
+from abm.agents import AgentKinds
+from abm.environment import EnvironmentOperable
+from abm.log import Logger
+from abm.shared import SharedArrays
+from abm.topology import ArrayTopology
+from abm.wd.agents import Rick, FriendOfRick, EnemyOfRick, Zombie, \
+    KillableZombie, MovableKillableZombie, ZombieFactory
+from settings import LOGGER, TELEMETRY
+
+
+class PartitionedStep(EnvironmentOperable):
+    """
+    performs a timestep like the BatchedStep (see kernel.py), but spreads
+    the zombies over worker processes. Used for a single world too slow to
+    step in one process (not for one too large for its memory, see below).
+
+    The nodes are split into contiguous ranges of equal size (partitions),
+    one per worker. The world (adjacency and cliques), the kinds and states
+    of the agents and the random links are kept in shared memory (see
+    abm.shared), so every worker reads the nodes bordering its partition
+    (ghost nodes) without copying them, while it only writes to its own
+    nodes.
+
+    The zombies act in waves, just like in the BatchedStep, and the workers
+    go through each wave together in rounds separated by barriers: moving
+    zombies propose new random links, which the workers owning either end
+    accept by the same rules as WalkingDeadEnv.moveLinks(). Zombies then
+    fight their human neighbors in rounds: a zombie sharing a human neighbor
+    with a lower zombie of the wave, on any partition, waits for it. The
+    lowest zombie of each human is collected in shared memory, from one
+    partition at a time for the humans of each partition. Victims on
+    another partition are handed to its worker, which converts them and
+    lets them act in the next wave. The zombies of a round act on the same
+    state, so the outcomes are drawn from the same distributions as in a
+    single process. The numbers
+    themselves differ, since each worker draws from a stream of its own
+    (seeded by the trial and the partition).
+
+    Rick and his friends are few and act in this process before the
+    zombies, on the environment itself. After the workers are done, the
+    conversions, kills and links of the timestep are applied to the
+    environment, so DataCollector and checks see the whole world as if it
+    had been stepped in one process. Zombie events are not traced.
+
+    This splits the work of a timestep, not the memory: this process keeps
+    the whole environment, the world is shared in full with every worker,
+    and every timestep the shared kinds, states and links are compared with
+    the environment's (O(N) per timestep). The world has to fit into the
+    memory of one machine twice, once in the environment and once in shared
+    memory.
+
+    :param partitions: the number of worker processes
+    """
+
+    # the commands handed to the workers
+    STEP, TRIAL, STOP = range(3)
+
+    # the arrays the workers only read
+    WORLD = ('nodes', 'bounds', 'indptr', 'indices', 'clique_ids',
+             'cliques', 'clique_starts')
+
+    def __init__(self, partitions: int, env=None):
+        super().__init__(env)
+        if partitions < 1:
+            raise Exception("A partitioned step needs at least one partition")
+        self.__partitions = partitions
+        self.__shared = None
+        self.__processes = []
+        self.__barrier = None
+        # the links as applied to the environment
+        self.__links = None
+
+    def isNodewise(self) -> bool:
+        return False
+
+    def __call__(self, node: int):
+        pass
+
+    def setEnvironment(self, env):
+        """
+        sets the environment. Workers of another environment are stopped.
+
+        :param env: the environment of the operable
+        """
+        if env is self._env:
+            return
+        self.close()
+        super().setEnvironment(env)
+
+    def getBounds(self) -> np.ndarray:
+        """
+        :returns the first node index of each partition and the size of the
+        index space (partitions + 1 values). None before the workers are
+        started.
+        """
+        return None if self.__shared is None else \
+            np.array(self.__shared['bounds'])
+
+    def startTrial(self, seed: int):
+        """
+        starts a trial: the workers take over the agents and links as they
+        are now and seed their random numbers. Starts the workers when
+        needed.
+
+        :param seed: the seed of the trial
+        """
+        self.__start()
+        topology = self._env.getBackend()
+        shared = self.__shared
+        shared['kinds'][:] = topology.getKinds()
+        shared['states'][:] = topology.getStates()
+        links = np.full(len(topology.getKinds()), -1, dtype=np.int64)
+        sources = list(self._env.getLinks().items())
+        if sources:
+            sources = np.array(sources, dtype=np.int64)
+            links[sources[:, 0]] = sources[:, 1]
+        shared['links'][:] = links
+        self.__links = links
+        shared['control'][:] = (PartitionedStep.TRIAL, seed)
+        self.__command()
+
+    def preProcess(self):
+        """
+        runs the timestep
+        """
+        if self.__shared is None:
+            raise Exception("A partitioned step has to be started by "
+                            "startTrial()")
+        topology = self._env.getBackend()
+        self.__swap(topology)
+        # rick and his friends may have swapped with any node. A zombie
+        # swapped onto a friend's node does not act (see BatchedStep).
+        kinds = topology.getKinds()
+        self.__shared['swapped'][:] = self.__shared['kinds'] != kinds
+        self.__shared['kinds'][:] = kinds
+        self.__shared['states'][:] = topology.getStates()
+        self.__shared['control'][0] = PartitionedStep.STEP
+        self.__command()
+        if TELEMETRY.enabled:
+            TELEMETRY.count(int(self.__shared['counts'][:, 4].sum()))
+        self.__synchronize(topology)
+
+    def close(self):
+        """
+        stops the workers and frees the shared memory
+        """
+        if self.__shared is None:
+            return
+        try:
+            self.__shared['control'][0] = PartitionedStep.STOP
+            self.__barrier.wait()
+        except BrokenBarrierError:
+            pass
+        for process in self.__processes:
+            process.join()
+        self.__processes = []
+        self.__shared.close()
+        self.__shared = None
+
+    def __start(self):
+        """
+        puts the world into shared memory and starts the workers
+        """
+        if self.__shared is not None:
+            return
+        topology = self._env.getBackend()
+        if not isinstance(topology, ArrayTopology):
+            raise Exception("Partitioned steps need an ArrayTopology")
+        size = len(topology.getKinds())
+        partitions = self.__partitions
+        # the world as it is now (no random links are set between trials)
+        rows, columns = topology.edgeArrays(cliques=False)
+        rows, columns = np.divmod(np.unique(rows * size + columns), size) \
+            if size > 0 else (rows, columns)
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+        nodes = topology.getNodeArray()
+        bounds = np.array([0] + [nodes[i * len(nodes) // partitions]
+                                 for i in range(1, partitions)] + [size],
+                          dtype=np.int64)
+        cliques = topology.getCliques()
+        sizes = [len(members) for members in cliques]
+
+        self.__shared = SharedArrays({
+            'nodes': nodes,
+            'bounds': bounds,
+            'indptr': indptr,
+            'indices': columns.astype(np.int64),
+            'clique_ids': topology.getCliqueIds(),
+            'cliques': np.concatenate([np.zeros(0, dtype=np.int64)] +
+                                      [m.astype(np.int64) for m in cliques]),
+            'clique_starts': np.concatenate(([0], np.cumsum(sizes))).astype(
+                np.int64),
+            'kinds': topology.getKinds(),
+            'states': topology.getStates(),
+            'links': np.full(size, -1, dtype=np.int64),
+            'moving': np.zeros(size, dtype=np.uint8),
+            # the nodes Rick and his friends swapped in the timestep
+            'swapped': np.zeros(size, dtype=np.uint8),
+            # the records of each round, partition p writes from
+            # bounds[p] on (its nodes never need more)
+            'moves': np.zeros((size, 3), dtype=np.int64),
+            'infections': np.zeros((size, 2), dtype=np.int64),
+            # the lowest zombie of a round neighboring each human, the size
+            # for none
+            'lowest': np.full(size, size, dtype=np.int64),
+            # moves, infections, zombies waiting for a further round, the
+            # next wave and the zombies acted in the timestep of each
+            # partition
+            'counts': np.zeros((partitions, 5), dtype=np.int64),
+            # the command and the seed of a trial
+            'control': np.zeros(2, dtype=np.uint64)},
+            readonly=PartitionedStep.WORLD)
+
+        config = self._env.getConfiguration()
+        aggressiveness = self._env.getZombieAggressiveness()
+        width = AgentKinds.count()
+        mask = lambda *types: AgentKinds.getMask(*types)[:width]
+        parameters = {
+            'zombies': mask(Zombie, KillableZombie, MovableKillableZombie),
+            'killable': mask(KillableZombie, MovableKillableZombie),
+            'moving': mask(MovableKillableZombie),
+            'humans': mask(Rick, FriendOfRick, EnemyOfRick),
+            'zombie': AgentKinds.getKind(type(ZombieFactory.getInstance(
+                aggressiveness, config.scenario))),
+            'aggressiveness': aggressiveness,
+            'chance_to_kill_zombie': config.chance_to_kill_zombie}
+
+        LOGGER("Starting %d partitions" % partitions, Logger.LEVEL_ITERATIONS)
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context(
+            'fork' if 'fork' in methods else None)
+        self.__barrier = context.Barrier(partitions + 1)
+        rounds = context.Barrier(partitions)
+        self.__processes = [context.Process(
+            target=_runPartition, daemon=True, args=(
+                self.__shared.getHandle(), partition, parameters,
+                self.__barrier, rounds)) for partition in range(partitions)]
+        for process in self.__processes:
+            process.start()
+
+    def __command(self):
+        """
+        lets the workers carry out the command in the control array and
+        waits until they are done
+        """
+        try:
+            self.__barrier.wait()
+            self.__barrier.wait()
+        except BrokenBarrierError:
+            self.__barrier.abort()
+            self.close()
+            raise Exception("A partition failed (see the output of its "
+                            "process)")
+
+    def __swap(self, topology: ArrayTopology):
+        """
+        lets Rick and his friends act (see BatchedStep)
+
+        :param topology: the environments topology
+        """
+        nodes = topology.getNodeArray()
+        moving = AgentKinds.getMask(Rick, FriendOfRick)
+        humans = nodes[moving[topology.getKinds()[nodes]]].tolist()
+        if TELEMETRY.enabled:
+            TELEMETRY.count(len(humans))
+        for node in humans:
+            self._env.getAgent(node).do()
+
+    def __synchronize(self, topology: ArrayTopology):
+        """
+        applies the conversions, kills and links of the workers to the
+        environment
+
+        :param topology: the environments topology
+        """
+        shared = self.__shared
+        converted = np.flatnonzero(shared['kinds'] != topology.getKinds())
+        if len(converted) > 0:
+            self._env.setAgents(converted, ZombieFactory.getInstance(
+                self._env.getZombieAggressiveness(),
+                self._env.getConfiguration().scenario))
+        dead = KillableZombie.STATE_DEAD
+        killed = np.flatnonzero((shared['states'] & dead != 0) &
+                                (topology.getStates() & dead == 0))
+        for zombie in killed.tolist():
+            self._env.getAgent(zombie).kill()
+        links = shared['links']
+        moved = np.flatnonzero(links != self.__links)
+        if len(moved) > 0:
+            self._env.setLinks(moved, links[moved])
+            self.__links[moved] = links[moved]
+
+
+def _runPartition(handle: dict, partition: int, parameters: dict, barrier,
+                  rounds):
+    """
+    runs the worker of a partition (in a worker process) until it is
+    stopped
+
+    :param handle: the handle of the shared arrays
+    :param partition: the index of the partition
+    :param parameters: the masks of agent kinds, the kind of new zombies,
+    the aggressiveness and the chance to kill a zombie
+    :param barrier: the barrier shared with the PartitionedStep
+    :param rounds: the barrier shared by the workers
+    """
+    shared = SharedArrays.attach(handle)
+    try:
+        worker = _Partition(shared, partition, parameters, rounds)
+        while True:
+            barrier.wait()
+            command, seed = shared['control'].tolist()
+            if command == PartitionedStep.STOP:
+                break
+            if command == PartitionedStep.TRIAL:
+                worker.startTrial(seed)
+            else:
+                worker.step()
+            barrier.wait()
+    except BrokenBarrierError:
+        barrier.abort()
+        rounds.abort()
+    except Exception:
+        traceback.print_exc()
+        barrier.abort()
+        rounds.abort()
+    finally:
+        worker = None
+        shared.close()
+
+
+class _Partition:
+    """
+    steps the zombies of a partition (see PartitionedStep)
+
+    :param shared: the shared arrays
+    :param partition: the index of the partition
+    :param parameters: see _runPartition()
+    :param rounds: the barrier shared by the workers
+    """
+
+    def __init__(self, shared: SharedArrays, partition: int,
+                 parameters: dict, rounds):
+        self.__shared = shared
+        self.__partition = partition
+        self.__bounds = shared['bounds'].tolist()
+        self.__first = self.__bounds[partition]
+        self.__last = self.__bounds[partition + 1]
+        self.__parameters = parameters
+        self.__rounds = rounds
+        self.__rng = None
+        size = len(shared['kinds'])
+        # the sorted row * size + column of the adjacency entries of the
+        # partition, for looking up edges
+        indptr = shared['indptr']
+        start, stop = indptr[self.__first], indptr[self.__last]
+        rows = np.repeat(np.arange(self.__first, self.__last),
+                         np.diff(indptr[self.__first:self.__last + 1]))
+        self.__keys = rows * size + shared['indices'][start:stop]
+
+    def startTrial(self, seed: int):
+        """
+        seeds the random numbers of a trial
+
+        :param seed: the seed of the trial
+        """
+        self.__rng = np.random.default_rng(
+            np.random.SeedSequence([int(seed), self.__partition]))
+
+    def step(self):
+        """
+        lets the zombies of the partition act, wave by wave
+        """
+        shared = self.__shared
+        kinds = shared['kinds']
+        own = np.arange(self.__first, self.__last)
+        wave = own[self.__parameters['zombies'][kinds[own]] &
+                   (shared['swapped'][own] == 0)]
+        shared['counts'][self.__partition, 4] = 0
+        while True:
+            shared['counts'][self.__partition, 4] += len(wave)
+            self.__move(wave)
+            attackers, victims = self.__contacts(wave)
+            wave = self.__fightRounds(attackers, victims)
+            shared['counts'][self.__partition, 3] = len(wave)
+            self.__rounds.wait()
+            if not shared['counts'][:, 3].any():
+                return
+
+    def __owns(self, nodes: np.ndarray) -> np.ndarray:
+        """
+        :returns whether each node belongs to the partition
+        :param nodes: the node indices
+        """
+        return (nodes >= self.__first) & (nodes < self.__last)
+
+    def __gather(self, name: str, column: int) -> np.ndarray:
+        """
+        :returns the records of a round of all partitions
+        :param name: the array of records
+        :param column: the column of the counts telling the number of
+        records of each partition
+        """
+        shared = self.__shared
+        counts = shared['counts'][:, column].tolist()
+        return np.concatenate([shared[name][start:start + count]
+                               for start, count in zip(self.__bounds, counts)])
+
+    def __move(self, wave: np.ndarray):
+        """
+        moving zombies move their random links (see BatchedStep). Each
+        partition proposes the moves of its zombies, then the moves are
+        accepted or dropped by the rules of ArrayTopology.newEdges().
+
+        :param wave: the zombies acting
+        """
+        shared = self.__shared
+        kinds, links, moving = shared['kinds'], shared['links'], \
+            shared['moving']
+        movers = wave[self.__parameters['moving'][kinds[wave]]]
+        nodes = shared['nodes']
+        targets = nodes[self.__rng.integers(len(nodes), size=len(movers))]
+        records = shared['moves'][self.__first:self.__first + len(movers)]
+        records[:, 0] = movers
+        records[:, 1] = targets
+        records[:, 2] = links[movers]
+        moving[movers] = 1
+        shared['counts'][self.__partition, 0] = len(movers)
+        self.__rounds.wait()
+
+        records = self.__gather('moves', 0)
+        sources, targets = records[:, 0], records[:, 1]
+        relevant = self.__owns(sources) | self.__owns(targets)
+        sources, targets = sources[relevant], targets[relevant]
+        new = self.__newEdges(sources, targets)
+        own = self.__owns(sources)
+        links[sources[own]] = np.where(new[own], targets[own], -1)
+        self.__rounds.wait()
+        moving[movers] = 0
+
+    def __newEdges(self, sources: np.ndarray,
+                   targets: np.ndarray) -> np.ndarray:
+        """
+        :returns whether each proposed link is a new edge. The links of the
+        zombies moving are gone already. Of links proposed in both
+        directions, the one of the lower node is kept.
+        :param sources: the zombies moving (sorted), one end of each of them
+        belongs to the partition
+        :param targets: the node each of them links to
+        """
+        shared = self.__shared
+        size = len(shared['kinds'])
+        if len(sources) == 0:
+            return np.zeros(0, dtype=bool)
+        # look up the edge from the end belonging to the partition
+        own = self.__owns(sources)
+        ends = np.where(own, sources, targets) * size + \
+            np.where(own, targets, sources)
+        keys = self.__keys
+        position = np.searchsorted(keys, ends).clip(max=max(len(keys) - 1,
+                                                                0))
+        existing = keys[position] == ends if len(keys) > 0 else \
+            np.zeros(len(ends), dtype=bool)
+        clique_ids = shared['clique_ids']
+        existing |= (clique_ids[sources] >= 0) & (sources != targets) & \
+            (clique_ids[sources] == clique_ids[targets])
+        links, moving = shared['links'], shared['moving']
+        existing |= (links[targets] == sources) & (moving[targets] == 0)
+        new = ~existing
+        low = np.minimum(sources, targets)
+        high = np.maximum(sources, targets)
+        _, first = np.unique((low * size + high)[new], return_index=True)
+        kept = np.zeros(len(sources), dtype=bool)
+        kept[np.flatnonzero(new)[first]] = True
+        return kept
+
+    def __contacts(self, wave: np.ndarray):
+        """
+        :returns all (zombie, human) pairs of neighbors where the zombie is
+        part of the wave and alive, the pairs of each zombie in neighbor
+        order (see BatchedStep)
+        :param wave: the zombies acting (sorted)
+        """
+        shared = self.__shared
+        kinds, states, links = shared['kinds'], shared['states'], \
+            shared['links']
+        acting = wave[states[wave] & KillableZombie.STATE_DEAD == 0]
+        indptr, indices = shared['indptr'], shared['indices']
+
+        starts, stops = indptr[acting], indptr[acting + 1]
+        lengths = stops - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        rows = [np.repeat(acting, lengths)]
+        columns = [indices[offsets + np.arange(lengths.sum())]]
+
+        # the other members of a clique neighbor each of them
+        clique_ids = shared['clique_ids']
+        cliques, clique_starts = shared['cliques'], shared['clique_starts']
+        for node in acting[clique_ids[acting] >= 0].tolist():
+            clique = clique_ids[node]
+            members = cliques[clique_starts[clique]:clique_starts[clique + 1]]
+            members = members[members != node]
+            rows.append(np.full(len(members), node, dtype=np.int64))
+            columns.append(members)
+
+        # random links from and to the zombies
+        out = links[acting]
+        rows.append(acting[out >= 0])
+        columns.append(out[out >= 0])
+        linked = np.flatnonzero(self.__owns(links))
+        mask = np.zeros(self.__last - self.__first, dtype=bool)
+        mask[acting - self.__first] = True
+        linked = linked[mask[links[linked] - self.__first]]
+        rows.append(links[linked])
+        columns.append(linked)
+
+        rows, columns = np.concatenate(rows), np.concatenate(columns)
+        humans = self.__parameters['humans'][kinds[columns]]
+        rows, columns = rows[humans], columns[humans]
+        order = np.argsort(rows, kind='stable')
+        return rows[order], columns[order]
+
+    def __fightRounds(self, attackers: np.ndarray, victims: np.ndarray):
+        """
+        lets the zombies of the wave fight in rounds (see BatchedStep), until
+        no zombie is left waiting on any partition
+
+        :param attackers: the zombie of each contact (sorted)
+        :param victims: the human of each contact
+        :return: the victims which act within the current timestep, i.e.
+        the next wave of the partition
+        """
+        shared = self.__shared
+        humans = self.__parameters['humans']
+        wave = []
+        while True:
+            # victims converted before are zombies by now
+            available = humans[shared['kinds'][victims]]
+            attackers, victims = attackers[available], victims[available]
+            waiting = self.__waiting(attackers, victims)
+            wave.append(self.__attack(*self.__fight(attackers[~waiting],
+                                                    victims[~waiting])))
+            attackers, victims = attackers[waiting], victims[waiting]
+            shared['counts'][self.__partition, 2] = len(attackers)
+            self.__rounds.wait()
+            if not shared['counts'][:, 2].any():
+                return np.sort(np.concatenate(wave))
+
+    def __waiting(self, attackers: np.ndarray,
+                  victims: np.ndarray) -> np.ndarray:
+        """
+        :returns whether the zombie of each contact shares a human neighbor
+        with a lower zombie of the round (on any partition)
+        :param attackers: the zombie of each contact (sorted)
+        :param victims: the human of each contact
+        """
+        lowest = self.__shared['lowest']
+        partitions = len(self.__bounds) - 1
+        owners = np.searchsorted(self.__bounds, victims, side='right') - 1
+        # one partition at a time writes to the humans of each partition
+        for step in range(partitions):
+            owner = (self.__partition + step) % partitions
+            owned = owners == owner
+            np.minimum.at(lowest, victims[owned], attackers[owned])
+            self.__rounds.wait()
+        waiting = np.isin(attackers,
+                          attackers[lowest[victims] < attackers])
+        self.__rounds.wait()
+        lowest[self.__first:self.__last] = len(lowest)
+        return waiting
+
+    def __fight(self, attackers: np.ndarray, victims: np.ndarray):
+        """
+        killable zombies get killed by their human neighbors (see
+        BatchedStep)
+
+        :param attackers: the zombie of each contact (sorted)
+        :param victims: the human of each contact
+        :return: the contacts of the zombies winning their fight (attackers
+        and victims)
+        """
+        shared = self.__shared
+        parameters = self.__parameters
+        zombies, contacts = np.unique(attackers, return_counts=True)
+        killable = parameters['killable'][shared['kinds'][zombies]]
+        survival = np.power(1 - parameters['chance_to_kill_zombie'],
+                            contacts)
+        killed = killable & (self.__rng.random(len(zombies)) >= survival)
+        infected = ~killed & (self.__rng.random(len(zombies)) <
+                              parameters['aggressiveness'])
+        shared['states'][zombies[killed]] |= KillableZombie.STATE_DEAD
+        won = np.repeat(infected, contacts)
+        return attackers[won], victims[won]
+
+    def __attack(self, attackers: np.ndarray, victims: np.ndarray):
+        """
+        the zombies winning their fight attack their first human neighbor.
+        The zombies of a round share no human neighbors, the attacks are
+        handed to the partitions of the victims, which convert them.
+
+        :param attackers: the zombie of each contact (sorted)
+        :param victims: the human of each contact
+        :return: the victims which act within the current timestep
+        """
+        shared = self.__shared
+        zombies, first = np.unique(attackers, return_index=True)
+        records = shared['infections'][
+            self.__first:self.__first + len(zombies)]
+        records[:, 0] = victims[first]
+        records[:, 1] = zombies
+        shared['counts'][self.__partition, 1] = len(zombies)
+        self.__rounds.wait()
+        return self.__convert()
+
+    def __convert(self) -> np.ndarray:
+        """
+        turns the victims of the partition attacked in a round into zombies
+
+        :return: the victims to act within the current timestep
+        """
+        shared = self.__shared
+        records = self.__gather('infections', 1)
+        records = records[self.__owns(records[:, 0])]
+        victims, attackers = records[:, 0], records[:, 1]
+        shared['kinds'][victims] = self.__parameters['zombie']
+        shared['states'][victims] = 0
+        return victims[victims > attackers]
@@ -1,52 +1,104 @@
 import matplotlib.pyplot as plt
+import numpy as np
 import seaborn as sns
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from pandas import DataFrame
 
 
 class Plotter:
     """
     plots statistics collected by a DataCollector object
+
+    Plots are drawn from a summary (see summarize()): the mean, min and max
+    population of each timestep rather than the data of every trial. Given a
+    path, a plot is rendered into a file without pyplot, so no display is
+    needed and no figures pile up when rendering many plots in one process.
     """
 
-    def plotData(self, dc):
+    def plotData(self, dc, path: str = None):
         """
         plots statistics of data collected by a DataCollector
 
         :param dc: the DataCollector
+        :param path: the file to render the plot to (e.g. 'plot.png'). By
+        default, the plot is shown.
+        """
+        self.plotSummary(Plotter.summarize(
+            {entity: dc.getData(entity) for entity in dc.ENTITIES}), path)
+
+    @staticmethod
+    def summarize(data: dict) -> dict:
+        """
+        reduces collected data to what is plotted
+
+        :param data: the data of each entity (trials x timesteps, see
+        DataCollector.getData()). Timesteps which are NaN are left out.
+        :return: the mean, min and max population of zombies and humans of
+        each timestep ('zombies', 'humans') and the mean time rick survived
+        ('ricks_death')
         """
-        rick = dc.getDataFrame('rick')
-        friends = dc.getDataFrame('friends')
-        enemies = dc.getDataFrame('enemies')
-        zombies = dc.getDataFrame('zombies')
-        humans = friends + enemies + rick
+        rick = np.asarray(data['rick'])
+        humans = rick + data['friends'] + data['enemies']
+        zombies = np.asarray(data['zombies'])
+        band = lambda population: (np.nanmean(population, axis=0),
+                                   np.nanmin(population, axis=0),
+                                   np.nanmax(population, axis=0))
+        return {'zombies': band(zombies), 'humans': band(humans),
+                'ricks_death': float(np.nanmean(np.nansum(rick, axis=1)))}
 
-        timesteps = len(rick.iloc[0])
+    def plotSummary(self, summary: dict, path: str = None,
+                    title: str = "The Walking Dead"):
+        """
+        plots a summary (see summarize())
+
+        :param summary: the summary
+        :param path: the file to render the plot to. By default, the plot is
+        shown.
+        :param title: the title of the plot
+        """
+        with sns.plotting_context('talk'):
+            if path is None:
+                self.__draw(plt.gca(), summary, title)
+                plt.show()
+                return
+            figure = Figure()
+            FigureCanvasAgg(figure)
+            self.__draw(figure.add_subplot(1, 1, 1), summary, title)
+            figure.savefig(path, bbox_inches='tight')
 
-        ricks_death = rick.sum(1)
-        ricks_death_mean = ricks_death.mean()
-        # ricks_death_min = ricks_death.min()
-        # ricks_death_max = ricks_death.max()
+    def __draw(self, axes, summary: dict, title: str):
+        """
+        draws a summary
+
+        :param axes: the matplotlib Axes to draw on
+        :param summary: the summary (see summarize())
+        :param title: the title of the plot
+        """
+        zombies_mean, zombies_min, zombies_max = summary['zombies']
+        humans_mean, humans_min, humans_max = summary['humans']
+        ricks_death_mean = summary['ricks_death']
+        timesteps = len(zombies_mean)
+        time = np.arange(timesteps)
 
-        sns.set_context('talk')
-        plt.plot(zombies.mean(), color='r')
-        plt.fill_between(zombies.columns, zombies.max(), zombies.min(),
-                         color='r', alpha=.33)
+        zombies, = axes.plot(time, zombies_mean, color='r')
+        axes.fill_between(time, zombies_max, zombies_min, color='r',
+                          alpha=.33)
 
-        plt.plot(humans.mean(), color='g')
-        plt.fill_between(humans.columns, humans.max(), humans.min(), color='g',
-                         alpha=.33)
+        humans, = axes.plot(time, humans_mean, color='g')
+        axes.fill_between(time, humans_max, humans_min, color='g', alpha=.33)
 
-        ymax = self.ylim(zombies, humans)
-        plt.plot((ricks_death_mean, ricks_death_mean), (0, ymax), color='b')
-        # plt.fill_between([ricks_death_min, ricks_death_max], [0, 0], [ymax,
-        #  ymax], color='b', alpha=.33)
+        ymax = self.ylim(zombies_max, humans_max)
+        rick, = axes.plot((ricks_death_mean, ricks_death_mean), (0, ymax),
+                          color='b')
 
-        plt.title("The Walking Dead")
-        plt.legend(['Zombies', 'Humans', 'Rick\'s death'], loc=7, frameon=True)
-        plt.xlim(xmax=timesteps)
-        plt.ylabel('Population')
-        plt.xlabel('Simulation time')
-        plt.show()
+        axes.set_title(title)
+        axes.legend([zombies, humans, rick],
+                    ['Zombies', 'Humans', 'Rick\'s death'], loc=7,
+                    frameon=True)
+        axes.set_xlim(right=timesteps)
+        axes.set_ylabel('Population')
+        axes.set_xlabel('Simulation time')
 
     @staticmethod
     def ylim(zombies: DataFrame, humans: DataFrame) -> int:
@@ -54,10 +106,10 @@ class Plotter:
         finds the limit for the y-axis of the plot, i.e. the max population
         of either zombies or humans throughout the whole simulation
 
-        :param zombies:
-        :param humans:
+        :param zombies: the zombie populations (DataFrame or array)
+        :param humans: the human populations (DataFrame or array)
         :return:
         """
-        max_zombies = zombies.max().max()
-        max_humans = humans.max().max()
+        max_zombies = np.nanmax(np.asarray(zombies))
+        max_humans = np.nanmax(np.asarray(humans))
         return max(max_zombies, max_humans)
@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+
+
+class ResultsFile:
+    """
+    an append-only file of the counts collected by a DataCollector.
+
+    Each timestep is appended as a fixed size record (trial, time and the
+    count of each entity, little endian 64 bit integers) and written to
+    disk right away. A run which is interrupted therefore leaves all
+    timesteps collected so far, a partly written last record is ignored.
+    Reading maps the file into memory instead of loading it and goes
+    through the records a chunk at a time.
+
+    :param path: the file to read or write
+    :param entities: the names of the counts of each record
+    :param append: append to an existing file instead of replacing it when
+    writing the first record
+    """
+
+    # the records read at once (see getChunks())
+    CHUNK = 1 << 16
+
+    def __init__(self, path: str, entities: tuple, append: bool = False):
+        self.__path = path
+        self.__append = append
+        self.__record = np.dtype([('trial', '<i8'), ('time', '<i8')] +
+                                 [(entity, '<i8') for entity in entities])
+        self.__file = None
+
+    def append(self, trial: int, time: int, counts):
+        """
+        appends the counts of a timestep
+
+        :param trial: the trial
+        :param time: the timestep
+        :param counts: the count of each entity
+        """
+        self.extend([trial], [time], [counts])
+
+    def extend(self, trials, times, counts):
+        """
+        appends the counts of many timesteps at once
+
+        :param trials: the trial of each timestep
+        :param times: the time of each timestep
+        :param counts: the counts of each timestep (timesteps x entities)
+        """
+        records = np.zeros(len(trials), dtype=self.__record)
+        records['trial'] = trials
+        records['time'] = times
+        counts = np.asarray(counts, dtype=np.int64).reshape(len(trials), -1)
+        for i, entity in enumerate(self.__record.names[2:]):
+            records[entity] = counts[:, i]
+        if self.__file is None:
+            self.__file = open(self.__path, 'ab' if self.__append else 'wb',
+                               buffering=0)
+            self.__append = True
+        self.__file.write(records.tobytes())
+
+    def close(self):
+        """
+        closes the file. Appending opens it again.
+        """
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def getRecords(self) -> np.ndarray:
+        """
+        :returns all complete records, memory mapped (read only)
+        """
+        if not os.path.exists(self.__path):
+            return np.zeros(0, dtype=self.__record)
+        count = os.path.getsize(self.__path) // self.__record.itemsize
+        if count == 0:
+            return np.zeros(0, dtype=self.__record)
+        return np.memmap(self.__path, dtype=self.__record, mode='r',
+                         shape=(count,))
+
+    def getChunks(self):
+        """
+        :returns an iterator over all complete records in the order they were
+        written, CHUNK records (memory mapped) at a time
+        """
+        records = self.getRecords()
+        for start in range(0, len(records), ResultsFile.CHUNK):
+            yield records[start:start + ResultsFile.CHUNK]
+
+    def getData(self, entity: str) -> np.ndarray:
+        """
+        :returns the counts of an entity (trials x timesteps). Records
+        written later replace earlier ones of the same trial and time.
+        Timesteps which were never written (e.g. of an interrupted trial)
+        are NaN, so the result is a float array in that case.
+        :param entity: the entity
+        """
+        trials, times = -1, -1
+        for chunk in self.getChunks():
+            trials = max(trials, int(chunk['trial'].max()))
+            times = max(times, int(chunk['time'].max()))
+        # counts are never negative, so -1 marks timesteps never written
+        data = np.full((trials + 1, times + 1), -1, dtype=np.int64)
+        for chunk in self.getChunks():
+            keys = chunk['trial'] * (times + 1) + chunk['time']
+            # the last record of each trial and time in the chunk, later
+            # chunks overwrite earlier ones
+            _, last = np.unique(keys[::-1], return_index=True)
+            last = len(keys) - 1 - last
+            data[chunk['trial'][last], chunk['time'][last]] = \
+                chunk[entity][last]
+        missing = data < 0
+        if not missing.any():
+            return data
+        data = data.astype(float)
+        data[missing] = np.nan
+        return data
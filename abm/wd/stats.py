@@ -1,20 +1,122 @@
+from statistics import NormalDist
+
+import numpy as np
 import pandas as pd
 
 from abm.environment import EnvironmentOperable
+from abm.listeners import EnvironmentListener
 from abm.wd.agents import *
+from abm.wd.results import ResultsFile
+from settings import SIMULATION_CONFIDENCE
 
 
-class DataCollector(EnvironmentOperable):
+class DataCollector(EnvironmentOperable, EnvironmentListener):
     """
     collects data throughout the simulation. This data is used for statistics
     to be plotted.
+
+    The collector counts the agents once when it gets to know an
+    environment. From then on, it listens to the environment (see
+    abm.listeners) and keeps the counts up to date as agents are converted,
+    killed or moved. Collecting a timestep therefore does not need to visit
+    any node. The counts are stored in a preallocated array (entities x
+    trials x timesteps) which grows when needed.
+
+    Given a path, the counts of each timestep are appended to a ResultsFile
+    (see results.py) instead, so they are on disk as the run goes and
+    memory does not grow with the number of timesteps. The data is then
+    read from the file. fromFile() reads the file of an earlier (or
+    interrupted) run.
+
+    :param trials: the number of trials to preallocate
+    :param timesteps: the number of timesteps per trial to preallocate
+    :param path: the file to write the counts to
     """
 
-    def __init__(self):
+    ENTITIES = ('rick', 'friends', 'enemies', 'zombies')
+    RICK, FRIENDS, ENEMIES, ZOMBIES = range(4)
+    # the quantities with confidence intervals (see getIntervalWidths())
+    STATISTICS = ('zombies', 'humans', 'ricks_death')
+
+    def __init__(self, trials: int = 1, timesteps: int = 1,
+                 path: str = None):
         super().__init__()
         self.__trial = 0
         self.__time = 0
-        self.__data = {'rick': [], 'friends': [], 'enemies': [], 'zombies': []}
+        self.__trials = 0
+        self.__timesteps = 0
+        self.__file = None
+        self.__data = None
+        if path is None:
+            self.__data = np.zeros((len(DataCollector.ENTITIES),
+                                    max(trials, 1), max(timesteps, 1)),
+                                   dtype=np.int64)
+        else:
+            self.__file = ResultsFile(path, DataCollector.ENTITIES)
+        self.__counts = np.zeros(len(DataCollector.ENTITIES), dtype=np.int64)
+        self.__last = self.__counts.copy()
+
+    @staticmethod
+    def fromFile(path: str):
+        """
+        :returns a DataCollector reading the data written to a file
+        :param path: the file written by a DataCollector
+        """
+        dc = DataCollector()
+        dc.__file = ResultsFile(path, DataCollector.ENTITIES, append=True)
+        dc.__data = None
+        dc.__trials = len(dc.getData(DataCollector.ENTITIES[0]))
+        return dc
+
+    @staticmethod
+    def fromArray(data: np.ndarray):
+        """
+        :returns a DataCollector collecting into a given array, e.g. one in
+        shared memory (see abm.shared). The array is never replaced, so it
+        has to hold all trials and timesteps collected.
+        :param data: the array (entities x trials x timesteps, int64)
+        """
+        if data.shape[0] != len(DataCollector.ENTITIES) or \
+                data.dtype != np.int64:
+            raise Exception("The array does not fit the collected data")
+        dc = DataCollector()
+        dc.__data = data
+        return dc
+
+    def close(self):
+        """
+        closes the file the counts are written to (if any) and stops
+        listening to the environment, so environments running many
+        simulations do not collect listeners
+        """
+        if self.__file is not None:
+            self.__file.close()
+        if self._env is not None:
+            self._env.removeListener(self)
+            self._env = None
+
+    def isNodewise(self) -> bool:
+        return False
+
+    def setEnvironment(self, env):
+        """
+        starts listening to a new environment and counts its agents
+
+        :param env: the environment of the operable
+        """
+        if env is self._env:
+            return
+        if self._env is not None:
+            self._env.removeListener(self)
+        super().setEnvironment(env)
+        env.addListener(self)
+
+        topology = env.getBackend()
+        self.__counts[:] = 0
+        for node in topology.nodes():
+            agent_type = topology.getAgentType(node)
+            if agent_type is not type(None):
+                self.__count(agent_type, topology.getState(node), 1)
 
     def setTrial(self, trial: int):
         """
@@ -23,12 +125,86 @@ class DataCollector(EnvironmentOperable):
 
         :param trial: the trial to set the collector to
         """
-        self.__data['rick'].append([])
-        self.__data['friends'].append([])
-        self.__data['enemies'].append([])
-        self.__data['zombies'].append([])
+        if self.__data is not None:
+            self.__reserve(trial + 1, self.__timesteps)
+            self.__data[:, trial, :] = 0
+        self.__trials = max(self.__trials, trial + 1)
         self.__trial = trial
 
+    def getTrial(self, trial: int) -> dict:
+        """
+        :returns the data collected in a trial, a list of counts per timestep
+        for each entity
+        :param trial: the trial
+        """
+        return {key: self.getData(key)[trial].tolist()
+                for key in DataCollector.ENTITIES}
+
+    def addTrial(self, data: dict):
+        """
+        appends the data of a trial collected elsewhere (e.g. by another
+        process). The collector is set to the new trial.
+
+        :param data: the data as returned by getTrial()
+        """
+        self.setTrial(self.__trials)
+        timesteps = len(data['rick'])
+        if self.__file is not None:
+            self.__file.extend([self.__trial] * timesteps, range(timesteps),
+                               np.transpose([data[key] for key in
+                                             DataCollector.ENTITIES]))
+        else:
+            self.__reserve(self.__trials, timesteps)
+            for i, key in enumerate(DataCollector.ENTITIES):
+                self.__data[i, self.__trial, :timesteps] = data[key]
+        self.__timesteps = max(self.__timesteps, timesteps)
+
+    def restore(self, data: dict, trial: int, time: int):
+        """
+        puts back data collected before (e.g. read from a checkpoint) and
+        sets the collector to a trial and timestep, so collecting goes on
+        from there.
+
+        :param data: the data of each entity as array (trials x timesteps)
+        holding at least the trials before and the timesteps of the trial
+        before the given timestep
+        :param trial: the trial to go on with
+        :param time: the timestep to go on with
+        """
+        for i in range(trial):
+            self.addTrial({key: data[key][i] for key in data})
+        self.setTrial(trial)
+        if time == 0:
+            return
+        counts = np.transpose([data[key][trial, :time]
+                               for key in DataCollector.ENTITIES])
+        if self.__file is not None:
+            self.__file.extend([trial] * time, range(time), counts)
+        else:
+            self.__reserve(self.__trials, time)
+            self.__data[:, trial, :time] = counts.T
+        self.__timesteps = max(self.__timesteps, time)
+        self.__time = time
+        self.__last = counts[-1].copy()
+
+    def getTrials(self) -> int:
+        """
+        :returns the number of trials collected
+        """
+        return self.__trials
+
+    def getCurrentTrial(self) -> int:
+        """
+        :returns the trial the collector is set to
+        """
+        return self.__trial
+
+    def getTime(self) -> int:
+        """
+        :returns the timestep collected next
+        """
+        return self.__time
+
     def resetTime(self):
         """
         resets the time
@@ -37,36 +213,61 @@ class DataCollector(EnvironmentOperable):
 
     def __call__(self, node: int):
         """
-        overrides EnvironmentOperable.__call__(). Whenever the DataCollector
-        is called, it checks the type of agent placed on the current node and
-        increments the respective counter within a trial and timestep
-
-        :param node: the index of the node the DataCollector should evaluate
-        """
-        agent = self._env.getAgent(node)
-        if type(agent) == Rick:
-            self.__data['rick'][self.__trial][self.__time] = 1
-        elif type(agent) == FriendOfRick:
-            self.__data['friends'][self.__trial][self.__time] += 1
-        elif type(agent) == EnemyOfRick:
-            self.__data['enemies'][self.__trial][self.__time] += 1
-        elif issubclass(agent.__class__, Zombie):
-            if type(agent) == Zombie or \
-                    (type(agent) == KillableZombie and agent.isAlive()) or \
-                    (type(agent) == MovableKillableZombie and agent.isAlive()):
-                self.__data['zombies'][self.__trial][self.__time] += 1
+        overrides EnvironmentOperable.__call__(). There is nothing to do per
+        node since the counts are kept up to date by listening to the
+        environment.
+
+        :param node: the index of the node
+        """
+        pass
+
+    def isSettled(self) -> bool:
+        """
+        :returns whether the counts cannot change any more: only zombies turn
+        humans into zombies and only humans kill zombies, so once there are
+        no humans or no (living) zombies left, everything stays as it is
+        """
+        counts = self.__counts
+        return counts[DataCollector.ZOMBIES] == 0 or (
+            counts[DataCollector.RICK] == 0 and
+            counts[DataCollector.FRIENDS] == 0 and
+            counts[DataCollector.ENEMIES] == 0)
+
+    def fillTrial(self, timesteps: int):
+        """
+        stores the counts of the timestep collected last as each timestep
+        left of the current trial, e.g. after the trial stopped early since
+        it has settled
+
+        :param timesteps: the number of timesteps of the trial
+        """
+        if self.__time >= timesteps:
+            return
+        times = range(self.__time, timesteps)
+        counts = self.__last
+        if self.__file is not None:
+            self.__file.extend([self.__trial] * len(times), times,
+                               np.tile(counts, (len(times), 1)))
         else:
-            raise Exception("Unknown agent")
+            self.__reserve(self.__trials, timesteps)
+            self.__data[:, self.__trial, self.__time:timesteps] = \
+                counts[:, np.newaxis]
+        self.__timesteps = max(self.__timesteps, timesteps)
+        self.__time = timesteps
 
     def preProcess(self):
         """
-        appends a new timestep to the datastructure
-        initially, all counters of the new timestep are set to 0
+        stores the current counts as new timestep
         """
-        self.__data['rick'][self.__trial].append(0)
-        self.__data['friends'][self.__trial].append(0)
-        self.__data['enemies'][self.__trial].append(0)
-        self.__data['zombies'][self.__trial].append(0)
+        counts = self.__counts.copy()
+        counts[DataCollector.RICK] = min(counts[DataCollector.RICK], 1)
+        self.__last = counts
+        if self.__file is not None:
+            self.__file.append(self.__trial, self.__time, counts)
+        else:
+            self.__reserve(self.__trials, self.__time + 1)
+            self.__data[:, self.__trial, self.__time] = counts
+        self.__timesteps = max(self.__timesteps, self.__time + 1)
 
     def postProcess(self):
         """
@@ -74,11 +275,116 @@ class DataCollector(EnvironmentOperable):
         """
         self.__time += 1
 
+    def beforeSetAgent(self, index: int, agent):
+        topology = self._env.getBackend()
+        old = topology.getAgentType(index)
+        if old is not type(None):
+            self.__count(old, topology.getState(index), -1)
+        self.__count(type(agent), agent.getState(), 1)
+
+    def beforeSetState(self, index: int, state: int):
+        topology = self._env.getBackend()
+        agent_type = topology.getAgentType(index)
+        self.__count(agent_type, topology.getState(index), -1)
+        self.__count(agent_type, state, 1)
+
+    def __count(self, agent_type, state: int, change: int):
+        """
+        changes the counter of the entity an agent belongs to
+
+        :param agent_type: the class of the agent
+        :param state: the state of the agent
+        :param change: the change of the counter
+        """
+        if agent_type == Rick:
+            self.__counts[DataCollector.RICK] += change
+        elif agent_type == FriendOfRick:
+            self.__counts[DataCollector.FRIENDS] += change
+        elif agent_type == EnemyOfRick:
+            self.__counts[DataCollector.ENEMIES] += change
+        elif issubclass(agent_type, Zombie):
+            if agent_type == Zombie or \
+                    (agent_type in (KillableZombie, MovableKillableZombie) and
+                     not state & KillableZombie.STATE_DEAD):
+                self.__counts[DataCollector.ZOMBIES] += change
+        else:
+            raise Exception("Unknown agent")
+
+    def __reserve(self, trials: int, timesteps: int):
+        """
+        grows the data array (at least doubling it) when it is too small
+
+        :param trials: the number of trials needed
+        :param timesteps: the number of timesteps needed
+        """
+        _, capacity_trials, capacity_timesteps = self.__data.shape
+        if trials <= capacity_trials and timesteps <= capacity_timesteps:
+            return
+        if trials > capacity_trials:
+            capacity_trials = max(trials, 2 * capacity_trials)
+        if timesteps > capacity_timesteps:
+            capacity_timesteps = max(timesteps, 2 * capacity_timesteps)
+        data = np.zeros((len(DataCollector.ENTITIES), capacity_trials,
+                         capacity_timesteps), dtype=np.int64)
+        _, t, s = self.__data.shape
+        data[:, :t, :s] = self.__data
+        self.__data = data
+
+    def isPrecise(self, precision,
+                  confidence: float = SIMULATION_CONFIDENCE) -> bool:
+        """
+        :returns whether the confidence intervals of the quantities plotted
+        are no wider than a precision
+        :param precision: the widest interval of all quantities, or a dict
+        of the widest interval of each quantity (see STATISTICS). Quantities
+        left out are not checked.
+        :param confidence: the confidence level
+        """
+        if not isinstance(precision, dict):
+            precision = dict.fromkeys(DataCollector.STATISTICS, precision)
+        widths = DataCollector.getIntervalWidths(
+            {entity: self.getData(entity) for entity in DataCollector.ENTITIES},
+            confidence)
+        return all(float(np.max(widths[statistic], initial=0)) <= width
+                   for statistic, width in precision.items())
+
+    @staticmethod
+    def getIntervalWidths(data: dict,
+                          confidence: float = SIMULATION_CONFIDENCE) -> dict:
+        """
+        computes the width of the confidence intervals of the quantities
+        plotted (see Plotter.summarize()). The intervals are those of the
+        normal approximation, fewer than two trials give infinite widths.
+
+        :param data: the data of each entity (trials x timesteps, see
+        getData()). Timesteps which are NaN are left out.
+        :param confidence: the confidence level
+        :return: the width of the interval of the mean population of zombies
+        and humans of each timestep ('zombies', 'humans') and of the mean
+        time rick survived ('ricks_death')
+        """
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+
+        def width(samples: np.ndarray) -> np.ndarray:
+            samples = np.asarray(samples, dtype=np.float64)
+            known = ~np.isnan(samples)
+            n = known.sum(axis=0)
+            mean = np.where(known, samples, 0).sum(axis=0) / np.maximum(n, 1)
+            squares = np.where(known, samples - mean, 0) ** 2
+            variance = squares.sum(axis=0) / np.maximum(n - 1, 1)
+            return np.where(n > 1, 2 * z * np.sqrt(variance / np.maximum(
+                n, 1)), np.inf)
+
+        rick = np.asarray(data['rick'])
+        humans = rick + data['friends'] + data['enemies']
+        return {'zombies': width(data['zombies']), 'humans': width(humans),
+                'ricks_death': float(width(np.nansum(rick, axis=1)))}
+
     def dump(self):
         """
         prints the collected data
         """
-        for key in self.__data.keys():
+        for key in DataCollector.ENTITIES:
             print()
             print("----- %s -----" % key)
             print(self.getDataFrame(key))
@@ -89,6 +395,19 @@ class DataCollector(EnvironmentOperable):
         :param entity: the entity whose data should be converted
         :return: a pandas.DataFrame containing the collected data
         """
-        index = ["Trial %03d" % (i + 1) for i in range(
-            len(self.__data[entity]))]
-        return pd.DataFrame(self.__data[entity], index=index)
+        data = self.getData(entity)
+        index = ["Trial %03d" % (i + 1) for i in range(len(data))]
+        return pd.DataFrame(data.copy(), index=index)
+
+    def getData(self, entity: str) -> np.ndarray:
+        """
+        :returns the collected data of an entity as array (trials x
+        timesteps). This is a view, copy it before collecting more data.
+        When reading from a file, timesteps not written are NaN (see
+        ResultsFile.getData()).
+        :param entity: the entity
+        """
+        if self.__file is not None:
+            return self.__file.getData(entity)
+        return self.__data[DataCollector.ENTITIES.index(entity),
+                           :self.__trials, :self.__timesteps]
@@ -0,0 +1,244 @@
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from random import getrandbits
+
+import numpy as np
+import pandas as pd
+
+from abm.log import Logger
+from abm.topology import GraphTopology
+from abm.wd.cache import TopologyCache
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+from abm.wd.plot import Plotter
+from abm.wd.results import ResultsFile
+from abm.wd.stats import DataCollector
+from settings import LOGGER
+
+
+class Sweep:
+    """
+    runs the walking dead simulation for each point of a parameter grid.
+
+    Each point gets its own Configuration (and environment), so no globals
+    are touched and the points are run by a pool of processes. The results
+    of all points are written to one .npz file: a column per parameter
+    (param_<name>, one value per point) and an array per entity
+    (data_<entity>, points x trials x timesteps).
+
+    While sweeping, the results of each point are appended to a ResultsFile
+    (see results.py) next to the .npz file as soon as the point is done
+    (see POINTS), so they are neither kept in memory nor lost when the sweep
+    is interrupted. Running the sweep again (with the same seed) only runs
+    the points missing. The file is removed once the .npz file is written.
+
+    All worlds are generated from the seed of the sweep, so points of the
+    same sizes and offsets run on the same world. Given a cache directory
+    (see TopologyCache), each world is generated once and the workers map
+    it into memory.
+
+        sweep = Sweep({'zombie_aggressiveness': [0.2, 0.5, 0.8],
+                       'zombies': [200, 400]})
+        sweep.run('sweep.npz', SIMULATION_TIMESTEPS, SIMULATION_TRIALS)
+        parameters, data = Sweep.load('sweep.npz')
+
+    :param grid: the values of each parameter to sweep (see
+    Configuration.PARAMETERS)
+    :param config: the Configuration holding the parameters not swept
+    (settings.py by default)
+    """
+
+    # appended to the path of the .npz file for the results of the points
+    # done so far
+    POINTS = '.points'
+
+    def __init__(self, grid: dict, config: Configuration = None):
+        self.__grid = grid
+        self.__config = config or Configuration()
+        unknown = set(grid) - set(Configuration.PARAMETERS)
+        if unknown:
+            raise Exception("Unknown parameters: %s" % ", ".join(sorted(
+                unknown)))
+
+    def getPoints(self) -> list:
+        """
+        :returns the Configuration of each point of the grid
+        """
+        names = list(self.__grid)
+        return [self.__config.replace(**dict(zip(names, values)))
+                for values in itertools.product(*self.__grid.values())]
+
+    def run(self, path: str, time: int, trials: int,
+            topology_type=GraphTopology, batched: bool = False,
+            workers: int = None, seed: int = None, cache: str = None):
+        """
+        runs the simulation for each point and writes the results
+
+        :param path: the .npz file to write
+        :param time: the time each simulation should run
+        :param trials: the trials per point
+        :param topology_type: the topology backend (see abm.topology)
+        :param batched: run each timestep as array operations
+        :param workers: the number of processes running points in parallel.
+        None uses all cores.
+        :param seed: the seed of the sweep. By default, it is drawn from the
+        random module.
+        :param cache: the directory of a TopologyCache to load the worlds
+        from (needs an ArrayTopology)
+        """
+        if seed is None:
+            seed = getrandbits(64)
+        if workers is None:
+            workers = os.cpu_count()
+        points = self.getPoints()
+        # point i holds the trials i * trials to (i + 1) * trials - 1
+        results = ResultsFile(path + Sweep.POINTS, DataCollector.ENTITIES,
+                              append=True)
+        done = Sweep.__getPointsDone(results, trials, time)
+        if not done:
+            # nothing to go on with, e.g. the file of another sweep
+            results = ResultsFile(path + Sweep.POINTS,
+                                  DataCollector.ENTITIES)
+        tasks = {i: (point.getParameters(), topology_type, time, trials,
+                     batched, Sweep.getPointSeed(seed, i), seed, cache)
+                 for i, point in enumerate(points) if i not in done}
+
+        LOGGER("Sweeping %d points on %d workers (%d done before)" % (
+            len(points), workers, len(done)), Logger.LEVEL_ITERATIONS)
+        if workers == 1:
+            for i, task in tasks.items():
+                Sweep.__writePoint(results, i, _runPoint(task))
+        else:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                'fork' if 'fork' in methods else None)
+            with ProcessPoolExecutor(workers, mp_context=context) as pool:
+                futures = {pool.submit(_runPoint, task): i
+                           for i, task in tasks.items()}
+                for future in as_completed(futures):
+                    Sweep.__writePoint(results, futures[future],
+                                       future.result())
+        results.close()
+
+        columns = {'param_' + name: np.array([point.getParameters()[name]
+                                              for point in points])
+                   for name in Configuration.PARAMETERS}
+        for entity in DataCollector.ENTITIES:
+            columns['data_' + entity] = results.getData(entity)[
+                :len(points) * trials].reshape(len(points), trials, time + 1)
+        # write to a temporary file first so a crash never leaves a broken
+        # results file behind
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, **columns)
+        os.replace(path + '.tmp', path)
+        if os.path.exists(path + Sweep.POINTS):
+            os.remove(path + Sweep.POINTS)
+
+    @staticmethod
+    def __writePoint(results: ResultsFile, point: int, data: np.ndarray):
+        """
+        appends the results of a point (in a single write)
+
+        :param results: the ResultsFile of the sweep
+        :param point: the index of the point
+        :param data: the collected data (entities x trials x timesteps)
+        """
+        _, trials, timesteps = data.shape
+        results.extend(np.repeat(np.arange(trials) + point * trials,
+                                 timesteps),
+                       np.tile(np.arange(timesteps), trials),
+                       data.reshape(len(data), -1).T)
+
+    @staticmethod
+    def __getPointsDone(results: ResultsFile, trials: int, time: int) -> set:
+        """
+        :returns the points whose results were written completely by an
+        earlier (interrupted) run
+        :param results: the ResultsFile of the sweep
+        :param trials: the trials per point
+        :param time: the time each simulation runs
+        """
+        data = results.getData(DataCollector.ENTITIES[0])
+        if data.shape[1] != time + 1:
+            return set()
+        complete = ~np.isnan(data).any(axis=1) if data.dtype.kind == 'f' \
+            else np.ones(len(data), dtype=bool)
+        points = len(data) // trials
+        return {point for point in range(points)
+                if complete[point * trials:(point + 1) * trials].all()}
+
+    @staticmethod
+    def getPointSeed(seed: int, point: int) -> int:
+        """
+        :returns the seed of a point
+        :param seed: the seed of the sweep
+        :param point: the index of the point
+        """
+        sequence = np.random.SeedSequence([seed, point])
+        return int(sequence.generate_state(1, np.uint64)[0])
+
+    @staticmethod
+    def load(path: str):
+        """
+        reads the results of a sweep
+
+        :param path: the .npz file written by run()
+        :return: a pandas.DataFrame of the parameters (one row per point)
+        and a dict holding the data of each entity (points x trials x
+        timesteps)
+        """
+        with np.load(path) as f:
+            parameters = pd.DataFrame({
+                name: f['param_' + name] for name in Configuration.PARAMETERS})
+            data = {entity: f['data_' + entity]
+                    for entity in DataCollector.ENTITIES}
+        return parameters, data
+
+    @staticmethod
+    def plot(path: str, directory: str, extension: str = 'png') -> list:
+        """
+        renders a plot of each point of a sweep into files (see
+        Plotter.plotSummary())
+
+        :param path: the .npz file written by run()
+        :param directory: the directory to write the plots to
+        :param extension: the file type of the plots
+        :return: the files written, one per point
+        """
+        parameters, data = Sweep.load(path)
+        # the title names the parameters that were swept
+        swept = [name for name in parameters.columns
+                 if parameters[name].nunique() > 1]
+        os.makedirs(directory, exist_ok=True)
+        plotter = Plotter()
+        files = []
+        for point in range(len(parameters)):
+            title = ", ".join("%s=%s" % (name, parameters[name].iloc[point])
+                              for name in swept)
+            summary = Plotter.summarize({entity: data[entity][point]
+                                         for entity in data})
+            files.append(os.path.join(directory, "point_%04d.%s" % (
+                point, extension)))
+            plotter.plotSummary(summary, files[-1],
+                                title or "The Walking Dead")
+        return files
+
+
+def _runPoint(task: tuple) -> np.ndarray:
+    """
+    runs the simulation of a point (in a worker process)
+
+    :param task: parameters, topology type, time, trials, batched, seed,
+    the seed of the world and the cache directory (see Sweep.run())
+    :return: the collected data (entities x trials x timesteps)
+    """
+    parameters, topology_type, time, trials, batched, seed, world_seed, \
+        cache = task
+    LOGGER("Running %s" % parameters, Logger.LEVEL_ITERATIONS)
+    env = WalkingDeadEnv.fromConfiguration(
+        Configuration(**parameters), topology_type, world_seed,
+        None if cache is None else TopologyCache(cache))
+    dc = env.runSimulation(time, trials, batched, seed=seed, plot=False)
+    return np.array([dc.getData(entity) for entity in DataCollector.ENTITIES])
@@ -0,0 +1,251 @@
+"""
+benchmarks of the simulation hot paths
+
+Run from the project root:
+
+    python -m benchmarks.bench                      # all sizes, print results
+    python -m benchmarks.bench --compare            # the baseline sizes
+    python -m benchmarks.bench --sizes 200 2000 --save
+
+Each size (the number of zombies) is measured in a fresh process, so the
+peak memory (max RSS) belongs to that size only. --save stores the results
+as baseline (benchmarks/baseline.json, one per --topology/--batched), --compare
+reports the change against the baseline and fails when a path got slower (or
+bigger) than the tolerance.
+
+The baseline stops at 20000 zombies (see BASELINE_SIZES). Setting up a world
+generates its zombies with networkx.scale_free_graph(), which takes time
+quadratic in the zombies: about 3 minutes for 20000 on a single core, hours
+for 200000. Cached worlds (see abm.wd.cache) are no way around it since the
+setup is one of the paths measured.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from abm.operations import AgentExecutor
+from abm.topology import GraphTopology, ArrayTopology
+from abm.wd.environment import WalkingDeadEnv
+from abm.wd.stats import DataCollector
+from settings import RICKS_CLIQUE, ENEMIES, ZOMBIE_AGGRESSIVENESS, TELEMETRY
+
+SIZES = (200, 2000, 20000, 200000, 1000000)
+# the sizes the baseline is saved for (the setup of larger ones takes hours)
+BASELINE_SIZES = (200, 2000, 20000)
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+TOPOLOGIES = {'graph': GraphTopology, 'array': ArrayTopology}
+# timings below (in seconds) are not compared against the baseline
+MIN_TIME = 0.01
+
+
+def measure(task: tuple) -> dict:
+    """
+    measures all paths for one size (in a fresh process). Apart from the
+    setup, each path is run repeatedly on the same world and the best time
+    is kept.
+
+    :param task: number of zombies, topology name, timesteps, trials,
+    batched, seed and repeat
+    :return: the results by name. Times are in seconds.
+    """
+    zombies, topology, timesteps, trials, batched, seed, repeat = task
+    random.seed(seed)
+    results = {}
+
+    start = time.perf_counter()
+    env = WalkingDeadEnv(RICKS_CLIQUE, ENEMIES, zombies, ZOMBIE_AGGRESSIVENESS,
+                         topology_type=TOPOLOGIES[topology])
+    results['setup'] = time.perf_counter() - start
+    agents = len(env.getBackend().nodes())
+    results['agents'] = agents
+
+    # a single timestep, just like runSimulation() does it, and restoring
+    # its changes
+    dc = DataCollector()
+    traverse, save_load = [], []
+    for _ in range(repeat):
+        env.saveCurrentGraph()
+        start = time.perf_counter()
+        env.traverseTopology(AgentExecutor(), dc)
+        traverse.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        env.loadSavedGraph()
+        save_load.append(time.perf_counter() - start)
+    results['traverse'] = min(traverse)
+    results['traverse_agent_steps'] = agents / results['traverse']
+    results['save_load'] = min(save_load)
+
+    # do() of each kind of agent on its own
+    backend = env.getBackend()
+    kinds = {}
+    for node in backend.nodes():
+        kinds.setdefault(type(backend.getAgent(node)).__name__, []).append(
+            node)
+    for name, nodes in sorted(kinds.items()):
+        elapsed = []
+        for _ in range(repeat):
+            env.saveCurrentGraph()
+            start = time.perf_counter()
+            for node in nodes:
+                env.getAgent(node).do()
+            elapsed.append(time.perf_counter() - start)
+            env.loadSavedGraph()
+        results['do_%s' % name] = min(elapsed)
+        results['do_%s_agent_steps' % name] = len(nodes) / max(min(elapsed),
+                                                               1e-9)
+
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        env.runSimulation(timesteps, trials, batched, seed=seed, plot=False)
+        elapsed.append(time.perf_counter() - start)
+    results['simulation'] = min(elapsed)
+    # trials settling early and idle agents take no steps, so the steps
+    # taken are counted (see abm.telemetry), in a run of their own to leave
+    # the timings alone
+    with tempfile.TemporaryDirectory() as directory:
+        TELEMETRY.enable(os.path.join(directory, 'telemetry.jsonl'),
+                         every=float('inf'))
+        env.runSimulation(timesteps, trials, batched, seed=seed, plot=False)
+        TELEMETRY.disable()
+        steps = TELEMETRY.getSample()['agent_steps_total']
+    results['simulation_agent_steps'] = steps / results['simulation']
+
+    # kilobytes on linux, bytes on mac
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss /= 1024
+    results['peak_memory_mb'] = rss / 1024
+    return results
+
+
+def run(sizes, topology: str, timesteps: int, trials: int, batched: bool,
+        seed: int, repeat: int) -> dict:
+    """
+    :returns the results of all sizes (see measure())
+    """
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        'fork' if 'fork' in methods else None)
+    results = {}
+    for size in sizes:
+        # a new process per size, so the peak memory is not inherited
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            task = (size, topology, timesteps, trials, batched, seed,
+                    repeat)
+            results[str(size)] = pool.submit(measure, task).result()
+        print(describe(size, results[str(size)]), flush=True)
+    return results
+
+
+def describe(size: int, results: dict) -> str:
+    """
+    :returns the results of a size as text
+    """
+    lines = ["zombies=%d (%d agents)" % (size, results['agents'])]
+    for name, value in results.items():
+        if name == 'agents':
+            continue
+        unit = "/s" if name.endswith('agent_steps') else \
+            " MB" if name.endswith('_mb') else " s"
+        lines.append("    %-40s %14.4f%s" % (name, value, unit))
+    return "\n".join(lines)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    """
+    prints the change of each result against the baseline
+
+    :param results: the current results
+    :param baseline: the stored results
+    :param tolerance: the relative change accepted (e.g. 0.2 for 20%)
+    :return: whether no path regressed
+    """
+    ok = True
+    for size, current in results.items():
+        if size not in baseline['results']:
+            continue
+        print("zombies=%s" % size)
+        for name, value in current.items():
+            base = baseline['results'][size].get(name)
+            if not base or name == 'agents':
+                continue
+            # timings this short are mostly noise
+            timing = name[:-len('_agent_steps')] \
+                if name.endswith('_agent_steps') else name
+            if not name.endswith('_mb') and \
+                    baseline['results'][size][timing] < MIN_TIME:
+                continue
+            change = value / base - 1
+            # times and memory regress when they grow, rates when they shrink
+            worse = -change if name.endswith('agent_steps') else change
+            regressed = worse > tolerance
+            ok = ok and not regressed
+            print("    %-40s %+8.1f%%%s" % (name, 100 * change,
+                                           "  REGRESSION" if regressed else ""))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        help="numbers of zombies (BASELINE_SIZES when "
+                             "saving or comparing, SIZES otherwise)")
+    parser.add_argument('--topology', choices=sorted(TOPOLOGIES),
+                        default='graph')
+    parser.add_argument('--batched', action='store_true',
+                        help="run the simulation as array operations")
+    parser.add_argument('--timesteps', type=int, default=8)
+    parser.add_argument('--trials', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="runs per path, the best time is kept")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true',
+                        help="store the results as baseline")
+    parser.add_argument('--compare', action='store_true',
+                        help="compare the results against the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    # baselines are kept per topology (and batched or not)
+    name = args.topology + ('-batched' if args.batched else '')
+    baseline = {'machine': {}, 'runs': {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    sizes = args.sizes or (BASELINE_SIZES if args.save or args.compare
+                           else SIZES)
+    results = run(sizes, args.topology, args.timesteps, args.trials,
+                  args.batched, args.seed, args.repeat)
+    ok = True
+    if args.compare:
+        if name not in baseline['runs']:
+            raise Exception("There is no baseline for %s" % name)
+        ok = compare(results, baseline['runs'][name], args.tolerance)
+    if args.save:
+        baseline['machine'] = {'python': platform.python_version(),
+                               'platform': platform.platform(),
+                               'processor': platform.processor(),
+                               'cpus': os.cpu_count()}
+        baseline['runs'][name] = {'options': {'timesteps': args.timesteps,
+                                              'trials': args.trials,
+                                              'seed': args.seed,
+                                              'repeat': args.repeat},
+                                  'results': results}
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,31 @@
 from abm.log import Logger
+from abm.profiler import Profiler
+from abm.telemetry import Telemetry
+from abm.trace import Tracer
 
 LOGGER = Logger.getInstance(Logger.LEVEL_NONE)
+# agent events are traced instead of logged (see abm.trace). Tracing is
+# disabled until a sink is set, e.g. TRACER.setSink(PrintSink()) prints
+# them like Logger.LEVEL_DETAILS used to
+TRACER = Tracer.getInstance()
+# traversals are profiled after PROFILER.enable(), see PROFILER.dump()
+PROFILER = Profiler.getInstance()
+# running simulations write live metrics after TELEMETRY.enable('run.jsonl')
+TELEMETRY = Telemetry.getInstance()
 
 # simulation relevant parameters
 SIMULATION_TRIALS = 5
 SIMULATION_TIMESTEPS = 64
+# processes running trials in parallel (None uses all cores)
+SIMULATION_WORKERS = 1
+# timesteps between two checkpoints when a simulation writes them (see
+# WalkingDeadEnv.runSimulation())
+SIMULATION_CHECKPOINT_EVERY = 100
+# trials run between two checks of the confidence intervals and their
+# confidence level when a simulation runs until its results are precise
+# enough (see WalkingDeadEnv.runSimulation())
+SIMULATION_TRIALS_BATCH = 5
+SIMULATION_CONFIDENCE = 0.95
 ZOMBIE_AGGRESSIVENESS = 0.8
 CHANCE_TO_KILL_ZOMBIE = 0.8
 
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from abm.topology import ArrayTopology
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+from abm.wd.stats import DataCollector
+
+TIME = 32
+TRIALS = 40
+BATCH = 5
+
+
+def newEnvironment() -> WalkingDeadEnv:
+    return WalkingDeadEnv.fromConfiguration(Configuration(), ArrayTopology,
+                                            seed=3)
+
+
+def firstTrials(dc: DataCollector, trials: int) -> DataCollector:
+    """
+    :returns a DataCollector holding the first trials of another one
+    :param dc: the DataCollector
+    :param trials: the number of trials
+    """
+    first = DataCollector(trials, TIME + 1)
+    for trial in range(trials):
+        first.addTrial(dc.getTrial(trial))
+    return first
+
+
+@pytest.fixture(scope='module')
+def full() -> DataCollector:
+    return newEnvironment().runSimulation(TIME, TRIALS, True, seed=4,
+                                          plot=False)
+
+
+@pytest.mark.parametrize('precision', (15, {'zombies': 15, 'humans': 15},
+                                       {'ricks_death': 10}))
+def test_precision(precision, full):
+    """
+    trials run in batches until the intervals are narrow enough, which
+    gives the first trials of running all of them
+    """
+    dc = newEnvironment().runSimulation(TIME, TRIALS, True, seed=4,
+                                        plot=False, precision=precision,
+                                        batch=BATCH)
+    trials = dc.getTrials()
+    assert trials < TRIALS and trials % BATCH == 0
+    assert dc.isPrecise(precision)
+    assert not firstTrials(full, trials - BATCH).isPrecise(precision)
+    for entity in DataCollector.ENTITIES:
+        assert np.array_equal(dc.getData(entity),
+                              full.getData(entity)[:trials])
+
+
+def test_unknown_statistic():
+    with pytest.raises(Exception):
+        newEnvironment().runSimulation(TIME, TRIALS, True, seed=4,
+                                       plot=False, precision={'rick': 1})
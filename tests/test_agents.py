@@ -0,0 +1,37 @@
+import pytest
+
+from abm.topology import ArrayTopology, GraphTopology
+from abm.wd.agents import ZombieFactory
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+from settings import SCENARIO_IMMORTAL_ZOMBIES, SCENARIO_KILLABLE_ZOMBIES, \
+    SCENARIO_MOVING_KILLABLE_ZOMBIES
+
+SCENARIOS = (SCENARIO_IMMORTAL_ZOMBIES, SCENARIO_KILLABLE_ZOMBIES,
+             SCENARIO_MOVING_KILLABLE_ZOMBIES)
+
+
+@pytest.mark.parametrize('scenario', SCENARIOS)
+def test_zombie_type(scenario):
+    """
+    the factory tells the class of the zombies it produces
+    """
+    assert ZombieFactory.getZombieType(scenario) is \
+        type(ZombieFactory.getInstance(0.5, scenario))
+
+
+@pytest.mark.parametrize('topology_type', (GraphTopology, ArrayTopology))
+@pytest.mark.parametrize('scenario', SCENARIOS)
+def test_rick_sees_zombies(topology_type, scenario):
+    """
+    rick counts the zombies of the scenario next to him and acts
+    """
+    env = WalkingDeadEnv.fromConfiguration(Configuration(scenario=scenario),
+                                           topology_type, seed=3)
+    topology = env.getBackend()
+    rick = env.getAgent(env.getRick())
+    neighbor = list(topology.neighbors(env.getRick()))[0]
+    env.setAgent(neighbor, ZombieFactory.getInstance(0.5, scenario))
+    assert env.countNeighbors(env.getRick(),
+                              ZombieFactory.getZombieType(scenario)) > 0
+    assert not rick.isIdle()
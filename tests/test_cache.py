@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+
+from abm.topology import ArrayTopology, GraphTopology
+from abm.wd.cache import TopologyCache
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+from abm.wd.stats import DataCollector
+
+TIME = 20
+TRIALS = 2
+
+
+def runSimulation(env: WalkingDeadEnv) -> np.ndarray:
+    """
+    :returns the data of all entities (entities x trials x timesteps)
+    :param env: the environment
+    """
+    dc = env.runSimulation(TIME, TRIALS, seed=5, plot=False)
+    return np.array([dc.getData(entity) for entity in DataCollector.ENTITIES])
+
+
+def test_cache(tmp_path, monkeypatch):
+    """
+    a world is generated and stored once, then loaded memory mapped, and
+    simulating on it gives the results of simulating on a generated world
+    """
+    cache = TopologyCache(str(tmp_path))
+    stored = []
+    store = TopologyCache.store
+
+    def storeSeed(self, config, seed, topology):
+        stored.append(seed)
+        store(self, config, seed, topology)
+
+    monkeypatch.setattr(TopologyCache, 'store', storeSeed)
+    config = Configuration()
+    expected = runSimulation(WalkingDeadEnv.fromConfiguration(
+        config, ArrayTopology, seed=3))
+
+    assert cache.load(config, 3) is None
+    env = WalkingDeadEnv.fromConfiguration(config, ArrayTopology, seed=3,
+                                           cache=cache)
+    assert stored == [3] and os.path.isdir(cache.getPath(config, 3))
+    assert np.array_equal(runSimulation(env), expected)
+
+    # the aggressiveness does not change the world, the seed does
+    other = config.replace(zombie_aggressiveness=0.5)
+    env = WalkingDeadEnv.fromConfiguration(other, ArrayTopology, seed=3,
+                                           cache=cache)
+    assert stored == [3]
+    assert isinstance(env.getBackend()._indices, np.memmap)
+    env = WalkingDeadEnv.fromConfiguration(config, ArrayTopology, seed=3,
+                                           cache=cache)
+    assert stored == [3]
+    assert np.array_equal(runSimulation(env), expected)
+    WalkingDeadEnv.fromConfiguration(config, ArrayTopology, seed=4,
+                                     cache=cache)
+    assert stored == [3, 4]
+
+
+@pytest.mark.parametrize('topology_type, seed', ((GraphTopology, 3),
+                                                 (ArrayTopology, None)))
+def test_cache_needs(topology_type, seed, tmp_path):
+    with pytest.raises(Exception):
+        WalkingDeadEnv.fromConfiguration(Configuration(), topology_type,
+                                         seed=seed,
+                                         cache=TopologyCache(str(tmp_path)))
@@ -0,0 +1,56 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from abm.topology import ArrayTopology
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+from abm.wd.stats import DataCollector
+
+TIME = 40
+TRIALS = 3
+EVERY = 7
+
+
+def getData(dc: DataCollector) -> np.ndarray:
+    """
+    :returns the data of all entities (entities x trials x timesteps)
+    :param dc: the DataCollector
+    """
+    return np.array([dc.getData(entity) for entity in DataCollector.ENTITIES])
+
+
+@pytest.mark.parametrize('batched', (False, True))
+def test_resume(batched, tmp_path, monkeypatch):
+    """
+    resuming from any checkpoint gives the results of the uninterrupted
+    simulation bit for bit
+    """
+    env = WalkingDeadEnv.fromConfiguration(Configuration(), ArrayTopology,
+                                           seed=3)
+    uninterrupted = getData(env.runSimulation(TIME, TRIALS, batched, seed=11,
+                                              plot=False))
+
+    # a checkpoint replaces the one before, keep a copy of each of them
+    copies = []
+    write = WalkingDeadEnv.writeCheckpoint
+
+    def writeCheckpoint(self, path, *args):
+        write(self, path, *args)
+        copies.append(str(tmp_path / ('%d.npz' % len(copies))))
+        shutil.copy(path, copies[-1])
+
+    monkeypatch.setattr(WalkingDeadEnv, 'writeCheckpoint', writeCheckpoint)
+    env = WalkingDeadEnv.fromConfiguration(Configuration(), ArrayTopology,
+                                           seed=3)
+    checkpointed = getData(env.runSimulation(
+        TIME, TRIALS, batched, seed=11, plot=False,
+        checkpoint=str(tmp_path / 'run.npz'), checkpoint_every=EVERY))
+    assert np.array_equal(checkpointed, uninterrupted)
+    assert copies
+
+    for checkpoint in copies:
+        resumed = getData(WalkingDeadEnv.resumeSimulation(checkpoint,
+                                                          plot=False))
+        assert np.array_equal(resumed, uninterrupted)
@@ -0,0 +1,69 @@
+from itertools import combinations
+
+import numpy as np
+
+from abm.topology import ArrayTopology
+
+SIZE = 60
+CLIQUES = (range(0, 12), range(20, 45))
+
+
+def newTopologies() -> tuple:
+    """
+    :returns a topology with implicit cliques and the same topology with
+    the edges of the cliques stored
+    """
+    rng = np.random.default_rng(3)
+    sources = rng.integers(0, SIZE, 80)
+    targets = rng.integers(0, SIZE, 80)
+    loops = sources != targets
+    sources, targets = sources[loops], targets[loops]
+    pairs = np.array([pair for members in CLIQUES
+                      for pair in combinations(members, 2)])
+    implicit = ArrayTopology(range(SIZE), sources, targets,
+                             cliques=[list(members) for members in CLIQUES])
+    explicit = ArrayTopology(range(SIZE),
+                             np.concatenate([sources, pairs[:, 0]]),
+                             np.concatenate([targets, pairs[:, 1]]))
+    return implicit, explicit
+
+
+def assertSame(implicit: ArrayTopology, explicit: ArrayTopology,
+               ordered: bool = True):
+    """
+    asserts two topologies have the same neighbors
+    :param implicit: the topology with implicit cliques
+    :param explicit: the topology with the edges of the cliques stored
+    :param ordered: whether the neighbors have to be in the same order
+    """
+    order = (lambda neighbors: neighbors) if ordered else sorted
+    assert implicit.numberOfEdges() == explicit.numberOfEdges()
+    for node in range(SIZE):
+        neighbors = order(explicit.neighbors(node))
+        assert order(implicit.neighbors(node)) == neighbors
+        assert order(implicit.neighborArray(node).tolist()) == neighbors
+        for other in range(SIZE):
+            assert implicit.hasEdge(node, other) == \
+                explicit.hasEdge(node, other)
+
+
+def test_neighbors():
+    """
+    implicit cliques give the neighbors of storing their edges, also after
+    edges between and to the cliques are added and removed. Whether new
+    edges are buffered depends on the number of edges stored (see
+    ArrayTopology.SPARSE_EDGES), so the neighbors are in the same order
+    once both are compacted.
+    """
+    implicit, explicit = newTopologies()
+    assertSame(implicit, explicit)
+
+    added = ([3, 30, 50, 11], [25, 55, 51, 40])
+    removed = ([3, 50], [25, 51])
+    for topology in (implicit, explicit):
+        topology.addEdges(*added)
+        topology.removeEdges(*removed)
+    assertSame(implicit, explicit, ordered=False)
+    for topology in (implicit, explicit):
+        topology.compact()
+    assertSame(implicit, explicit)
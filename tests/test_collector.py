@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from abm.environment import EnvironmentOperable
+from abm.operations import ActiveSetExecutor
+from abm.topology import ArrayTopology, GraphTopology
+from abm.wd.agents import *
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+from abm.wd.kernel import BatchedStep
+from abm.wd.stats import DataCollector
+from settings import SCENARIO_KILLABLE_ZOMBIES, \
+    SCENARIO_MOVING_KILLABLE_ZOMBIES
+
+TIME = 30
+
+
+class Recount(EnvironmentOperable):
+    """
+    counts the agents of each entity by looking at every node, at the point
+    the DataCollector stores its counts
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.counts = []
+
+    def isNodewise(self) -> bool:
+        return False
+
+    def preProcess(self):
+        topology = self._env.getBackend()
+        counts = [0] * len(DataCollector.ENTITIES)
+        for node in topology.nodes():
+            agent_type = topology.getAgentType(node)
+            if agent_type == Rick:
+                counts[DataCollector.RICK] = 1
+            elif agent_type == FriendOfRick:
+                counts[DataCollector.FRIENDS] += 1
+            elif agent_type == EnemyOfRick:
+                counts[DataCollector.ENEMIES] += 1
+            elif agent_type == Zombie or not topology.getState(node) & \
+                    KillableZombie.STATE_DEAD:
+                counts[DataCollector.ZOMBIES] += 1
+        self.counts.append(counts)
+
+
+@pytest.mark.parametrize('topology_type, batched', (
+        (GraphTopology, False), (ArrayTopology, False), (ArrayTopology, True)))
+@pytest.mark.parametrize('scenario', (SCENARIO_KILLABLE_ZOMBIES,
+                                      SCENARIO_MOVING_KILLABLE_ZOMBIES))
+def test_recount(scenario, topology_type, batched):
+    """
+    the counts kept up to date by listening to the environment are those
+    of counting the agents every timestep
+    """
+    env = WalkingDeadEnv.fromConfiguration(Configuration(scenario=scenario),
+                                           topology_type, seed=3)
+    env.seedRandom(7)
+    executor = BatchedStep() if batched else ActiveSetExecutor()
+    dc = DataCollector(1, TIME)
+    dc.setTrial(0)
+    recount = Recount()
+    stop = env.traverseTopologyUntil(TIME, executor, dc, recount)
+    assert recount.counts[0] != recount.counts[-1]
+    counts = np.transpose([dc.getData(entity)[0, :stop]
+                           for entity in DataCollector.ENTITIES])
+    assert np.array_equal(counts, recount.counts)
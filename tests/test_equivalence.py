@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from abm.topology import ArrayTopology
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+from settings import SCENARIO_IMMORTAL_ZOMBIES, SCENARIO_KILLABLE_ZOMBIES, \
+    SCENARIO_MOVING_KILLABLE_ZOMBIES
+
+# worlds and trials per world averaged over
+WORLDS = 6
+TRIALS = 5
+TIME = 20
+# the largest difference of the mean populations (in agents)
+TOLERANCE = 6
+
+
+def meanPopulations(scenario: int, batched: bool) -> tuple:
+    """
+    :returns the mean humans and zombies of each timestep over several
+    worlds and trials
+    :param scenario: the scenario
+    :param batched: run the timesteps as array operations
+    """
+    humans, zombies = [], []
+    for world in range(WORLDS):
+        env = WalkingDeadEnv.fromConfiguration(
+            Configuration(scenario=scenario), ArrayTopology, seed=world)
+        dc = env.runSimulation(TIME, TRIALS, batched, seed=100 + world,
+                               plot=False)
+        humans.append(sum(dc.getData(entity) for entity in
+                          ('rick', 'friends', 'enemies')))
+        zombies.append(dc.getData('zombies'))
+    return np.concatenate(humans).mean(axis=0), \
+        np.concatenate(zombies).mean(axis=0)
+
+
+@pytest.mark.parametrize('scenario', (SCENARIO_IMMORTAL_ZOMBIES,
+                                      SCENARIO_KILLABLE_ZOMBIES,
+                                      SCENARIO_MOVING_KILLABLE_ZOMBIES))
+def test_batched_populations(scenario):
+    """
+    batched timesteps draw different numbers than the agents do, the mean
+    populations of each timestep agree nonetheless
+    """
+    humans, zombies = meanPopulations(scenario, False)
+    batched_humans, batched_zombies = meanPopulations(scenario, True)
+    assert np.abs(humans - batched_humans).max() <= TOLERANCE
+    assert np.abs(zombies - batched_zombies).max() <= TOLERANCE
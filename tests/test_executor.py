@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from abm.operations import ActiveSetExecutor, AgentExecutor
+from abm.topology import ArrayTopology, GraphTopology
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+from abm.wd.stats import DataCollector
+from settings import SCENARIO_IMMORTAL_ZOMBIES, SCENARIO_KILLABLE_ZOMBIES, \
+    SCENARIO_MOVING_KILLABLE_ZOMBIES
+
+TIME = 40
+SEEDS = (1, 2, 3)
+
+
+def runTrials(env: WalkingDeadEnv, executor) -> np.ndarray:
+    """
+    runs a trial per seed like WalkingDeadEnv.runTrial() does, but with a
+    given executor
+    :returns the data of all entities (entities x trials x timesteps)
+    :param env: the environment
+    :param executor: the executor letting the agents act
+    """
+    dc = DataCollector(len(SEEDS), TIME + 1)
+    for trial, seed in enumerate(SEEDS):
+        dc.setTrial(trial)
+        env.seedRandom(seed)
+        env.traverseTopology(dc)
+        env.traverseTopologyUntil(TIME, executor, dc)
+        dc.fillTrial(TIME + 1)
+        dc.resetTime()
+    return np.array([dc.getData(entity) for entity in DataCollector.ENTITIES])
+
+
+@pytest.mark.parametrize('topology_type', (GraphTopology, ArrayTopology))
+@pytest.mark.parametrize('scenario', (SCENARIO_IMMORTAL_ZOMBIES,
+                                      SCENARIO_KILLABLE_ZOMBIES,
+                                      SCENARIO_MOVING_KILLABLE_ZOMBIES))
+def test_active_set(scenario, topology_type):
+    """
+    visiting only the active nodes gives the results of visiting every node
+    """
+    def newEnvironment() -> WalkingDeadEnv:
+        return WalkingDeadEnv.fromConfiguration(
+            Configuration(scenario=scenario), topology_type, seed=3)
+
+    expected = runTrials(newEnvironment(), AgentExecutor())
+    assert np.array_equal(runTrials(newEnvironment(), ActiveSetExecutor()),
+                          expected)
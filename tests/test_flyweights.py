@@ -0,0 +1,88 @@
+import numpy as np
+
+from abm.environment import Environment
+from abm.operations import ActiveSetExecutor
+from abm.topology import ArrayTopology
+from abm.wd.agents import EnemyOfRick, KillableZombie
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+
+TIME = 10
+
+
+def newEnvironment() -> WalkingDeadEnv:
+    env = WalkingDeadEnv.fromConfiguration(Configuration(), ArrayTopology,
+                                           seed=3)
+    env.seedRandom(7)
+    return env
+
+
+def step(env: WalkingDeadEnv):
+    """
+    lets the agents act without rolling back afterwards (see
+    WalkingDeadEnv.traverseTopologyUntil())
+    :param env: the environment
+    """
+    Environment.traverseTopologyUntil(env, TIME, ActiveSetExecutor())
+
+
+def getAgents(topology: ArrayTopology) -> tuple:
+    """
+    :returns the arrays of the agents and the agent handed out for each node
+    :param topology: the topology
+    """
+    arrays = [topology.getKinds().copy(), topology.getStates().copy(),
+              topology.getFlyweights().copy()]
+    agents = []
+    for node in topology.nodes():
+        agent = topology.getAgent(node)
+        agents.append((type(agent), agent.getIndex(), agent.getState(),
+                       agent.getParameters()))
+    return arrays, agents
+
+
+def assertAgents(topology: ArrayTopology, expected: tuple):
+    """
+    asserts a topology holds the agents it held before
+    :param topology: the topology
+    :param expected: the return value of getAgents() before
+    """
+    arrays, agents = getAgents(topology)
+    for array, other in zip(arrays, expected[0]):
+        assert np.array_equal(array, other)
+    assert agents == expected[1]
+
+
+def test_copy():
+    """
+    a copy hands out the same agents and changing it leaves the original as
+    it is
+    """
+    env = newEnvironment()
+    step(env)
+    topology = env.getBackend()
+    agents = getAgents(topology)
+    assert (topology.getStates() & KillableZombie.STATE_DEAD).any()
+
+    other = topology.copy()
+    assertAgents(other, agents)
+    node = topology.nodes()[-1]
+    other.setState(node, KillableZombie.STATE_DEAD)
+    other.setAgent(topology.nodes()[0], EnemyOfRick())
+    assert getAgents(other)[1] != agents[1]
+    assertAgents(topology, agents)
+
+
+def test_save_load():
+    """
+    loading the saved graph puts back the kinds, states and flyweights of
+    every node
+    """
+    env = newEnvironment()
+    topology = env.getBackend()
+    agents = getAgents(topology)
+    env.saveCurrentGraph()
+    step(env)
+    assert getAgents(topology)[1] != agents[1]
+    env.loadSavedGraph()
+    assertAgents(topology, agents)
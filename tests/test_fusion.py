@@ -0,0 +1,93 @@
+import pytest
+
+from abm.environment import Environment, EnvironmentOperable
+from abm.topology import ArrayTopology, GraphTopology
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+
+BLOCK_SIZE = 50
+
+
+class Visit(EnvironmentOperable):
+    """
+    logs the calls it gets and derives a value per node from the value the
+    operable before derived for the node
+
+    :param name: the name in the log
+    :param log: the log shared by the operables
+    :param before: the operable before or None
+    :param barrier: see EnvironmentOperable.needsBarrier()
+    """
+
+    def __init__(self, name: str, log: list, before=None,
+                 barrier: bool = True):
+        super().__init__()
+        self.__name = name
+        self.__log = log
+        self.__before = before
+        self.__barrier = barrier
+        self.values = {}
+
+    def needsBarrier(self) -> bool:
+        return self.__barrier
+
+    def preProcess(self):
+        self.__log.append((self.__name, 'pre'))
+
+    def postProcess(self):
+        self.__log.append((self.__name, 'post'))
+
+    def __call__(self, node: int):
+        self.__log.append((self.__name, node))
+        agent_type = self._env.getBackend().getAgentType(node)
+        value = hash((node, agent_type.__name__))
+        if self.__before is not None:
+            value = hash((value, self.__before.values[node]))
+        self.values[node] = value
+
+
+def traverse(env: WalkingDeadEnv, barrier: bool) -> tuple:
+    """
+    :returns the log and the values of traversing the topology with three
+    operables, fused unless there are barriers
+    :param env: the environment
+    :param barrier: whether the operables need barriers
+    """
+    log = []
+    first = Visit('first', log)
+    second = Visit('second', log, first, barrier)
+    third = Visit('third', log, second, barrier)
+    env.traverseTopology(first, second, third)
+    return log, [first.values, second.values, third.values]
+
+
+@pytest.mark.parametrize('topology_type', (GraphTopology, ArrayTopology))
+def test_fusion(topology_type, monkeypatch):
+    """
+    fused operables do what they do in passes of their own, visiting the
+    blocks of nodes in turn in a single pass
+    """
+    monkeypatch.setattr(Environment, 'BLOCK_SIZE', BLOCK_SIZE)
+    env = WalkingDeadEnv.fromConfiguration(Configuration(), topology_type,
+                                           seed=3)
+    nodes = env.getBackend().getNodeArray().tolist()
+    separate, expected = traverse(env, True)
+    fused, values = traverse(env, False)
+    assert values == expected
+
+    def visits(log, name):
+        return [entry for operable, entry in log if operable == name]
+
+    for name in ('first', 'second', 'third'):
+        assert visits(fused, name) == visits(separate, name) == \
+            ['pre'] + nodes + ['post']
+
+    names = ('first', 'second', 'third')
+    assert separate == [(name, entry) for name in names
+                        for entry in ['pre'] + nodes + ['post']]
+    blocks = [nodes[i:i + BLOCK_SIZE] for i in range(0, len(nodes),
+                                                     BLOCK_SIZE)]
+    assert len(blocks) > 1
+    assert fused == [(name, 'pre') for name in names] + \
+        [(name, node) for block in blocks for name in names
+         for node in block] + [(name, 'post') for name in names]
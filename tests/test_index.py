@@ -0,0 +1,54 @@
+import pytest
+
+from abm.environment import Environment
+from abm.operations import AgentExecutor
+from abm.topology import ArrayTopology, GraphTopology
+from abm.wd.agents import *
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+
+TYPES = (Rick, FriendOfRick, EnemyOfRick, MovableKillableZombie)
+
+
+def assertRecounted(env: WalkingDeadEnv):
+    """
+    asserts the counts of the neighbor index match counting the neighbors
+    of every node
+    :param env: the environment
+    """
+    topology = env.getBackend()
+    for node in topology.nodes():
+        for agent_type in TYPES:
+            assert env.countNeighbors(node, agent_type) == \
+                len(topology.getNeighborNodes(node, agent_type))
+        assert env.countNeighbors(node, *TYPES) == \
+            len(topology.getNeighborNodes(node, *TYPES))
+
+
+@pytest.mark.parametrize('topology_type', (GraphTopology, ArrayTopology))
+def test_recount(topology_type):
+    """
+    the counts stay right while agents move, kill and convert, after rolling
+    back and after changing edges and agents by hand
+    """
+    env = WalkingDeadEnv.fromConfiguration(Configuration(), topology_type,
+                                           seed=3)
+    env.seedRandom(7)
+    assertRecounted(env)
+    env.saveCurrentGraph()
+    # WalkingDeadEnv.traverseTopologyUntil() would roll back on its own
+    Environment.traverseTopologyUntil(env, 10, AgentExecutor())
+    assertRecounted(env)
+    env.loadSavedGraph()
+    assertRecounted(env)
+
+    topology = env.getBackend()
+    # an edge between cliques, those within cannot be removed
+    cliques = {node: clique for clique, members in
+               enumerate(topology.getCliques()) for node in members}
+    node, neighbor = next((u, v) for u, v in topology.getGraph().edges()
+                          if cliques.get(u, -1) != cliques.get(v, -2))
+    env.removeEdge(node, neighbor)
+    env.addEdge(node, topology.nodes()[-1])
+    env.setAgent(neighbor, EnemyOfRick())
+    assertRecounted(env)
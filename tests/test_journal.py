@@ -0,0 +1,40 @@
+import pytest
+
+from abm.environment import Environment
+from abm.operations import AgentExecutor
+from abm.topology import ArrayTopology, GraphTopology
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+from abm.wd.stats import DataCollector
+
+
+def getWorld(env: WalkingDeadEnv) -> tuple:
+    """
+    :returns the edges and the agent class and state of each node
+    :param env: the environment
+    """
+    topology = env.getBackend()
+    edges = sorted(tuple(sorted(edge)) for edge in
+                   topology.getGraph().edges())
+    agents = [(node, topology.getAgentType(node), topology.getState(node))
+              for node in topology.nodes()]
+    return edges, agents
+
+
+@pytest.mark.parametrize('topology_type', (GraphTopology, ArrayTopology))
+def test_rollback(topology_type):
+    """
+    loading the saved graph after a trial undoes everything the agents did
+    to the world
+    """
+    env = WalkingDeadEnv.fromConfiguration(Configuration(), topology_type,
+                                           seed=3)
+    env.seedRandom(7)
+    world = getWorld(env)
+    env.saveCurrentGraph()
+    # WalkingDeadEnv.traverseTopologyUntil() would roll back on its own
+    Environment.traverseTopologyUntil(env, 20, AgentExecutor(),
+                                      DataCollector())
+    assert getWorld(env) != world
+    env.loadSavedGraph()
+    assert getWorld(env) == world
@@ -0,0 +1,72 @@
+import pytest
+
+from abm.environment import Environment
+from abm.operations import ActiveSetExecutor
+from abm.topology import ArrayTopology, GraphTopology
+from abm.wd.agents import MovableKillableZombie
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+from abm.wd.kernel import BatchedStep
+
+TIME = 20
+
+
+def getEdges(env: WalkingDeadEnv) -> set:
+    """
+    :returns the edges of the topology, each as sorted tuple
+    :param env: the environment
+    """
+    return {tuple(sorted(edge)) for edge in
+            env.getBackend().getGraph().edges()}
+
+
+def getMovingZombies(env: WalkingDeadEnv) -> set:
+    """
+    :returns the nodes holding moving zombies
+    :param env: the environment
+    """
+    topology = env.getBackend()
+    return {node for node in topology.nodes() if
+            topology.getAgentType(node) is MovableKillableZombie}
+
+
+@pytest.mark.parametrize('topology_type, batched', (
+        (GraphTopology, False), (ArrayTopology, False), (ArrayTopology, True)))
+def test_random_links(topology_type, batched):
+    """
+    every timestep, a moving zombie replaces its random link, so the world
+    holds the edges set up and one random link per zombie at most
+    """
+    env = WalkingDeadEnv.fromConfiguration(Configuration(), topology_type,
+                                           seed=3)
+    env.seedRandom(7)
+    edges = getEdges(env)
+    executor = BatchedStep() if batched else ActiveSetExecutor()
+    moved = False
+    # a link stays on its node when a friend swaps with the zombie
+    zombies = set()
+    for time in range(TIME):
+        zombies |= getMovingZombies(env)
+        # WalkingDeadEnv.traverseTopologyUntil() would roll back on its own
+        Environment.traverseTopologyUntil(env, time + 1, executor,
+                                          start=time)
+        links = env.getLinks()
+        moved = moved or len(links) > 0
+        zombies |= getMovingZombies(env)
+        assert set(links) <= zombies
+        assert getEdges(env) == edges | {tuple(sorted(link))
+                                         for link in links.items()}
+        assert len(getEdges(env)) == len(edges) + len(links)
+    assert moved
+
+
+def test_no_new_edges():
+    """
+    looking for new edges among none is fine with removed and buffered
+    edges around
+    """
+    topology = ArrayTopology(range(4), [0, 1, 2], [1, 2, 3])
+    topology.removeEdge(0, 1)
+    topology.addEdge(0, 3)
+    sources, targets = topology.newEdges([], [])
+    assert len(sources) == 0 and len(targets) == 0
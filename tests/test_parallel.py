@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from abm.topology import ArrayTopology, GraphTopology
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+from abm.wd.stats import DataCollector
+
+TIME = 30
+TRIALS = 6
+
+
+def getData(dc: DataCollector) -> np.ndarray:
+    """
+    :returns the data of all entities (entities x trials x timesteps)
+    :param dc: the DataCollector
+    """
+    return np.array([dc.getData(entity) for entity in DataCollector.ENTITIES])
+
+
+def newEnvironment(topology_type=ArrayTopology) -> WalkingDeadEnv:
+    return WalkingDeadEnv.fromConfiguration(Configuration(), topology_type,
+                                            seed=3)
+
+
+@pytest.mark.parametrize('topology_type, batched', (
+        (GraphTopology, False), (ArrayTopology, False), (ArrayTopology, True)))
+def test_workers(topology_type, batched):
+    """
+    trials are seeded on their own, so workers give the serial results bit
+    for bit
+    """
+    serial = getData(newEnvironment(topology_type).runSimulation(
+        TIME, TRIALS, batched, seed=5, plot=False))
+    parallel = getData(newEnvironment(topology_type).runSimulation(
+        TIME, TRIALS, batched, workers=3, seed=5, plot=False))
+    assert np.array_equal(parallel, serial)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from abm.topology import ArrayTopology
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+from abm.wd.stats import DataCollector
+
+TIME = 30
+TRIALS = 20
+# the confidence level the mean populations are compared at
+CONFIDENCE = 0.999
+
+
+def getData(dc: DataCollector) -> np.ndarray:
+    """
+    :returns the data of all entities (entities x trials x timesteps)
+    :param dc: the DataCollector
+    """
+    return np.array([dc.getData(entity) for entity in DataCollector.ENTITIES])
+
+
+def newEnvironment() -> WalkingDeadEnv:
+    return WalkingDeadEnv.fromConfiguration(Configuration(), ArrayTopology,
+                                            seed=3)
+
+
+@pytest.mark.parametrize('partitions', (2, 3))
+def test_partitions(partitions):
+    """
+    partitions draw other numbers than a single process does, so their
+    results are only the same for the same seed and number of partitions.
+    The mean populations agree with the serial ones nonetheless.
+    """
+    serial = newEnvironment().runSimulation(TIME, TRIALS, True, seed=5,
+                                            plot=False)
+    partitioned = newEnvironment().runSimulation(
+        TIME, TRIALS, seed=5, plot=False, partitions=partitions)
+    again = newEnvironment().runSimulation(TIME, TRIALS, seed=5, plot=False,
+                                           partitions=partitions)
+    assert np.array_equal(getData(again), getData(partitioned))
+
+    # the means differ by less than their confidence intervals allow
+    means, widths = [], []
+    for dc in (serial, partitioned):
+        data = getData(dc)
+        means.append({'humans': data[:3].sum(axis=0).mean(axis=0),
+                      'zombies': data[3].mean(axis=0)})
+        widths.append(DataCollector.getIntervalWidths(
+            {entity: dc.getData(entity) for entity in DataCollector.ENTITIES},
+            CONFIDENCE))
+    for statistic in ('humans', 'zombies'):
+        difference = np.abs(means[0][statistic] - means[1][statistic])
+        allowed = np.hypot(widths[0][statistic], widths[1][statistic]) / 2
+        assert (difference <= allowed).all()
@@ -0,0 +1,39 @@
+
+import numpy as np
+
+from abm.topology import ArrayTopology
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+from abm.wd.results import ResultsFile
+from abm.wd.stats import DataCollector
+
+TIME = 20
+TRIALS = 4
+
+
+def test_interrupted(tmp_path, monkeypatch):
+    """
+    the file of an interrupted run holds every timestep written before,
+    a partly written record is left out
+    """
+    monkeypatch.setattr(ResultsFile, 'CHUNK', 7)
+    path = str(tmp_path / 'results')
+    env = WalkingDeadEnv.fromConfiguration(Configuration(), ArrayTopology,
+                                           seed=3)
+    dc = env.runSimulation(TIME, TRIALS, seed=5, plot=False, path=path)
+    dc.close()
+    full = {entity: dc.getData(entity) for entity in DataCollector.ENTITIES}
+    assert full['zombies'].shape == (TRIALS, TIME + 1)
+
+    # interrupted within the 6th record of the third trial
+    record = 8 * (2 + len(DataCollector.ENTITIES))
+    with open(path, 'r+b') as file:
+        file.truncate(record * (2 * (TIME + 1) + 5) + record // 2)
+    interrupted = DataCollector.fromFile(path)
+    assert interrupted.getTrials() == 3
+    for entity in DataCollector.ENTITIES:
+        data = interrupted.getData(entity)
+        assert data.shape == (3, TIME + 1)
+        assert np.array_equal(data[:2], full[entity][:2])
+        assert np.array_equal(data[2, :5], full[entity][2, :5])
+        assert np.isnan(data[2, 5:]).all()
@@ -0,0 +1,23 @@
+import numpy as np
+
+from abm.rng import RandomStream
+
+
+def newStream() -> RandomStream:
+    return RandomStream(np.random.default_rng(3))
+
+
+def test_uniforms():
+    """
+    the numbers of a stream do not depend on drawing them one by one or as
+    arrays of any size
+    """
+    single = newStream()
+    expected = [single.random() for _ in range(3 * RandomStream.BLOCK_SIZE)]
+    stream = newStream()
+    values = [stream.random()]
+    for size in (5, RandomStream.BLOCK_SIZE, 0, 1):
+        values += stream.uniforms(size).tolist()
+        values.append(stream.random())
+    values += stream.uniforms(len(expected) - len(values)).tolist()
+    assert values == expected
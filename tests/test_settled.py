@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from abm.environment import Environment, EnvironmentOperable
+from abm.operations import ActiveSetExecutor
+from abm.topology import ArrayTopology, GraphTopology
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+from abm.wd.stats import DataCollector
+from settings import SCENARIO_IMMORTAL_ZOMBIES, SCENARIO_KILLABLE_ZOMBIES, \
+    SCENARIO_MOVING_KILLABLE_ZOMBIES
+
+TIME = 60
+TRIALS = 4
+
+
+def runSimulation(scenario: int, topology_type, batched: bool,
+                  partitions: int) -> np.ndarray:
+    """
+    :returns the data of all entities (entities x trials x timesteps)
+    :param scenario: the scenario
+    :param topology_type: the class of the topology
+    :param batched: run each timestep as array operations
+    :param partitions: the number of processes stepping each trial
+    """
+    env = WalkingDeadEnv.fromConfiguration(Configuration(scenario=scenario),
+                                           topology_type, seed=3)
+    dc = env.runSimulation(TIME, TRIALS, batched, seed=5, plot=False,
+                           partitions=partitions)
+    return np.array([dc.getData(entity) for entity in DataCollector.ENTITIES])
+
+
+@pytest.mark.parametrize('topology_type, batched, partitions', (
+        (GraphTopology, False, 1), (ArrayTopology, False, 1),
+        (ArrayTopology, True, 1), (ArrayTopology, False, 2)))
+@pytest.mark.parametrize('scenario', (SCENARIO_IMMORTAL_ZOMBIES,
+                                      SCENARIO_KILLABLE_ZOMBIES,
+                                      SCENARIO_MOVING_KILLABLE_ZOMBIES))
+def test_settled(scenario, topology_type, batched, partitions, monkeypatch):
+    """
+    stopping trials once they have settled and filling in the remaining
+    timesteps gives the results of running every timestep
+    """
+    stops = []
+    traverse = Environment.traverseTopologyUntil
+
+    def traverseTopologyUntil(env, time, *ops, start=0):
+        stops.append(traverse(env, time, *ops, start=start))
+        return stops[-1]
+
+    monkeypatch.setattr(Environment, 'traverseTopologyUntil',
+                        traverseTopologyUntil)
+    settled = runSimulation(scenario, topology_type, batched, partitions)
+    # without the active set (see ActiveSetExecutor.isSettled()), trials
+    # only settle once no humans or no zombies are left, which immobile
+    # killable zombies do not get to
+    if not (batched or partitions > 1) or \
+            scenario != SCENARIO_KILLABLE_ZOMBIES:
+        assert min(stops) < TIME
+
+    for operable in (EnvironmentOperable, ActiveSetExecutor, DataCollector):
+        monkeypatch.setattr(operable, 'isSettled', lambda self: False)
+    stops.clear()
+    full = runSimulation(scenario, topology_type, batched, partitions)
+    assert set(stops) == {TIME}
+    assert np.array_equal(settled, full)
@@ -0,0 +1,49 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from abm.shared import SharedArrays
+
+
+def useArrays(handle: dict) -> tuple:
+    """
+    attaches to shared arrays (in a worker), writes to them and tells what
+    it read
+
+    :param handle: the handle of the arrays
+    :return: the sum of the read-only array and whether writing to it
+    failed
+    """
+    shared = SharedArrays.attach(handle)
+    total = int(shared['world'].sum())
+    try:
+        shared['world'][0] = -1
+        readonly = False
+    except ValueError:
+        readonly = True
+    shared['results'][:] = np.arange(len(shared['results']))
+    shared.close()
+    return total, readonly
+
+
+def test_attach():
+    """
+    workers read the arrays in place and write their results to the arrays
+    of the owner, arrays marked read-only cannot be written
+    """
+    world = np.arange(1000, dtype=np.int64)
+    shared = SharedArrays({'world': world, 'results': np.zeros(5)},
+                          readonly=('world',))
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        'fork' if 'fork' in methods else None)
+    try:
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            total, readonly = pool.submit(useArrays,
+                                          shared.getHandle()).result()
+        assert total == world.sum() and readonly
+        assert np.array_equal(shared['world'], world)
+        assert np.array_equal(shared['results'], np.arange(5))
+    finally:
+        shared.close()
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pytest
+
+import abm.wd.sweep
+from abm.topology import ArrayTopology
+from abm.wd.stats import DataCollector
+from abm.wd.sweep import Sweep
+
+TIME = 20
+TRIALS = 2
+GRID = {'zombie_aggressiveness': [0.3, 0.6, 0.9]}
+
+
+def runSweep(path: str, workers: int = 1) -> dict:
+    """
+    :returns the data of each entity (points x trials x timesteps)
+    :param path: the .npz file to write
+    :param workers: the number of processes running points
+    """
+    Sweep(GRID).run(path, TIME, TRIALS, ArrayTopology, workers=workers,
+                    seed=5)
+    return Sweep.load(path)[1]
+
+
+def test_interrupted(tmp_path, monkeypatch):
+    """
+    the points done before a sweep is interrupted are kept, running it
+    again only runs the others and gives the results of an uninterrupted
+    sweep
+    """
+    expected = runSweep(str(tmp_path / 'full.npz'), workers=2)
+    assert expected['zombies'].shape == (3, TRIALS, TIME + 1)
+    assert not os.path.exists(str(tmp_path / 'full.npz') + Sweep.POINTS)
+
+    run = abm.wd.sweep._runPoint
+    interrupt = [True]
+    ran = []
+
+    def runPoint(task):
+        aggressiveness = task[0]['zombie_aggressiveness']
+        if aggressiveness == 0.9 and interrupt[0]:
+            raise KeyboardInterrupt
+        ran.append(aggressiveness)
+        return run(task)
+
+    monkeypatch.setattr(abm.wd.sweep, '_runPoint', runPoint)
+    path = str(tmp_path / 'sweep.npz')
+    with pytest.raises(KeyboardInterrupt):
+        runSweep(path)
+    assert not os.path.exists(path)
+    assert os.path.exists(path + Sweep.POINTS)
+
+    interrupt[0] = False
+    ran.clear()
+    data = runSweep(path)
+    assert ran == [0.9]
+    assert not os.path.exists(path + Sweep.POINTS)
+    for entity in DataCollector.ENTITIES:
+        assert np.array_equal(data[entity], expected[entity])
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from abm.telemetry import Telemetry
+from abm.topology import ArrayTopology
+from abm.wd.agents import FriendOfRick, MovableKillableZombie
+from abm.wd.config import Configuration
+from abm.wd.environment import WalkingDeadEnv
+from settings import TELEMETRY
+
+TIME = 30
+TRIALS = 3
+
+
+@pytest.fixture
+def telemetry():
+    yield TELEMETRY
+    TELEMETRY.disable()
+
+
+def runSimulation():
+    """
+    :returns the DataCollector of a simulation
+    """
+    env = WalkingDeadEnv.fromConfiguration(Configuration(), ArrayTopology,
+                                           seed=3)
+    return env.runSimulation(TIME, TRIALS, seed=5, plot=False)
+
+
+def test_json_lines(tmp_path, telemetry):
+    """
+    a sample per timestep and trial when sampling all the time. The agents
+    of a sample are the agents collected at its timestep.
+    """
+    path = str(tmp_path / 'run.jsonl')
+    telemetry.enable(path, every=0)
+    dc = runSimulation()
+    zombies = dc.getData('zombies')
+    friends = dc.getData('friends')
+    with open(path) as f:
+        samples = [json.loads(line) for line in f]
+
+    names = {name for name, _ in Telemetry.METRICS}
+    progress = 0
+    ticks = 0
+    for sample in samples:
+        assert names <= set(sample)
+        assert sample['progress'] >= progress
+        progress = sample['progress']
+        assert sample['trials'] == TRIALS and sample['timesteps'] == TIME
+        if sample['timestep'] > 0:
+            # written by a timestep
+            ticks += 1
+            assert sample['timesteps_total'] == ticks
+            agents = sample['agents']
+            trial, timestep = sample['trial'], sample['timestep']
+            assert agents.get(MovableKillableZombie.__name__, 0) == \
+                zombies[trial, timestep]
+            assert agents.get(FriendOfRick.__name__, 0) == \
+                friends[trial, timestep]
+            assert sample['edges'] > 0 and sample['rss_bytes'] > 0
+    last = samples[-1]
+    assert 0 < ticks <= TIME * TRIALS
+    assert last['progress'] == 1.0 and last['eta_seconds'] == 0
+    assert last['trials_done'] == TRIALS
+    assert last['timesteps_total'] == ticks
+    assert last['agent_steps_total'] > ticks
+
+
+def test_prometheus(tmp_path, telemetry):
+    """
+    the last sample in the Prometheus text format
+    """
+    path = str(tmp_path / 'run.prom')
+    telemetry.enable(path)
+    runSimulation()
+    with open(path) as f:
+        lines = f.read().splitlines()
+    values = {}
+    for line in lines:
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            values[name] = float(value)
+    assert values['abm_progress'] == 1.0
+    assert values['abm_trials_done'] == TRIALS
+    assert values['abm_agents{class="%s"}' %
+                  MovableKillableZombie.__name__] > 0
+    assert '# TYPE abm_timesteps_per_second gauge' in lines
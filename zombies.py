@@ -1,8 +1,9 @@
 from abm.wd.environment import WalkingDeadEnv
 from settings import RICKS_CLIQUE, ENEMIES, ZOMBIES, ZOMBIE_AGGRESSIVENESS, SIMULATION_TRIALS, \
-    SIMULATION_TIMESTEPS, LOGGER
+    SIMULATION_TIMESTEPS, SIMULATION_WORKERS, LOGGER
 
 if __name__ == '__main__':
     env = WalkingDeadEnv(RICKS_CLIQUE, ENEMIES, ZOMBIES, ZOMBIE_AGGRESSIVENESS)
-    env.runSimulation(SIMULATION_TIMESTEPS, SIMULATION_TRIALS)
+    env.runSimulation(SIMULATION_TIMESTEPS, SIMULATION_TRIALS,
+                      workers=SIMULATION_WORKERS)
 